@@ -0,0 +1,60 @@
+'''
+Multi-call workflows - sequential sync calls vs fan-out through the asyncio client
+- artist info (profile + bio + similar artists) and stream lookup for a page of 10 live stations
+- response_delay is slept per request by the stand-in to model API latency
+
+	$ python -m benchmarks.bench_async_fanout
+'''
+import json
+import time
+import statistics
+
+from iheart.stations.iheart_radio import client, aclient
+from .standin import StandIn
+
+
+def _routes(response_delay):
+	def respond(payload):
+		def handler(h):
+			time.sleep(response_delay)
+			return payload
+		return handler
+	return {
+		'/api/v3/artists/profiles/': respond({'artist': {'artistName': 'Bob'}}),
+		'/api/v1/catalog/getArtistByArtistId': respond({'artist': {'bio': '...'}}),
+		'/api/v1/catalog/artist/': respond({'artists': []}),
+		'/api/v2/content/liveStations/': respond({'hits': [{'streams': {'shoutcast_stream': 'http://stream'}}]}),
+	}
+
+
+def _timed(func, repeat):
+	timings = []
+	for _ in range(repeat):
+		st = time.perf_counter()
+		func()
+		timings.append((time.perf_counter() - st) * 1000)
+	return round(statistics.median(timings), 2)
+
+
+def run(response_delay=0.05, stations=10, repeat=5):
+	station_ids = [str(1000 + i) for i in range(stations)]
+	with StandIn(_routes(response_delay)) as standin:
+		sync_client = client.iHeartClient(pool_size=stations, base_url=standin.base_url)
+		async_client = aclient.AsyncIHeartClient(sync_client)
+		try:
+			seq_artist = _timed(lambda: [sync_client.get_artist_profile(1), sync_client.get_artist_bio(1), sync_client.get_similar_artists(1)], repeat)
+			fan_artist = _timed(lambda: aclient.run(async_client.get_artist_info(1)), repeat)
+			seq_streams = _timed(lambda: [sync_client.get_station_streams(i) for i in station_ids], repeat)
+			fan_streams = _timed(lambda: aclient.run(async_client.get_each_station_streams(station_ids)), repeat)
+		finally:
+			async_client.close()
+			sync_client.close()
+	return {
+		'response_delay_ms': response_delay * 1000,
+		'artist_info': {'sequential_ms': seq_artist, 'fanout_ms': fan_artist},
+		f'{stations}_station_streams': {'sequential_ms': seq_streams, 'fanout_ms': fan_streams},
+	}
+
+
+if __name__ == '__main__':
+	print(json.dumps(run(), indent=4))
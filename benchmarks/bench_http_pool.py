@@ -0,0 +1,60 @@
+'''
+Per-call latency of iHeart API calls with and without connection pooling
+
+	$ python -m benchmarks.bench_http_pool
+'''
+import json
+import time
+import statistics
+
+import requests
+
+from iheart.stations.iheart_radio import client
+from .standin import StandIn
+
+
+SEARCH_RESPONSE = {'results': {'artists': [], 'stations': [], 'tracks': []}}
+
+
+def _time_calls(func, calls):
+	timings = []
+	for _ in range(calls):
+		st = time.perf_counter()
+		func()
+		timings.append((time.perf_counter() - st) * 1000)
+	return timings
+
+
+def _summary(timings):
+	return {
+		'mean_ms': round(statistics.mean(timings), 3),
+		'median_ms': round(statistics.median(timings), 3),
+		'max_ms': round(max(timings), 3),
+	}
+
+
+def run(calls=50, connect_delay=0.02):
+	with StandIn({'/api/v3/search/all': SEARCH_RESPONSE}, connect_delay=connect_delay) as standin:
+		url = standin.base_url + client.search_url[len(client.API_HOST):]
+
+		# old behaviour - module level requests.get opens a new connection per call
+		conns = standin.connections
+		unpooled = _time_calls(lambda: requests.get(url, params={'keywords': 'bob'}).json(), calls)
+		unpooled_conns = standin.connections - conns
+
+		pooled_client = client.iHeartClient(base_url=standin.base_url)
+		conns = standin.connections
+		pooled = _time_calls(lambda: pooled_client.search('bob'), calls)
+		pooled_conns = standin.connections - conns
+		pooled_client.close()
+
+	return {
+		'calls': calls,
+		'connect_delay_ms': connect_delay * 1000,
+		'unpooled': dict(_summary(unpooled), connections=unpooled_conns),
+		'pooled': dict(_summary(pooled), connections=pooled_conns),
+	}
+
+
+if __name__ == '__main__':
+	print(json.dumps(run(), indent=4))
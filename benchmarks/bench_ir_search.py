@@ -0,0 +1,132 @@
+'''
+internet-radio.com search - sequential full-document parsing vs streaming search with page prefetch
+- result pages are served from the html fixtures in benchmarks/fixtures/internet_radio by a local stand-in
+- response_delay is slept per request to model the round trip to the site
+
+	$ python -m benchmarks.bench_ir_search
+'''
+import os
+import json
+import time
+import statistics
+from urllib.parse import urlparse, parse_qs
+
+import requests
+from bs4 import BeautifulSoup
+import lxml.html
+
+from iheart.stations.internet_radio import client
+from .standin import StandIn
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'internet_radio')
+
+
+def _fixture(name):
+	with open(os.path.join(FIXTURES, name), 'rb') as f:
+		return f.read()
+
+
+def _routes(response_delay):
+	pages = {}
+	for f in os.listdir(FIXTURES):
+		if f.startswith('search_bob_page'):
+			pages[int(f[len('search_bob_page'):-len('.html')])] = _fixture(f)
+	stations = _fixture('stations.html')
+
+	def search(handler):
+		time.sleep(response_delay)
+		page = int(parse_qs(urlparse(handler.path).query).get('page', ['1'])[0])
+		return pages.get(page, b'')
+
+	def genres(handler):
+		time.sleep(response_delay)
+		return stations
+
+	return {'/search/': search, '/stations/': genres}
+
+
+def _old_search(term, maxRows=10, sortby="listeners"):
+	# the previous implementation - pages fetched one after another, whole document parsed with BeautifulSoup
+	out = []
+	page_url = client._ir_find_actual_url(search_term=term)
+	sess = requests.Session()
+	sess.cookies.set("sortby", sortby)
+
+	while len(out) < maxRows:
+		res = sess.get(page_url, headers=client.HEADERS)
+		soup = BeautifulSoup(res.content, 'lxml')
+		table = soup.find('table')
+		rows = table.find_all('tr')
+
+		for tr in rows:
+			url = client.base_url+tr.find('a', attrs={'title':'M3U Playlist File'})['href']
+			radio_name = tr.find('h4', attrs={'class':'text-danger'})
+			if radio_name.text.strip()=="":
+				continue
+			meta = client._ir_parse_meta(tr.find('td', {'class':'text-right'}).text)
+			resdict = {
+				'id': hash(url),
+				'user_id': 'anonymous',
+				'name': radio_name.text.strip(),
+				'current_track': radio_name.parent.find('b').text.strip(),
+				'mrl': url,
+			}
+			resdict.update(meta)
+			out.append(resdict)
+
+		next_btn = soup.find('li', attrs={'class':'next'})
+		if not next_btn:
+			break
+		page_url = client.base_url+next_btn.find('a')['href']
+
+	return out[:maxRows]
+
+
+def _timed(func, repeat):
+	timings = []
+	for _ in range(repeat):
+		st = time.perf_counter()
+		out = func()
+		timings.append((time.perf_counter() - st) * 1000)
+	return out, round(statistics.median(timings), 2)
+
+
+def _parse_only(repeat):
+	page = _fixture('search_bob_page1.html')
+	_, bs4_ms = _timed(lambda: BeautifulSoup(page, 'lxml').find('table').find_all('tr'), repeat)
+	_, lxml_ms = _timed(lambda: list(client._ir_parse_rows(lxml.html.fromstring(page))), repeat)
+	return {'bs4_page_ms': bs4_ms, 'lxml_page_ms': lxml_ms}
+
+
+def run(max_rows=150, response_delay=0.08, repeat=3):
+	saved = (client.base_url, client.search_url, client.station_url, client.all_stations_url)
+	with StandIn(_routes(response_delay)) as standin:
+		client.base_url = standin.base_url
+		client.search_url = standin.base_url + '/search/?radio={searchTerm}'
+		client.station_url = standin.base_url + '/stations/{station}/'
+		client.all_stations_url = standin.base_url + '/stations/'
+		client.configure()
+		try:
+			client.ir_get_genres() # both versions use the cached genre list
+			old, old_ms = _timed(lambda: _old_search('bob', maxRows=max_rows), repeat)
+			new, new_ms = _timed(lambda: client.ir_search('bob', maxRows=max_rows), repeat)
+			_, first_ms = _timed(lambda: next(client.ir_iter_search('bob', limit=max_rows)), repeat)
+		finally:
+			client.base_url, client.search_url, client.station_url, client.all_stations_url = saved
+			client.configure()
+
+	assert [s['mrl'] for s in old] == [s['mrl'] for s in new]
+	assert [s['current_track'] for s in old] == [s['current_track'] for s in new]
+	return {
+		'max_rows': max_rows,
+		'response_delay_ms': response_delay * 1000,
+		'sequential_ms': old_ms,
+		'streaming_ms': new_ms,
+		'streaming_first_result_ms': first_ms,
+		'parse': _parse_only(repeat * 5),
+	}
+
+
+if __name__ == '__main__':
+	print(json.dumps(run(), indent=4))
@@ -0,0 +1,89 @@
+'''
+CPU spent on live metadata while a live station plays
+- position events are replayed for a simulated listening session against a stub player
+- 'per-event' is the old behaviour (parse metadata on every position event),
+	'rate-limited' is LiveStation's clock-only position callback plus its refresh schedule
+- the stub's parse_metadata makes four ctypes calls into libc, standing in for the four get_meta calls into
+	libVLC. libVLC also takes locks and copies strings, so the real saving is larger
+- cpu_saved_ms is the difference in process CPU time between the two
+
+	$ python -m benchmarks.bench_live_metadata
+'''
+import io
+import json
+import time
+import ctypes
+import ctypes.util
+import contextlib
+from types import SimpleNamespace
+
+from iheart.stations.base import LiveStation, Station
+
+
+_LIBC = ctypes.CDLL(ctypes.util.find_library('c') or ctypes.util.find_library('msvcrt'))
+
+
+class _StubPlayer(object):
+	plr = True
+
+	def __init__(self):
+		self.parse_calls = 0
+		self.meta = {'now_playing': 'Song A', 'title': 'Station', 'artist': 'Artist', 'duration': None}
+
+	def parse_metadata(self):
+		self.parse_calls += 1
+		out = {}
+		for key, value in self.meta.items(): # one foreign call per field, like media.get_meta()
+			_LIBC.strlen(str(value).encode())
+			out[key] = value
+		return out
+
+	def is_stopped(self):
+		return False
+
+
+def _legacy_print_time_cb(station, player, event):
+	meta = player.parse_metadata()
+	if str(meta.get('now_playing')).strip().lower() != str(station.now_playing).strip().lower():
+		station.now_playing = str(meta.get('now_playing')).strip()
+		station.title = str(meta.get('title')).strip()
+		station.artist = str(meta.get('artist')).strip()
+		station.duration = str(meta.get('duration')).strip()
+		print(station, end='\n\r', flush=True)
+	Station._print_time_cb(station, event)
+
+
+def run(minutes=60, events_per_second=10, song_minutes=4):
+	events = int(minutes * 60 * events_per_second)
+	out = {'simulated_minutes': minutes, 'position_events': events}
+
+	for mode in ('per-event', 'rate-limited'):
+		station = LiveStation({'id': 'bench', 'mrl': 'http://localhost/stream'})
+		player = _StubPlayer()
+		next_refresh = 0
+		sink = io.StringIO()
+		st = time.process_time()
+		with contextlib.redirect_stdout(sink):
+			for i in range(events):
+				elapsed = i / events_per_second
+				player.meta['now_playing'] = "Song {}".format(int(elapsed // (song_minutes * 60)))
+				event = SimpleNamespace(elapsed=elapsed)
+				if mode == 'per-event':
+					_legacy_print_time_cb(station, player, event)
+				else:
+					station._print_time_cb(event)
+					if elapsed >= next_refresh: # stands in for LiveStation's refresh timer
+						station._meta_player = player
+						station._refresh_meta()
+						station._cancel_meta_refresh()
+						next_refresh = elapsed + station.META_REFRESH_INTERVAL
+		out[mode] = {
+			'cpu_ms': round(1000 * (time.process_time() - st), 2),
+			'parse_metadata_calls': player.parse_calls,
+		}
+	out['cpu_saved_ms'] = round(out['per-event']['cpu_ms'] - out['rate-limited']['cpu_ms'], 2)
+	return out
+
+
+if __name__ == '__main__':
+	print(json.dumps(run(), indent=4))
@@ -0,0 +1,61 @@
+'''
+Track switch latency in TrackListStation._play_next, without libVLC
+- a LocalPlaylist plays through the null backend (see iheart/backend.py), so what is timed is the station side
+	of a switch - picking the next track, player hand-over, callbacks and the "Now Playing" line
+- 'with_history' also records every switch in iRadio_Storage, like the cli does
+- for the libVLC side of a switch see bench_track_switch
+
+	$ python -m benchmarks.bench_play_next
+'''
+import io
+import sys
+import json
+import time
+import tempfile
+
+from iheart import backend
+from iheart.backend import NullPlayer
+from iheart.storage import iRadio_Storage
+from iheart.stations import LocalPlaylist
+from .bench_playlist_memory import make_tracks
+from .bench_storage import BenchConfigManager
+
+
+def _time_switches(playlist, switches):
+	# one batch - a single switch is tens of microseconds, too close to timer and scheduling noise to compare
+	st = time.perf_counter()
+	for _ in range(switches):
+		playlist._play_next()
+	return {'total_ms': round((time.perf_counter() - st) * 1000, 2)}
+
+
+def run(tracks=10000, switches=2000):
+	track_dicts = make_tracks(tracks)
+	out = {'tracks': tracks, 'switches': switches}
+	previous = backend.set_backend(NullPlayer)
+	stdout, sys.stdout = sys.stdout, io.StringIO()
+	try:
+		for shuffle in (False, True):
+			NullPlayer.reset()
+			playlist = LocalPlaylist({'name': 'bench', 'track_dict_list': track_dicts}, shuffle_seed=1)
+			if shuffle:
+				playlist.toggle_shuffle()
+			out['shuffle' if shuffle else 'in_order'] = _time_switches(playlist, switches)
+			sys.stdout.seek(0)
+			sys.stdout.truncate()
+
+		with tempfile.TemporaryDirectory() as tmp:
+			NullPlayer.reset()
+			store = iRadio_Storage(BenchConfigManager(tmp, **{'history-min-play-seconds': 0}))
+			playlist = LocalPlaylist({'name': 'bench', 'track_dict_list': track_dicts})
+			playlist.on_track_change(store.now_playing)
+			out['with_history'] = _time_switches(playlist, switches)
+	finally:
+		sys.stdout = stdout
+		backend.set_backend(previous)
+		NullPlayer.reset()
+	return out
+
+
+if __name__ == '__main__':
+	print(json.dumps(run(), indent=4))
@@ -0,0 +1,93 @@
+'''
+Memory and construction time of a large LocalPlaylist - eager Track objects (previous implementation) vs
+raw track dicts with Track objects made on demand
+- the track dicts themselves are created before measuring, as they come from storage in both cases
+
+	$ python -m benchmarks.bench_playlist_memory
+'''
+import gc
+import json
+import time
+import tracemalloc
+from collections import deque
+
+from iheart.stations import LocalPlaylist
+
+
+class EagerTrack(object):
+	# the previous Track - copies fields out of the dict and precomputes the duration strings
+	def __init__(self, track_dict):
+		if 'streamUrl' not in track_dict:
+			raise Exception("stream not found")
+		self._dict = track_dict
+		self.mrl = track_dict['streamUrl'].replace("https", 'http')
+		content = track_dict['content']
+		self.id = content['id']
+		self.name = content.get('title')
+		self.version = content.get('version')
+		self.artist = content.get('artistName')
+		self.artist_id = content.get('artistId')
+		self.album = content.get('albumName')
+		self.album_id = content.get('albumId')
+		self.lyrics_id = content.get('lyricsId')
+		self.imageUrl = content.get('imagePath')
+		self.duration = content.get('duration') or 0
+		minutes = self.duration // 60
+		seconds = self.duration % 60
+		self.duration_str = f"{minutes}:{seconds:02d}"
+		self.duration_str_padded = f"{minutes:02d}:{seconds:02d}"
+
+
+def make_tracks(n):
+	return [{
+		'streamUrl': 'https://streams.example.com/track/%d.mp4?token=%032x' % (i, i),
+		'content': {
+			'id': 1000000 + i,
+			'title': 'Track title %d' % i,
+			'version': None,
+			'artistName': 'Artist %d' % (i % 500),
+			'artistId': i % 500,
+			'albumName': 'Album %d' % (i % 2000),
+			'albumId': i % 2000,
+			'lyricsId': i,
+			'imagePath': 'https://images.example.com/%d.jpg' % i,
+			'duration': 120 + i % 300,
+		},
+		'__name__': 'Track',
+		'__id__': 1000000 + i,
+	} for i in range(n)]
+
+
+def _measure(build):
+	# timed and traced in separate runs - tracemalloc slows allocation down a lot
+	gc.collect()
+	st = time.perf_counter()
+	obj = build()
+	elapsed = (time.perf_counter() - st) * 1000
+	del obj
+	gc.collect()
+	tracemalloc.start()
+	obj = build()
+	current, _ = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return obj, round(elapsed, 2), round(current / 2**20, 2)
+
+
+def run(n=100000):
+	tracks = make_tracks(n)
+
+	def old_playlist():
+		track_list = deque([EagerTrack(d) for d in tracks])
+		return track_list, track_list.copy()
+
+	_, old_ms, old_mb = _measure(old_playlist)
+	_, new_ms, new_mb = _measure(lambda: LocalPlaylist({'name': 'bench', 'track_dict_list': tracks}))
+	return {
+		'tracks': n,
+		'eager_tracks': {'build_ms': old_ms, 'memory_mb': old_mb},
+		'lazy_tracks': {'build_ms': new_ms, 'memory_mb': new_mb},
+	}
+
+
+if __name__ == '__main__':
+	print(json.dumps(run(), indent=4))
@@ -0,0 +1,50 @@
+'''
+LocalPlaylist operations on large playlists
+- build, shuffle on / off, next track, peeking ahead, index lookups, jumps and removals
+- each operation is timed as one batch of 'ops' calls spread over the playlist (total ms). single calls take a few
+	microseconds, too close to timer and scheduling noise to compare between runs
+
+	$ python -m benchmarks.bench_playlist_ops
+'''
+import json
+import time
+import random
+
+from iheart.stations import LocalPlaylist
+from .bench_playlist_memory import make_tracks
+
+
+def _timed(func, args):
+	st = time.perf_counter()
+	for arg in args:
+		func(arg)
+	return round((time.perf_counter() - st) * 1000, 2)
+
+
+def _bench(n, ops):
+	tracks = make_tracks(n)
+	rng = random.Random(n)
+	st = time.perf_counter()
+	pl = LocalPlaylist({'name': 'bench', 'track_dict_list': tracks}, shuffle_seed=n)
+	build_ms = round((time.perf_counter() - st) * 1000, 2)
+	pl.forward = lambda: pl._next_track() # no player - just advance
+	pl.set_lookahead(5)
+
+	out = {'build_ms': build_ms, 'ops': ops}
+	out['next_track_ms'] = _timed(lambda _: pl._next_track(), range(ops))
+	out['peek_5_ms'] = _timed(lambda _: pl._peek_upcoming(), range(ops))
+	out['track_list_index_ms'] = _timed(lambda i: pl.track_list[i], [rng.randrange(n // 2) for _ in range(ops)])
+	out['shuffle_toggle_ms'] = _timed(lambda _: pl.toggle_shuffle(), range(ops | 1)) # odd - ends with shuffle on
+	out['next_track_shuffled_ms'] = _timed(lambda _: pl._next_track(), range(ops))
+	out['jump_ms'] = _timed(pl.jump_to, [rng.randrange(n // 2) for _ in range(ops)])
+	ids = [t['content']['id'] for t in rng.sample(tracks, ops)]
+	out['remove_ms'] = _timed(pl.remove_track, ids)
+	return out
+
+
+def run(sizes=(10000, 100000), ops=5000):
+	return {str(n): _bench(n, ops) for n in sizes}
+
+
+if __name__ == '__main__':
+	print(json.dumps(run(), indent=4))
@@ -0,0 +1,97 @@
+'''
+Search latency as the cli sees it - iHeart search (network / response cache) and internet-radio.com search
+- iHeart responses are the recorded json in benchmarks/fixtures/iheart, internet-radio.com pages the html
+	fixtures in benchmarks/fixtures/internet_radio. both are served by a local stand-in
+- response_delay is slept per request to model the round trip
+
+	$ python -m benchmarks.bench_search
+'''
+import os
+import json
+import time
+import tempfile
+import statistics
+
+from iheart.cache import ResponseCache
+from iheart.stations import iHeartArtistStation, iHeartLiveStation, iHeartSongStation
+from iheart.stations.iheart_radio import client
+from iheart.stations.internet_radio import client as ir_client
+from .standin import StandIn
+from .bench_ir_search import _routes as _ir_routes
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'iheart')
+
+
+def _fixture(name):
+	with open(os.path.join(FIXTURES, name), 'r') as f:
+		return json.load(f)
+
+
+def _routes(response_delay):
+	search = _fixture('search_bob.json')
+	def respond(h):
+		time.sleep(response_delay)
+		return search
+	return {'/api/v3/search/all': respond}
+
+
+def _timed(func, repeat):
+	timings = []
+	for _ in range(repeat):
+		st = time.perf_counter()
+		func()
+		timings.append((time.perf_counter() - st) * 1000)
+	return round(statistics.median(timings), 2)
+
+
+def _to_stations(res):
+	# what iHeart_CLI.search() does with a response
+	return [cls(dict(r, user_id=None)) for key, cls in (('artists', iHeartArtistStation), ('stations', iHeartLiveStation), ('tracks', iHeartSongStation)) for r in res['results'][key]]
+
+
+def _iheart(response_delay, repeat):
+	with StandIn(_routes(response_delay)) as standin, tempfile.TemporaryDirectory() as tmp:
+		cache = ResponseCache(os.path.join(tmp, 'responses.db'))
+		uncached = client.iHeartClient(base_url=standin.base_url)
+		cached = client.iHeartClient(base_url=standin.base_url, cache=cache)
+		try:
+			uncached.search('bob') # connection is set up outside the timings
+			network_ms = _timed(lambda: _to_stations(uncached.search('bob')), repeat)
+			cached.search('bob')
+			cache_hit_ms = _timed(lambda: _to_stations(cached.search('bob')), repeat)
+		finally:
+			uncached.close()
+			cached.close()
+			cache.close()
+	return {'network_ms': network_ms, 'cache_hit_ms': cache_hit_ms}
+
+
+def _internet_radio(response_delay, repeat, max_rows):
+	saved = (ir_client.base_url, ir_client.search_url, ir_client.station_url, ir_client.all_stations_url)
+	with StandIn(_ir_routes(response_delay)) as standin:
+		ir_client.base_url = standin.base_url
+		ir_client.search_url = standin.base_url + '/search/?radio={searchTerm}'
+		ir_client.station_url = standin.base_url + '/stations/{station}/'
+		ir_client.all_stations_url = standin.base_url + '/stations/'
+		ir_client.configure()
+		try:
+			ir_client.ir_get_genres()
+			first_ms = _timed(lambda: next(ir_client.ir_iter_search('bob', limit=max_rows)), repeat)
+			full_ms = _timed(lambda: ir_client.ir_search('bob', maxRows=max_rows), repeat)
+		finally:
+			ir_client.base_url, ir_client.search_url, ir_client.station_url, ir_client.all_stations_url = saved
+			ir_client.configure()
+	return {'first_result_ms': first_ms, f'{max_rows}_results_ms': full_ms}
+
+
+def run(response_delay=0.05, repeat=5, max_rows=50):
+	return {
+		'response_delay_ms': response_delay * 1000,
+		'iheart': _iheart(response_delay, repeat),
+		'internet_radio': _internet_radio(response_delay, repeat, max_rows),
+	}
+
+
+if __name__ == '__main__':
+	print(json.dumps(run(), indent=4))
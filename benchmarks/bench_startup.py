@@ -0,0 +1,99 @@
+'''
+CLI startup - time to `iheart --version`, to import the cli module and to the first prompt
+- every run is a fresh interpreter with HOME pointed at a temporary directory
+- the first prompt of `iheart` needs libVLC and is skipped without it. first_prompt_null_ms runs the same cli
+	start-up on the null backend (see iheart/backend.py), so it is measured everywhere
+- the iHeart login runs in the background and isn't waited for
+
+	$ python -m benchmarks.bench_startup
+'''
+import os
+import sys
+import json
+import time
+import tempfile
+import statistics
+import subprocess
+import threading
+
+from iheart.player import vlc_is_installed
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# what `iheart` does after the libVLC check, playing through the null backend
+NULL_BACKEND_CLI = '; '.join([
+	"from iheart import backend",
+	"backend.set_backend(backend.NullPlayer)",
+	"from iheart.conf import ConfigurationManager",
+	"from iheart.cli import iHeart_CLI",
+	"iHeart_CLI(ConfigurationManager()).run_cli(input_category=None, search_term=None)",
+])
+
+
+def _env(home):
+	env = dict(os.environ, HOME=home, PYTHONPATH=ROOT)
+	env.pop('XDG_CONFIG_HOME', None)
+	env.pop('XDG_DATA_HOME', None)
+	return env
+
+
+def time_version(home):
+	st = time.perf_counter()
+	out = subprocess.run([sys.executable, '-m', 'iheart', '--version'], env=_env(home), stdout=subprocess.PIPE, check=True)
+	return (time.perf_counter() - st) * 1000, out.stdout.decode().strip()
+
+
+def time_import(home, module='iheart.cli'):
+	'''cumulative import time of a module in microseconds, from python -X importtime'''
+	out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], env=_env(home), stderr=subprocess.PIPE, check=True)
+	imported = {}
+	for line in out.stderr.decode().splitlines():
+		if line.startswith('import time:') and '|' in line:
+			_, cumulative, name = line[len('import time:'):].split('|')
+			if cumulative.strip().isdigit():
+				imported[name.strip()] = int(cumulative)
+	return imported
+
+
+def time_first_prompt(home, prompt='Pick a category', timeout=20, args=('-m', 'iheart', '--no-color')):
+	'''ms until the category prompt is printed, or None if it doesn't show up in time'''
+	st = time.perf_counter()
+	proc = subprocess.Popen([sys.executable, *args], env=_env(home), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+	found = threading.Event()
+	def _read():
+		for line in proc.stdout:
+			if prompt.encode() in line:
+				found.set()
+				return
+	threading.Thread(target=_read, daemon=True).start()
+	ok = found.wait(timeout)
+	elapsed = (time.perf_counter() - st) * 1000
+	proc.kill()
+	proc.wait()
+	return elapsed if ok else None
+
+
+def run(repeat=5):
+	with tempfile.TemporaryDirectory() as home:
+		version_ms = [time_version(home)[0] for _ in range(repeat)]
+		imports = time_import(home)
+		out = {
+			'version_ms': round(statistics.median(version_ms), 2),
+			'import_cli_ms': round(imports.get('iheart.cli', 0) / 1000, 2),
+			'heaviest_imports_ms': {k: round(v / 1000, 2) for k, v in sorted(imports.items(), key=lambda kv: -kv[1])[1:8]},
+			'first_prompt_ms': None,
+			'first_prompt_null_ms': None,
+		}
+		prompts = [time_first_prompt(home, args=('-c', NULL_BACKEND_CLI)) for _ in range(repeat)]
+		if None not in prompts:
+			out['first_prompt_null_ms'] = round(statistics.median(prompts), 2)
+		if vlc_is_installed():
+			prompts = [time_first_prompt(home) for _ in range(repeat)]
+			if None not in prompts:
+				out['first_prompt_ms'] = round(statistics.median(prompts), 2)
+	return out
+
+
+if __name__ == '__main__':
+	print(json.dumps(run(), indent=4))
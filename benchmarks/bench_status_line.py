@@ -0,0 +1,41 @@
+'''
+CPU spent drawing the playback clock for a simulated listening session
+- 'per-event' formats and writes on every position event (old behaviour)
+- 'status-line' goes through iheart.status.StatusLine (redraw on change, capped at MAX_FPS)
+
+	$ python -m benchmarks.bench_status_line
+'''
+import io
+import json
+import time
+from datetime import timedelta
+
+from iheart.colors import Colors
+from iheart.status import StatusLine
+
+
+def run(minutes=60, events_per_second=10):
+	events = int(minutes * 60 * events_per_second)
+	out = {'simulated_minutes': minutes, 'position_events': events}
+
+	sink = io.StringIO()
+	st = time.process_time()
+	for i in range(events):
+		elapsed = int(i / events_per_second)
+		sink.write(Colors.colorize(f"\t+{timedelta(seconds=elapsed)}\r", Colors.WHITE, bold=True))
+	out['per-event'] = {'cpu_ms': round(1000 * (time.process_time() - st), 2), 'writes': events}
+
+	sink = io.StringIO()
+	line = StatusLine(stream=sink)
+	line.MAX_FPS = float('inf') # events are replayed faster than real time, so the cap would skip seconds
+	writes = 0
+	st = time.process_time()
+	for i in range(events):
+		elapsed = int(i / events_per_second)
+		writes += line.update(elapsed, lambda: f"\t+{timedelta(seconds=elapsed)}\r")
+	out['status-line'] = {'cpu_ms': round(1000 * (time.process_time() - st), 2), 'writes': writes}
+	return out
+
+
+if __name__ == '__main__':
+	print(json.dumps(run(), indent=4))
@@ -0,0 +1,87 @@
+'''
+iRadio_Storage write / load times by library size, for the json and sqlite backends
+- the library is one playlist of n tracks. 'bulk_add_ms' adds all of them with writes batched into one flush
+- 'add_ms' / 'delete_ms' are 'ops' single write-through changes to that playlist, timed as one batch (a keypress in
+	the cli costs one of them)
+- 'open_ms' is startup (storage created, playlists listed) and 'load_playlist_ms' reads the playlist back
+
+	$ python -m benchmarks.bench_storage
+'''
+import os
+import json
+import time
+import tempfile
+
+from iheart.storage import get_storage
+from .bench_playlist_memory import make_tracks
+
+
+class BenchConfigManager(object):
+	'''ConfigurationManager stand-in that keeps everything in memory'''
+
+	def __init__(self, datadir, **overrides):
+		self.datadir = str(datadir)
+		self.overrides = overrides
+
+	def get_datadir(self):
+		return self.datadir
+
+	def get_str(self, key, default):
+		return str(self.overrides.get(key, default))
+
+	def get_int(self, key, default):
+		return int(self.overrides.get(key, default))
+
+	def get_bool(self, key, default):
+		return bool(self.overrides.get(key, default))
+
+
+def _timed(func):
+	st = time.perf_counter()
+	out = func()
+	return out, (time.perf_counter() - st) * 1000
+
+
+def _disk_kb(path):
+	return round(sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files) / 1024, 1)
+
+
+def _bench(backend, n, ops):
+	tracks = make_tracks(n + ops)
+	with tempfile.TemporaryDirectory() as datadir:
+		store = get_storage(BenchConfigManager(datadir, **{'storage-backend': backend, 'storage-write-delay': 3600}))
+		def bulk_add():
+			for track in tracks[:n]:
+				store.add_to_playlist('bench', track)
+			store.flush()
+		_, bulk_ms = _timed(bulk_add)
+
+		def open_store(): # what the cli does at startup
+			store = get_storage(BenchConfigManager(datadir, **{'storage-backend': backend}))
+			store.list_playlists()
+			return store
+		store, open_ms = _timed(open_store)
+		loaded, load_ms = _timed(lambda: store.get_playlist_tracks('bench'))
+		assert len(loaded) == n
+
+		_, add_ms = _timed(lambda: [store.add_to_playlist('bench', track) for track in tracks[n:]])
+		_, delete_ms = _timed(lambda: [store.delete_from_playlist_by_id('bench', track['__id__']) for track in tracks[n:]])
+		return {
+			'bulk_add_ms': round(bulk_ms, 2),
+			'open_ms': round(open_ms, 2),
+			'load_playlist_ms': round(load_ms, 2),
+			'add_ms': round(add_ms, 2),
+			'delete_ms': round(delete_ms, 2),
+			'disk_kb': _disk_kb(datadir),
+		}
+
+
+def run(sizes=(100, 1000, 10000), ops=10):
+	out = {'ops': ops}
+	for backend in ('json', 'sqlite'):
+		out[backend] = {str(n): _bench(backend, n, ops) for n in sizes}
+	return out
+
+
+if __name__ == '__main__':
+	print(json.dumps(run(), indent=4))
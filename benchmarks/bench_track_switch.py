@@ -0,0 +1,55 @@
+'''
+Track switch latency with a fresh libVLC instance per track vs the shared instance
+- needs libVLC, but no sound card (audio goes to the dummy output)
+
+	$ python -m benchmarks.bench_track_switch
+'''
+import os
+import json
+import time
+import wave
+import tempfile
+
+from iheart import player as vlc_player
+from iheart.player import VLCPlayer, VLCInstanceManager
+
+
+def _write_silence(path, seconds=2, rate=8000):
+	with wave.open(path, 'wb') as w:
+		w.setnchannels(1)
+		w.setsampwidth(2)
+		w.setframerate(rate)
+		w.writeframes(b'\x00\x00' * rate * seconds)
+
+
+def _switch(mrls, switches, timeout=5):
+	for i in range(switches):
+		player = VLCPlayer.get_player(mrls[i % len(mrls)])
+		player.play()
+		st = time.time()
+		while 'playing' not in player._timing and time.time()-st < timeout:
+			time.sleep(0.005)
+	VLCPlayer.get_player(mrls[0]).stop()
+
+
+def run(switches=10):
+	vlc_player.VLC_INSTANCE_FLAGS = vlc_player.VLC_INSTANCE_FLAGS.replace("--aout alsa", "") + " --aout=dummy"
+	out = {}
+	with tempfile.TemporaryDirectory() as tmp:
+		mrls = []
+		for name in ('a.wav', 'b.wav'):
+			path = os.path.join(tmp, name)
+			_write_silence(path)
+			mrls.append(path)
+
+		for reuse in (False, True):
+			VLCInstanceManager.REUSE = reuse
+			VLCPlayer.SWITCH_TIMINGS.clear()
+			_switch(mrls, switches)
+			out.update(VLCPlayer.switch_stats())
+		VLCInstanceManager.release()
+	return out
+
+
+if __name__ == '__main__':
+	print(json.dumps(run(), indent=4))
@@ -0,0 +1,99 @@
+'''
+Local HTTP stand-in for the remote APIs used by the benchmarks
+- speaks HTTP/1.1 with keep-alive so connection reuse is visible
+- connect_delay is slept once per new TCP connection to model the TCP+TLS handshake round trips
+'''
+import json
+import time
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+
+class StandIn(object):
+
+	def __init__(self, routes=None, connect_delay=0.0):
+		self.routes = routes or {} # path prefix -> bytes / dict / callable(handler) returning either, or (status, payload)
+		self.connect_delay = connect_delay
+		self.connections = 0
+		self.requests = 0
+		self._server = None
+		self._thread = None
+
+	@property
+	def base_url(self):
+		host, port = self._server.server_address[:2]
+		return f"http://{host}:{port}"
+
+	def _make_handler(self):
+		standin = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = "HTTP/1.1"
+
+			def setup(self):
+				super().setup()
+				self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # headers and body go out as separate writes
+				standin.connections += 1
+				if standin.connect_delay:
+					time.sleep(standin.connect_delay)
+
+			def log_message(self, *args):
+				pass
+
+			def _respond(self):
+				standin.requests += 1
+				length = int(self.headers.get('Content-Length') or 0)
+				self.body = self.rfile.read(length) if length else b''
+				payload = None
+				for prefix in sorted(standin.routes, key=len, reverse=True):
+					if self.path.startswith(prefix):
+						payload = standin.routes[prefix]
+						break
+				if callable(payload):
+					payload = payload(self)
+				status = 200
+				if isinstance(payload, tuple):
+					status, payload = payload
+				if payload is None:
+					self.send_response(404)
+					payload = b'{"error": "not found"}'
+				else:
+					self.send_response(status)
+				if isinstance(payload, (dict, list)):
+					payload = json.dumps(payload).encode()
+				elif isinstance(payload, str):
+					payload = payload.encode()
+				self.send_header('Content-Type', 'application/json' if payload[:1] in (b'{', b'[') else 'text/html')
+				self.send_header('Content-Length', str(len(payload)))
+				self.end_headers()
+				self.wfile.write(payload)
+
+			do_GET = _respond
+			do_POST = _respond
+
+		return Handler
+
+	def start(self):
+		self._server = _ThreadingServer(('127.0.0.1', 0), self._make_handler())
+		self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self):
+		if self._server is not None:
+			self._server.shutdown()
+			self._server.server_close()
+			self._server = None
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *args):
+		self.stop()
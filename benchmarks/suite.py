@@ -0,0 +1,173 @@
+'''
+Runs the benchmark suite, writes the results as json and compares them with a stored baseline
+- every benchmark module has run() returning a dict. SUITE lists the ones that make up the suite
+- each benchmark runs 'rounds' times and the best value of every metric is kept, which takes out most of
+	the noise from other load on the machine
+- results are flattened to dotted keys (eg. "storage.json.1000.add_ms"). keys ending in a unit
+	(_ms, _us, _kb, _mb) are compared with the baseline - lower is better. benchmarks time batches of calls
+	rather than single microsecond calls, so metrics are well above timer and scheduling noise
+- a value is a regression when it is more than 'tolerance' (relative) and its noise floor (absolute) worse.
+	floors are per unit (NOISE_FLOOR), raised for metrics that are noisier by nature (METRIC_FLOORS).
+	the exit status is 1 if there are any, so the suite can gate a change. the default tolerance is loose (50%) -
+	run to run noise on a busy machine is in the tens of percent, while the regressions this is meant to catch
+	(an O(1) path turning O(n), an extra request or fsync per action) are several times slower
+- baselines are only comparable on the same machine. refresh benchmarks/baseline.json with --save-baseline
+- the results json goes to stdout (or --out), progress and the comparison report to stderr
+
+	$ python -m benchmarks [--only storage playlist_ops] [--rounds 3] [--out results.json] [--save-baseline]
+'''
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import importlib
+import traceback
+from collections import OrderedDict
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+SUITE = OrderedDict([ # name -> (module, run() kwargs)
+	('search', ('bench_search', {})),
+	('play_next', ('bench_play_next', {})),
+	('storage', ('bench_storage', {})),
+	('playlist_ops', ('bench_playlist_ops', {})),
+	('startup', ('bench_startup', {})),
+])
+
+NOISE_FLOOR = {'_ms': 2, '_us': 20, '_kb': 8, '_mb': 0.5} # absolute differences below these are never regressions
+METRIC_FLOORS = { # key prefix -> floor in the metric's unit
+	'search.': 10, # dominated by the stand-in's sleeps and thread hand-offs
+	'startup.': 50, # fresh interpreters - disk cache and process start-up
+	'storage.json.': 10, # every write is fsynced
+}
+
+
+def _log(msg):
+	sys.stderr.write(msg + "\n")
+
+
+def _best(a, b):
+	'''merge two results of the same benchmark, keeping the lower value of every metric'''
+	if isinstance(a, dict) and isinstance(b, dict):
+		return OrderedDict((k, _best(v, b[k]) if k in b else v) for k, v in a.items())
+	if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+		return min(a, b)
+	return a
+
+
+def run(names=None, rounds=1):
+	out = OrderedDict()
+	for name in names or SUITE:
+		module, kwargs = SUITE[name]
+		_log(f"running {name}..")
+		st = time.perf_counter()
+		try:
+			bench = importlib.import_module(f'.{module}', __package__)
+			for i in range(rounds):
+				result = bench.run(**kwargs)
+				out[name] = _best(out[name], result) if i else result
+		except Exception as e:
+			traceback.print_exc()
+			out[name] = {'error': str(e)}
+		_log(f"  done in {time.perf_counter() - st:.1f}s")
+	return out
+
+
+def flatten(results, prefix=''):
+	'''{'a': {'b_ms': 1}} -> {'a.b_ms': 1}'''
+	flat = OrderedDict()
+	for key, value in results.items():
+		if isinstance(value, dict):
+			flat.update(flatten(value, prefix + str(key) + '.'))
+		else:
+			flat[prefix + str(key)] = value
+	return flat
+
+
+def _unit(key):
+	for unit in NOISE_FLOOR:
+		if key.endswith(unit):
+			return unit
+	return None
+
+
+def _floor(key, unit):
+	prefixes = [p for p in METRIC_FLOORS if key.startswith(p)]
+	return METRIC_FLOORS[max(prefixes, key=len)] if prefixes else NOISE_FLOOR[unit]
+
+
+def compare(results, baseline, tolerance=0.5):
+	'''(regressions, improvements) - lists of (key, baseline value, current value)'''
+	regressions, improvements = [], []
+	current, base = flatten(results), flatten(baseline)
+	for key, value in current.items():
+		unit = _unit(key)
+		old = base.get(key)
+		if unit is None or not isinstance(value, (int, float)) or not isinstance(old, (int, float)):
+			continue
+		if abs(value - old) < _floor(key, unit):
+			continue
+		if value > old * (1 + tolerance):
+			regressions.append((key, old, value))
+		elif value < old * (1 - tolerance):
+			improvements.append((key, old, value))
+	return regressions, improvements
+
+
+def _report(title, rows):
+	if rows:
+		_log(f"{title}:")
+		for key, old, new in rows:
+			change = f"{(new - old) / old:+.0%}" if old else "new"
+			_log(f"  {key:<55} {old:>10} -> {new:<10} ({change})")
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog='python -m benchmarks', description="run the benchmark suite and compare it with a baseline")
+	parser.add_argument("--only", nargs='+', choices=list(SUITE), help="run only these benchmarks")
+	parser.add_argument("--rounds", type=int, default=3, help="runs per benchmark, the best value of each metric is kept")
+	parser.add_argument("--out", help="write the results to this json file")
+	parser.add_argument("--baseline", default=BASELINE, help="baseline json to compare with (default: %(default)s)")
+	parser.add_argument("--save-baseline", action='store_true', help="store the results as the new baseline")
+	parser.add_argument("--tolerance", type=float, default=0.5, help="relative slowdown allowed before a value counts as a regression (default: %(default)s)")
+	args = parser.parse_args(argv)
+
+	doc = OrderedDict([
+		('created', time.strftime('%Y-%m-%dT%H:%M:%S')),
+		('python', platform.python_version()),
+		('platform', platform.platform()),
+		('rounds', args.rounds),
+		('results', run(args.only, rounds=max(1, args.rounds))),
+	])
+	if args.out:
+		with open(args.out, 'w') as f:
+			json.dump(doc, f, indent=4)
+	else:
+		print(json.dumps(doc, indent=4))
+
+	if args.save_baseline:
+		if args.only and os.path.isfile(args.baseline): # keep the other benchmarks' baselines
+			with open(args.baseline, 'r') as f:
+				stored = json.load(f, object_pairs_hook=OrderedDict)
+			stored['results'].update(doc['results'])
+			doc['results'] = stored['results']
+		with open(args.baseline, 'w') as f:
+			json.dump(doc, f, indent=4)
+		_log(f"baseline saved to {args.baseline}")
+		return 0
+
+	if not os.path.isfile(args.baseline):
+		_log(f"no baseline at {args.baseline} - run with --save-baseline to create one")
+		return 0
+	with open(args.baseline, 'r') as f:
+		baseline = json.load(f)
+	regressions, improvements = compare(doc['results'], baseline['results'], tolerance=args.tolerance)
+	_log(f"compared with the baseline from {baseline.get('created')} ({baseline.get('platform')})")
+	_report("improvements", improvements)
+	_report("regressions", regressions)
+	if not regressions:
+		_log("no regressions")
+	return 1 if regressions else 0
@@ -0,0 +1,390 @@
+'''
+Audio backends that stations play through
+- stations only talk to the PlayerBackend interface, using the event names below. get_backend() returns the
+	backend in use - VLCPlayer (iheart/player.py, imported on first use) unless set_backend() picked another one
+- NullPlayer plays nothing. it runs on a virtual clock that only moves when advance() is called, so station
+	logic can be tested / benchmarked over thousands of tracks in seconds without libVLC or a sound card
+'''
+import threading
+from concurrent import futures
+from urllib.parse import urlsplit
+
+
+# event names accepted by register_event() / remove_event()
+POSITION_CHANGED = 'position-changed'
+END_REACHED = 'end-reached'
+PLAYING = 'playing'
+ERROR = 'error'
+BUFFERING = 'buffering'
+MEDIA_CHANGED = 'media-changed'
+META_CHANGED = 'meta-changed'
+
+
+class PlaybackError(Exception):
+	pass
+
+
+def stream_key(mrl):
+	'''
+	PlayerBackend.STREAM_STATS key of a stream - its host
+	- on-demand track urls are only played once, but tracks keep coming from the same few hosts
+	'''
+	return urlsplit(str(mrl)).netloc.lower() or mrl
+
+
+
+class CachingPolicy(object):
+	'''
+	Decides the network cache (in ms) a stream is opened with
+	- 'fixed' always uses initial
+	- 'adaptive' starts with a small cache for fast first audio. each buffering underrun doubles the cache
+		(up to maximum) for the next stream opened from that host. grown values live in PlayerBackend.STREAM_STATS
+	- config strings look like "adaptive:1500:50000" or "fixed:50000"
+	'''
+	MODES = ('adaptive', 'fixed')
+
+	def __init__(self, mode='adaptive', initial=1500, maximum=50000):
+		if mode not in self.MODES:
+			raise ValueError(f"invalid caching mode - {mode}")
+		self.mode = mode
+		self.initial = int(initial)
+		self.maximum = max(int(maximum), self.initial)
+
+	@classmethod
+	def parse(cls, text):
+		parts = str(text).strip().lower().split(':')
+		if parts[0] == 'fixed':
+			return cls('fixed', *parts[1:2], *parts[1:2])
+		return cls(*parts)
+
+	def __str__(self):
+		if self.mode == 'fixed':
+			return f"fixed:{self.initial}"
+		return f"{self.mode}:{self.initial}:{self.maximum}"
+
+	def __repr__(self):
+		return f"<CachingPolicy {self}>"
+
+	def caching_for(self, mrl):
+		if self.mode == 'adaptive':
+			learned = PlayerBackend.STREAM_STATS.get(stream_key(mrl), {}).get('caching')
+			if learned:
+				return max(self.initial, min(self.maximum, int(learned)))
+		return self.initial
+
+	def grow(self, current):
+		if self.mode == 'adaptive':
+			return min(self.maximum, current * 2)
+		return current
+
+
+
+# **************************************************************************************
+# ********************************* Backend interface **********************************
+# **************************************************************************************
+
+
+class PlayerBackend(object):
+	'''
+	What stations need from an audio player
+	- one player per mrl. get_player(mrl) returns the current one, or stops it and makes a new one when mrl changes
+	- preload(mrl) may warm up the next track while the current one plays. get_player(mrl) picks it up
+	- register_event(name, callback) takes one of the event names at the top of this module. callbacks get an
+		event object with an 'elapsed' attribute - seconds played since play(), not counting pauses
+	- times given to / returned by get_time() and seek() are in seconds
+	'''
+	POSITION_CHANGED = POSITION_CHANGED
+	END_REACHED = END_REACHED
+	PLAYING = PLAYING
+	ERROR = ERROR
+	BUFFERING = BUFFERING
+	MEDIA_CHANGED = MEDIA_CHANGED
+	META_CHANGED = META_CHANGED
+
+	SEEK_STEP = 10 # seconds skipped by forward() / rewind()
+	STREAM_STATS = {} # stream_key(mrl) -> time to first audio, rebuffer count and learned cache size. persisted by storage
+
+	@classmethod
+	def get_player(cls, mrl):
+		raise NotImplementedError("'get_player' should be overridden in a subclass")
+
+	@classmethod
+	def preload(cls, mrl, caching_policy=None):
+		return None # optional
+
+	@classmethod
+	def warm_up(cls):
+		'''get ready to play (load libraries, open the audio device..) without blocking the caller'''
+		pass # optional
+
+	def play(self):
+		raise NotImplementedError("'play' should be overridden in a subclass")
+
+	def stop(self):
+		raise NotImplementedError("'stop' should be overridden in a subclass")
+
+	def toggle_pause(self, pause=True):
+		'''returns is_playing()'''
+		raise NotImplementedError("'toggle_pause' should be overridden in a subclass")
+
+	def is_playing(self):
+		raise NotImplementedError("'is_playing' should be overridden in a subclass")
+
+	def is_paused(self):
+		raise NotImplementedError("'is_paused' should be overridden in a subclass")
+
+	def is_stopped(self):
+		'''True until play() is called and again after stop()'''
+		raise NotImplementedError("'is_stopped' should be overridden in a subclass")
+
+	def wait_until_playing(self, timeout=None):
+		'''block until playback started. returns False on timeout and raises PlaybackError if it failed'''
+		raise NotImplementedError("'wait_until_playing' should be overridden in a subclass")
+
+	def get_time(self):
+		raise NotImplementedError("'get_time' should be overridden in a subclass")
+
+	def seek(self, seconds):
+		raise NotImplementedError("'seek' should be overridden in a subclass")
+
+	def forward(self):
+		self.seek(self.get_time() + self.SEEK_STEP)
+
+	def rewind(self):
+		self.seek(max(0, self.get_time() - self.SEEK_STEP))
+
+	def register_event(self, event_type, callback):
+		raise NotImplementedError("'register_event' should be overridden in a subclass")
+
+	def remove_event(self, event_type):
+		raise NotImplementedError("'remove_event' should be overridden in a subclass")
+
+	def parse_metadata(self):
+		'''dict with 'now_playing', 'title', 'artist' and 'duration' (None when unknown)'''
+		raise NotImplementedError("'parse_metadata' should be overridden in a subclass")
+
+
+
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def get_backend():
+	'''returns the PlayerBackend class stations play through'''
+	global _BACKEND
+	with _BACKEND_LOCK:
+		if _BACKEND is None:
+			from .player import VLCPlayer # imports vlc
+			_BACKEND = VLCPlayer
+		return _BACKEND
+
+
+def set_backend(backend):
+	'''use backend (a PlayerBackend subclass) for everything played from now on. None goes back to the default'''
+	global _BACKEND
+	if backend is not None and not (isinstance(backend, type) and issubclass(backend, PlayerBackend)):
+		raise ValueError(f"not a PlayerBackend - {backend}")
+	with _BACKEND_LOCK:
+		previous, _BACKEND = _BACKEND, backend
+	return previous
+
+
+
+# **************************************************************************************
+# ************************************ Null backend ************************************
+# **************************************************************************************
+
+
+class NullEvent(object):
+
+	def __init__(self, type, elapsed, **kwargs):
+		self.type = type
+		self.elapsed = elapsed
+		self.__dict__.update(kwargs)
+
+
+
+class NullPlayer(PlayerBackend):
+	'''
+	PlayerBackend that plays nothing, on a virtual clock
+	- the clock (NullPlayer.now()) only moves forward in advance(). advance() fires the playing player's
+		POSITION_CHANGED events every POSITION_INTERVAL seconds and END_REACHED when its duration is up
+	- events fire in order, on the thread calling advance() (or play()). callbacks can start the next
+		track and advance() carries on with it, so advance(3600) plays through an hour of tracks
+	- durations come from DURATIONS (mrl -> seconds), else DEFAULT_DURATION. None never ends, like a live stream
+	- mrls in FAILING raise PlaybackError from wait_until_playing(). mrls in STALLING never start, so
+		wait_until_playing() returns False right away (the virtual clock wouldn't move while waiting). set_metadata() fires META_CHANGED
+	'''
+	POSITION_INTERVAL = 1
+	DEFAULT_DURATION = None
+	DURATIONS = {}
+	FAILING = set()
+	STALLING = set()
+	METADATA = {} # mrl -> parse_metadata() values
+	HISTORY = [] # mrls in the order they started playing
+
+	_NOW = 0.0
+	_PLAYER = None
+	_PRELOADED = None
+	_LOCK = threading.RLock()
+
+	def __init__(self, mrl, caching_policy=None):
+		self.mrl = mrl
+		self.caching_policy = caching_policy or CachingPolicy()
+		self.duration = self.DURATIONS.get(mrl, self.DEFAULT_DURATION)
+		self._hooks = {} # event name -> callback
+		self._started = None
+		self._position = 0.0 # seconds played, as of self._since
+		self._since = None # virtual time playback (re)started. None when paused or stopped
+		self._next_tick = None
+		self._paused = False
+
+	@classmethod
+	def reset(cls):
+		'''back to time 0 with no players and no per-mrl settings'''
+		with cls._LOCK:
+			cls._NOW = 0.0
+			cls._PLAYER = None
+			cls._PRELOADED = None
+			cls.DURATIONS.clear()
+			cls.FAILING.clear()
+			cls.STALLING.clear()
+			cls.METADATA.clear()
+			cls.HISTORY.clear()
+
+	@classmethod
+	def now(cls):
+		return cls._NOW
+
+	@classmethod
+	def get_player(cls, mrl):
+		with cls._LOCK:
+			if cls._PLAYER is None or mrl != cls._PLAYER.mrl:
+				if cls._PLAYER is not None:
+					cls._PLAYER.stop()
+				if cls._PRELOADED is not None and cls._PRELOADED.mrl == mrl:
+					cls._PLAYER = cls._PRELOADED
+				else:
+					cls._PLAYER = cls(mrl)
+				cls._PRELOADED = None
+			return cls._PLAYER
+
+	@classmethod
+	def preload(cls, mrl, caching_policy=None):
+		with cls._LOCK:
+			if cls._PLAYER is not None and cls._PLAYER.mrl == mrl:
+				return None
+			if cls._PRELOADED is None or cls._PRELOADED.mrl != mrl:
+				cls._PRELOADED = cls(mrl, caching_policy=caching_policy)
+			return cls._PRELOADED
+
+	@classmethod
+	def set_metadata(cls, mrl, **meta):
+		with cls._LOCK:
+			cls.METADATA[mrl] = meta
+			player = cls._PLAYER
+		if player is not None and player.mrl == mrl and not player.is_stopped():
+			player._fire(META_CHANGED)
+
+	@classmethod
+	def advance(cls, seconds):
+		'''move the virtual clock forward, firing the events that fall due on the way. returns the new time'''
+		target = cls._NOW + seconds
+		while True:
+			with cls._LOCK:
+				player = cls._PLAYER
+				due, event = (None, None) if player is None else player._next_event()
+				if due is None or due > target:
+					cls._NOW = target
+					return cls._NOW
+				cls._NOW = max(cls._NOW, due)
+				if event == POSITION_CHANGED:
+					player._next_tick += cls.POSITION_INTERVAL
+				else:
+					player._position, player._since = player.duration, None
+			player._fire(event)
+
+	def _next_event(self):
+		'''(virtual time, event name) of the next event this player fires by itself'''
+		if self._since is None:
+			return None, None
+		if self.duration is not None:
+			end = self._since + self.duration - self._position
+			if end <= self._next_tick:
+				return end, END_REACHED
+		return self._next_tick, POSITION_CHANGED
+
+	def _fire(self, event_type):
+		callback = self._hooks.get(event_type)
+		if callback is not None:
+			callback(NullEvent(event_type, self.get_time()))
+
+	def play(self):
+		self.stop()
+		self._started = futures.Future()
+		self.HISTORY.append(self.mrl)
+		if self.mrl in self.FAILING:
+			self._started.set_exception(PlaybackError("could not play {}".format(self.mrl)))
+			self._fire(ERROR)
+			return
+		if self.mrl in self.STALLING:
+			return
+		self._since = self._NOW
+		self._next_tick = self._NOW + self.POSITION_INTERVAL
+		self._started.set_result(True)
+		self._fire(PLAYING)
+
+	def stop(self):
+		self._started = None
+		self._position = 0.0
+		self._since = None
+		self._next_tick = None
+		self._paused = False
+
+	def toggle_pause(self, pause=True):
+		if self._started is None or self._started.exception() is not None:
+			return False
+		if pause and self._since is not None:
+			self._position = self.get_time()
+			self._since = None
+		elif not pause and self._since is None and self._position < (self.duration or float('inf')):
+			self._since = self._NOW
+			self._next_tick = self._NOW + self.POSITION_INTERVAL
+		self._paused = pause
+		return self.is_playing()
+
+	def is_playing(self):
+		return self._since is not None
+
+	def is_paused(self):
+		return self._paused
+
+	def is_stopped(self):
+		return self._started is None
+
+	def wait_until_playing(self, timeout=None):
+		if self._started is None or not self._started.done():
+			return False
+		return self._started.result() # resolved in play() - never waits
+
+	def get_time(self):
+		if self._since is None:
+			return self._position
+		return self._position + self._NOW - self._since
+
+	def seek(self, seconds):
+		seconds = max(0, seconds)
+		if self.duration is not None:
+			seconds = min(seconds, self.duration)
+		self._position = seconds
+		if self._since is not None:
+			self._since = self._NOW
+
+	def register_event(self, event_type, callback):
+		self._hooks[event_type] = callback
+
+	def remove_event(self, event_type):
+		self._hooks.pop(event_type, None)
+
+	def parse_metadata(self):
+		return dict(dict.fromkeys(('now_playing', 'title', 'artist', 'duration')), **self.METADATA.get(self.mrl, {}))
@@ -0,0 +1,78 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+
+
+class ResponseCache(object):
+	'''
+	Persistent key -> json value cache for API / scraper responses, stored in a small sqlite file
+	- every entry carries its own ttl. expired entries are kept (until evicted) so callers can serve them stale
+	- above max_entries, the least recently used entries are evicted
+	- hit / miss counters are available through stats()
+	'''
+
+	def __init__(self, path, max_entries=2000):
+		dirname = os.path.dirname(path)
+		if dirname and not os.path.isdir(dirname):
+			os.makedirs(dirname)
+		self.path = path
+		self.max_entries = max_entries
+		self._lock = threading.Lock()
+		self._db = sqlite3.connect(path, check_same_thread=False) # used from background refreshes too, guarded by self._lock
+		self._db.executescript('''
+			CREATE TABLE IF NOT EXISTS entries (
+				key TEXT PRIMARY KEY,
+				value TEXT NOT NULL,
+				expires REAL NOT NULL,
+				accessed REAL NOT NULL
+			);
+			CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+		''')
+		self._count = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+		self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0}
+
+	def get(self, key, max_stale=0):
+		'''
+		returns (value, fresh). value is None on a miss
+		- expired entries are returned with fresh=False if they expired less than max_stale seconds ago
+		'''
+		now = time.time()
+		with self._lock:
+			row = self._db.execute('SELECT value, expires FROM entries WHERE key=?', (key,)).fetchone()
+			if row is None or row[1] + max_stale < now:
+				self._stats['misses'] += 1
+				return None, False
+			fresh = row[1] >= now
+			self._stats['hits' if fresh else 'stale_hits'] += 1
+			with self._db:
+				self._db.execute('UPDATE entries SET accessed=? WHERE key=?', (now, key))
+		return json.loads(row[0]), fresh
+
+	def set(self, key, value, ttl):
+		now = time.time()
+		with self._lock, self._db:
+			added = self._db.execute('INSERT OR IGNORE INTO entries (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+				(key, json.dumps(value), now + ttl, now)).rowcount
+			if not added:
+				self._db.execute('UPDATE entries SET value=?, expires=?, accessed=? WHERE key=?', (json.dumps(value), now + ttl, now, key))
+			self._count += added
+			if self._count > self.max_entries:
+				evict = self._count - self.max_entries
+				self._db.execute('DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed LIMIT ?)', (evict,))
+				self._count -= evict
+
+	def clear(self):
+		with self._lock, self._db:
+			self._db.execute('DELETE FROM entries')
+			self._count = 0
+
+	def stats(self):
+		with self._lock:
+			return dict(self._stats, entries=self._count)
+
+	def close(self):
+		with self._lock:
+			self._db.close()
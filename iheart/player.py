@@ -1,6 +1,12 @@
-import sys
+import os, sys
 import vlc
 import time
+import threading
+from collections import deque
+from concurrent import futures
+
+from . import backend
+from .backend import PlayerBackend, PlaybackError, CachingPolicy # PlaybackError and CachingPolicy used to live here
 
 
 # Silent install VLC on windows
@@ -8,17 +14,17 @@ import time
 # vlc-3.0.11-win32.exe /L=1033 /S
 
 
-VLC_INSTANCE_FLAGS = "--network-caching=50000 --adaptive-use-access"
+VLC_INSTANCE_FLAGS = "--adaptive-use-access" # network caching is set per media by CachingPolicy
 if sys.platform.startswith('linux'):
 	VLC_INSTANCE_FLAGS += " --aout alsa"
 
 
 def vlc_is_installed() -> bool:
+	'''cheap check that libvlc can be loaded. the instance (plugin scan) is created on first use, see VLCInstanceManager.warm_up()'''
 	try:
-		i = vlc.Instance(VLC_INSTANCE_FLAGS) # Create a VLC instance
-		i.release()
+		vlc.libvlc_get_version()
 		return True
-	except NameError:
+	except NameError: # python-vlc raises NameError for functions missing from an unloaded libvlc
 		return False
 
 
@@ -27,34 +33,201 @@ def vlc_is_installed() -> bool:
 # **************************************************************************************
 
 
-class VLCPlayer(object):
-	'''https://www.olivieraubert.net/vlc/python-ctypes/doc/'''
+class VLCInstanceManager(object):
+	'''
+	Process wide owner of the libVLC instance and the media players handed out to VLCPlayer
+	- libVLC is bootstrapped (module scan, audio output) only once and reused for every track
+	- there are two player slots. 'active' plays the current track and 'standby' can be warmed up
+		with the next one (see VLCPlayer.preload). promote_standby() swaps them
+	- set REUSE to False to go back to one instance per play (used to compare track switch timings)
+	'''
+	REUSE = True
+
+	_INSTANCE = None
+	_SLOTS = {'active': {}, 'standby': {}}
+	_LOCK = threading.RLock()
+
+	@classmethod
+	def get_instance(cls):
+		with cls._LOCK:
+			if cls._INSTANCE is None:
+				cls._INSTANCE = vlc.Instance(VLC_INSTANCE_FLAGS) # Create a VLC instance
+				cls._INSTANCE.log_unset()
+			return cls._INSTANCE
+
+	@classmethod
+	def warm_up(cls):
+		'''create the instance and the active player on a background thread, so the first play doesn't wait for them'''
+		def _warm_up():
+			try:
+				cls.get_media_player()
+			except Exception as e:
+				if os.environ.get('RADIO_DEBUG') == "1": print(e)
+		threading.Thread(target=_warm_up, daemon=True).start()
+
+	@classmethod
+	def get_media_player(cls, standby=False):
+		with cls._LOCK:
+			slot = cls._SLOTS['standby' if standby else 'active']
+			if 'media_player' not in slot:
+				slot['media_player'] = cls.get_instance().media_player_new()
+			return slot['media_player']
+
+	@classmethod
+	def get_list_player(cls, standby=False):
+		with cls._LOCK:
+			slot = cls._SLOTS['standby' if standby else 'active']
+			if 'list_player' not in slot:
+				slot['list_player'] = cls.get_instance().media_list_player_new()
+				slot['list_player'].set_media_player(cls.get_media_player(standby=standby))
+			return slot['list_player']
+
+	@classmethod
+	def promote_standby(cls):
+		with cls._LOCK:
+			cls._SLOTS['active'], cls._SLOTS['standby'] = cls._SLOTS['standby'], cls._SLOTS['active']
+
+	@classmethod
+	def release(cls):
+		with cls._LOCK:
+			for slot in cls._SLOTS.values():
+				for key in ('list_player', 'media_player'):
+					if key in slot:
+						slot.pop(key).release()
+			if cls._INSTANCE is not None:
+				cls._INSTANCE.release()
+				cls._INSTANCE = None
+
+
+
+class VLCPlayer(PlayerBackend):
+	'''
+	PlayerBackend on libVLC - https://www.olivieraubert.net/vlc/python-ctypes/doc/
+	- the class level event constants are libVLC event types. register_event() also takes the backend event names
+	'''
 
 	POSITION_CHANGED = vlc.EventType.MediaPlayerPositionChanged
 	END_REACHED = vlc.EventType.MediaPlayerEndReached
+	PLAYING = vlc.EventType.MediaPlayerPlaying
+	ERROR = vlc.EventType.MediaPlayerEncounteredError
+	BUFFERING = vlc.EventType.MediaPlayerBuffering
+	MEDIA_CHANGED = vlc.EventType.MediaPlayerMediaChanged
+	META_CHANGED = vlc.EventType.MediaMetaChanged # media event, see _attach_media_events()
 	_PLAYER = None
+	_PRELOADED = None
+	_LOCK = threading.RLock() # guards _PLAYER / _PRELOADED - preload() runs on a background thread
+	_PREPARE_LOCK = threading.Lock() # one preload at a time - there is only one standby slot
+	_PRELOAD_GEN = 0 # bumped by every preload() and track switch. older preloads give up
+	_STANDBY_OWNER = None # player whose media is on the standby slot
+
+	# callbacks for these events may start a new track, which libVLC doesn't allow from its own event thread
+	_OFF_THREAD_EVENTS = (END_REACHED, MEDIA_CHANGED)
+	_MEDIA_EVENTS = (META_CHANGED,)
+	EVENTS = { # backend event name -> libVLC event type
+		backend.POSITION_CHANGED: POSITION_CHANGED,
+		backend.END_REACHED: END_REACHED,
+		backend.PLAYING: PLAYING,
+		backend.ERROR: ERROR,
+		backend.BUFFERING: BUFFERING,
+		backend.MEDIA_CHANGED: MEDIA_CHANGED,
+		backend.META_CHANGED: META_CHANGED,
+	}
+
+	SWITCH_TIMINGS = deque(maxlen=100) # recent track switch timings, see switch_stats()
 
-	def __init__(self, mrl):
+	def __init__(self, mrl, caching_policy=None):
 		self.mrl = mrl
-		self.inst = None
+		self.caching_policy = caching_policy or CachingPolicy()
+		self._caching = None # network cache the current media was opened with
+		self._rebuffering = False
 		self.plr = None
 		self.list_player = False
+		self._owns_player = False
+		self._standby_plr = None # set by prepare()
 		self._paused = False
 		self._manager = None
-		self._events_registry = {}
+		self._hooks = {} # event type -> {name: callback}
+		self._attached = set()
+		self._media = None
+		self._media_attached = set()
 
 		self._play_start_time = None
 		self._paused_at = None
 		self._total_paused_time = 0
+		self._timing = None
+		self._started = None # future resolved by the first PLAYING / ERROR event after play()
+		self._add_hook(self.PLAYING, 'switch-timing', self._record_switch_timing)
+		self._add_hook(self.PLAYING, 'started', self._on_started)
+		self._add_hook(self.ERROR, 'started', self._on_error)
+		self._add_hook(self.BUFFERING, 'caching', self._on_buffering)
+		self._add_hook(self.MEDIA_CHANGED, 'media-events', self._attach_media_events)
 
 	@classmethod
 	def get_player(cls, mrl):
-		if cls._PLAYER is None:
-			cls._PLAYER = cls(mrl)
-		elif mrl!=cls._PLAYER.mrl:
-			cls._PLAYER.stop()
-			cls._PLAYER = cls(mrl)
-		return cls._PLAYER
+		with cls._LOCK:
+			if cls._PLAYER is None or mrl!=cls._PLAYER.mrl:
+				if cls._PLAYER is not None:
+					cls._PLAYER.stop()
+				cls._PRELOAD_GEN += 1 # a preload still in flight was for the old track
+				if cls._PRELOADED is not None and cls._PRELOADED.mrl==mrl:
+					cls._PLAYER = cls._PRELOADED # already warmed up on the standby slot
+					cls._PRELOADED = None
+				else:
+					if cls._PRELOADED is not None:
+						cls._PRELOADED.discard() # stop buffering a track that won't be played
+					cls._PLAYER = cls(mrl)
+			return cls._PLAYER
+
+	@classmethod
+	def preload(cls, mrl, caching_policy=None):
+		'''
+		Warm up the standby media player with mrl while the current track keeps playing
+		- the next get_player(mrl) picks it up and play() only has to unpause it
+		- preloads run one at a time (_PREPARE_LOCK) and _LOCK is not held while preparing, so get_player()
+			doesn't wait for them. a preload gives up if a newer preload or a track switch came after it
+		'''
+		if not VLCInstanceManager.REUSE:
+			return None
+		with cls._LOCK:
+			cls._PRELOAD_GEN += 1
+			gen = cls._PRELOAD_GEN
+		with cls._PREPARE_LOCK:
+			with cls._LOCK:
+				if gen != cls._PRELOAD_GEN:
+					return None
+				if cls._PRELOADED is not None:
+					if cls._PRELOADED.mrl == mrl:
+						return cls._PRELOADED
+					cls._PRELOADED.discard()
+				if cls._PLAYER is not None and cls._PLAYER.mrl == mrl:
+					return None
+			player = cls(mrl, caching_policy=caching_policy)
+			if not player.prepare():
+				return None
+			with cls._LOCK:
+				if gen == cls._PRELOAD_GEN and (cls._PLAYER is None or cls._PLAYER.mrl != mrl):
+					cls._PRELOADED = player
+					return player
+				player.discard()
+				return None
+
+	@classmethod
+	def warm_up(cls):
+		VLCInstanceManager.warm_up()
+
+	@classmethod
+	def switch_stats(cls):
+		'''mean track switch latency in ms, grouped by whether the libVLC instance was reused'''
+		out = {}
+		for reused in (True, False):
+			timings = [t for t in cls.SWITCH_TIMINGS if t['reused'] is reused and 'playing' in t]
+			if timings:
+				out['reused' if reused else 'new-instance'] = {
+					'count': len(timings),
+					'setup_ms': round(1000 * sum(t['setup'] for t in timings) / len(timings), 2),
+					'playing_ms': round(1000 * sum(t['playing'] for t in timings) / len(timings), 2),
+				}
+		return out
 
 	def get_internal_player(self):
 		if self.plr is None:
@@ -64,7 +237,59 @@ class VLCPlayer(object):
 		else:
 			return self.plr
 
+	def _add_hook(self, event_type, name, callback):
+		self._hooks.setdefault(event_type, {})[name] = callback
+		if self._manager is not None and event_type not in self._attached and event_type not in self._media_attached:
+			self._attach(event_type)
+
+	def _remove_hook(self, event_type, name):
+		self._hooks.get(event_type, {}).pop(name, None)
+
+	def _make_callback(self, event_type):
+		def _dispatch(event):
+			for cb in list(self._hooks.get(event_type, {}).values()):
+				cb(event)
+		if event_type in self._OFF_THREAD_EVENTS:
+			return lambda event: threading.Thread(target=_dispatch, args=(event,), daemon=True).start()
+		return _dispatch
+
+	def _attach(self, event_type):
+		if event_type in self._MEDIA_EVENTS:
+			self._attach_media_events()
+		else:
+			self._manager.event_attach(event_type, self._make_callback(event_type))
+			self._attached.add(event_type)
+
+	def _attach_media_events(self, event=None):
+		'''media events go to whichever media the player is on. list players switch media on their own'''
+		self._detach_media_events()
+		player = self.get_internal_player()
+		media = player.get_media() if player is not None else None
+		if media is None:
+			return
+		self._media = media # keep a reference - event managers are tied to this python object
+		for event_type in self._MEDIA_EVENTS:
+			if self._hooks.get(event_type):
+				media.event_manager().event_attach(event_type, self._make_callback(event_type))
+				self._media_attached.add(event_type)
+
+	def _detach_media_events(self):
+		if self._media is not None:
+			for event_type in self._media_attached:
+				self._media.event_manager().event_detach(event_type)
+		self._media_attached = set()
+		self._media = None
+
+	def _detach_all(self):
+		self._detach_media_events()
+		if self._manager is not None:
+			for event_type in self._attached:
+				self._manager.event_detach(event_type)
+		self._attached = set()
+		self._manager = None
+
 	def register_event(self, event_type, callback):
+		event_type = self.EVENTS.get(event_type, event_type)
 		def _callback_wrapper(event):
 			# add event.elapsed - time since play was called
 			if self._play_start_time is not None:
@@ -72,46 +297,153 @@ class VLCPlayer(object):
 			else:
 				event.elapsed = 999
 			callback(event)
-		if self._manager is not None:
-			self._manager.event_attach(event_type, _callback_wrapper)
-		else:
-			self._events_registry[event_type] = _callback_wrapper
+		self._add_hook(event_type, 'user', _callback_wrapper)
 
 	def remove_event(self, event_type):
-		if self._manager is not None:
-			self._manager.event_detach(event_type)
-		if event_type in self._events_registry:
-			del self._events_registry[event_type]
+		self._remove_hook(self.EVENTS.get(event_type, event_type), 'user')
+
+	def _record_switch_timing(self, event):
+		if self._timing is not None and 'playing' not in self._timing:
+			self._timing['playing'] = time.time() - self._timing['start']
+			self.SWITCH_TIMINGS.append(self._timing)
+			if os.environ.get('RADIO_DEBUG') == "1":
+				sys.stdout.write("track switch: setup {:.0f}ms, playing after {:.0f}ms\n\r".format(
+					1000 * self._timing['setup'], 1000 * self._timing['playing']))
+
+	def _stream_stats(self):
+		return self.STREAM_STATS.setdefault(backend.stream_key(self.mrl), {'plays': 0, 'rebuffers': 0})
+
+	def _on_started(self, event):
+		if self._started is not None and not self._started.done():
+			stats = self._stream_stats()
+			stats['plays'] += 1
+			stats['ttfa_ms'] = round(1000 * (time.time() - self._timing['start'])) # time to first audio
+			stats['ttfa_ms_avg'] = round(stats.get('ttfa_ms_avg', stats['ttfa_ms']) * 0.8 + stats['ttfa_ms'] * 0.2)
+			stats['caching'] = self._caching
+			stats['last_played'] = int(time.time())
+			self._started.set_result(True)
+
+	def _on_buffering(self, event):
+		if self._started is None or not self._started.done():
+			return # initial buffering, not an underrun
+		if event.u.new_cache < 100:
+			if not self._rebuffering: # count each dip once, libVLC reports progress many times while refilling
+				self._rebuffering = True
+				stats = self._stream_stats()
+				stats['rebuffers'] += 1
+				stats['caching'] = self.caching_policy.grow(stats.get('caching') or self._caching)
+		else:
+			self._rebuffering = False
+
+	def _on_error(self, event):
+		if self._started is not None and not self._started.done():
+			self._started.set_exception(PlaybackError("could not play {}".format(self.mrl)))
+
+	def wait_until_playing(self, timeout=None):
+		'''
+		Block until libVLC reports that the media started playing
+		- returns True once playing, False if timeout expires first
+		- raises PlaybackError as soon as libVLC reports an error
+		'''
+		if self._started is None:
+			return self.is_playing()
+		try:
+			return self._started.result(timeout=timeout)
+		except futures.TimeoutError:
+			return False
+
+	def _ext(self):
+		return (self.mrl.rpartition(".")[2])[:3]
+
+	def prepare(self):
+		'''open self.mrl on the standby player slot. it buffers and then pauses on the first frame'''
+		if self._ext() == "mp3":
+			return False # these use their own player, see play()
+		inst = VLCInstanceManager.get_instance()
+		self._caching = self.caching_policy.caching_for(self.mrl)
+		media = inst.media_new(self.mrl, ':start-paused', f':network-caching={self._caching}')
+		if self._ext() in ['pls', 'm3u']:
+			media_list = inst.media_list_new()
+			media_list.add_media(media)
+			plr = VLCInstanceManager.get_list_player(standby=True)
+			plr.set_media_list(media_list)
+			self.list_player = True
+		else:
+			plr = VLCInstanceManager.get_media_player(standby=True)
+			plr.set_media(media)
+			self.list_player = False
+		plr.play()
+		with self._LOCK:
+			self._standby_plr = plr
+			type(self)._STANDBY_OWNER = self
+		return True
+
+	def discard(self):
+		'''drop a prepared (but never played) standby player. the slot is only stopped while this player owns it'''
+		with self._LOCK:
+			cls = type(self)
+			if self._standby_plr is not None:
+				if cls._STANDBY_OWNER is self:
+					self._standby_plr.stop()
+					cls._STANDBY_OWNER = None
+				self._standby_plr = None
+			if cls._PRELOADED is self:
+				cls._PRELOADED = None
+
+	def _promote(self):
+		with self._LOCK:
+			VLCInstanceManager.promote_standby()
+			self.plr = self._standby_plr
+			self._standby_plr = None
+			if type(self)._STANDBY_OWNER is self:
+				type(self)._STANDBY_OWNER = None
+		self.plr.set_pause(0)
 
 	def play(self):
+		switch_start = time.time()
 		self.stop()
-		self.inst = vlc.Instance(VLC_INSTANCE_FLAGS) # Create a VLC instance
-		self.inst.log_unset()
-		ext = (self.mrl.rpartition(".")[2])[:3]
-		if ext in ['pls', 'm3u']:
-			media_list = self.inst.media_list_new()
-			media_list.add_media(self.mrl)
-			self.plr = self.inst.media_list_player_new()
+		inst = VLCInstanceManager.get_instance()
+		ext = self._ext()
+		if self._standby_plr is None: # prepared players already have their media set up
+			self._caching = self.caching_policy.caching_for(self.mrl)
+		caching_option = f':network-caching={self._caching}'
+		if self._standby_plr is not None:
+			self.plr = self._standby_plr # promoted below, once events are attached
+		elif ext in ['pls', 'm3u']:
+			media_list = inst.media_list_new()
+			media_list.add_media(inst.media_new(self.mrl, caching_option))
+			self.plr = VLCInstanceManager.get_list_player()
 			self.plr.set_media_list(media_list)
 			self.list_player = True
 			# print("playing playlist>")
 		elif ext == "mp3":
 			self.plr = vlc.MediaPlayer(self.mrl) # for some reason some mp3 can't be played with self.inst.media_player_new()
+			self.plr.get_media().add_option(caching_option)
 			self.list_player = False
+			self._owns_player = True
 		else:
-			media = self.inst.media_new(self.mrl)
-			self.plr = self.inst.media_player_new()
-			self.plr.set_media(media)
+			self.plr = VLCInstanceManager.get_media_player()
+			self.plr.set_media(inst.media_new(self.mrl, caching_option))
 			self.list_player = False
 			# print("playing>")
 
+		self._timing = {
+			'mrl': self.mrl,
+			'reused': VLCInstanceManager.REUSE,
+			'start': switch_start,
+			'setup': time.time() - switch_start, # engine bootstrap (if any) + media swap
+		}
 		self._play_start_time = time.time()
+		self._started = futures.Future()
 		self._manager = self.get_internal_player().event_manager()
-		# apply cached events that were registered before _manager was created
-		for evt, cb in self._events_registry.items():
-			self.register_event(evt, cb)
-		self._events_registry = {}
-		self.plr.play()
+		for evt in self._hooks:
+			self._attach(evt)
+		if self._standby_plr is not None:
+			self._promote()
+			if self.plr.get_state() == vlc.State.Error: # failed while warming up - no event will follow
+				self._on_error(None)
+		else:
+			self.plr.play()
 
 	def is_playing(self):
 		return self.plr is not None and self.plr.is_playing()
@@ -119,29 +451,34 @@ class VLCPlayer(object):
 	def is_paused(self):
 		return self._paused
 
+	def is_stopped(self):
+		return self.plr is None
+
 	def stop(self):
 		if self.plr is not None:
+			# detach first - the media players are shared with the next track
+			self._detach_all()
 			if not self.plr.get_state() in (vlc.State.Ended, vlc.State.Stopped):
 				self.plr.stop()
-			self.plr.release()
+			if self._owns_player:
+				self.plr.release()
 			self.plr = None
-		if self.inst is not None:
-			self.inst.release()
-			self.inst = None
+			self._owns_player = False
+			if not VLCInstanceManager.REUSE:
+				VLCInstanceManager.release()
 		self._manager = None
+		self._started = None
+		self._rebuffering = False
 		self._play_start_time = None
 		self._paused_at = None
 		self._total_paused_time = 0
 
-	def forward(self):
-		"""Go forward 10 secs"""
+	def get_time(self):
 		player = self.get_internal_player()
-		player.set_time(player.get_time() + 10000)
+		return max(0, player.get_time()) / 1000 if player is not None else 0
 
-	def rewind(self):
-		"""Go back 10 secs"""
-		player = self.get_internal_player()
-		player.set_time(player.get_time() - 10000)
+	def seek(self, seconds):
+		self.get_internal_player().set_time(int(seconds * 1000))
 
 	def toggle_pause(self, pause=True):
 		self.plr.set_pause(1 if pause else 0)
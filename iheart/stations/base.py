@@ -1,9 +1,13 @@
 import os, sys
 import time
+import threading
+from collections import deque
 from datetime import timedelta
 
 from iheart.colors import Colors
-from iheart.player import VLCPlayer
+from iheart.status import status_line
+from iheart import backend
+from iheart.backend import get_backend, CachingPolicy
 
 
 
@@ -15,6 +19,7 @@ class Station(object):
 	- it has just one mrl / track which is expected to keep playing
 	'''
 	CURRENT_PLAYING_MRL = ''
+	CACHING_POLICY = CachingPolicy('adaptive', 1500, 50000) # live streams - can be changed per station type in config
 
 	def __init__(self, station_dict):
 		self._dict = station_dict
@@ -49,9 +54,7 @@ class Station(object):
 
 	def _print_time_cb(self, event):
 		elapsed = int(event.elapsed)
-		hhmmss = str(timedelta(seconds=elapsed))
-		countdown = f"\t+{hhmmss}\r"
-		sys.stdout.write(Colors.colorize(countdown, Colors.WHITE, bold=True))
+		status_line.update(elapsed, lambda: f"\t+{timedelta(seconds=elapsed)}\r")
 
 
 	def _end_reached_cb(self, event):
@@ -59,7 +62,7 @@ class Station(object):
 		pass
 
 	def get_player(self):
-		return VLCPlayer.get_player(self.mrl)
+		return get_backend().get_player(self.mrl)
 
 	def play(self):
 		if self.mrl is not None:
@@ -69,17 +72,15 @@ class Station(object):
 					sys.stdout.write(Colors.colorize(self.mrl, Colors.GRAY) + "\n\r")
 
 			player = self.get_player()
-			player.register_event(player.END_REACHED, self._end_reached_cb)
+			player.caching_policy = self.CACHING_POLICY
+			player.register_event(backend.END_REACHED, self._end_reached_cb)
 			self.show_time()
 			player.play()
 			# media url might take a bit to load. while loading, is_playing returns False.
-			# - sleeping a bit to allow time for the player to load the url and start playing
+			# - wait for the player to report that it started playing (or failed)
 			# - time this out at 10 seconds
 			sys.stdout.write("\r\t..:..\r")
-			st = time.time()
-			while not player.is_playing() and time.time()-st < 10:
-				time.sleep(0.5)
-			if not player.is_playing():
+			if not player.wait_until_playing(timeout=10):
 				raise TimeoutError("could not play {}".format(self.mrl))
 			self.CURRENT_PLAYING_MRL = self.mrl # register class level current playing mrl
 
@@ -109,10 +110,11 @@ class Station(object):
 		return {'mrl': self.mrl, 'id': self.id, 'name': self.name}
 
 	def show_time(self, show=True):
+		status_line.reset()
 		if show:
-			self.get_player().register_event(VLCPlayer.POSITION_CHANGED, self._print_time_cb)
+			self.get_player().register_event(backend.POSITION_CHANGED, self._print_time_cb)
 		else:
-			self.get_player().remove_event(VLCPlayer.POSITION_CHANGED)
+			self.get_player().remove_event(backend.POSITION_CHANGED)
 
 	def on_track_change(self, func): # register callback function
 		self._track_change_cbs.add(func)
@@ -120,6 +122,13 @@ class Station(object):
 
 
 class Track(object):
+	'''
+	One on-demand track, a thin view over the API track dict
+	- only the id is read up front. other fields are read from the dict when used, so that large
+		playlists can keep plain dicts around and create Track objects just before playing / printing them
+	'''
+	__slots__ = ('_dict', 'id')
+
 	# store a class level current playing MRL.
 	# - check against this to identify if track is being repeated
 	CURRENT_PLAYING_MRL = ''
@@ -128,24 +137,32 @@ class Track(object):
 		if 'streamUrl' not in track_dict:
 			raise Exception("stream not found")
 		self._dict = track_dict
-		self.mrl = track_dict['streamUrl'].replace("https", 'http')
-
-		content = track_dict['content']
-		self.id = content['id']
-		self.name = content.get('title')
-		self.version = content.get('version')
-		self.artist = content.get('artistName')
-		self.artist_id = content.get('artistId')
-		self.album = content.get('albumName')
-		self.album_id = content.get('albumId')
-		self.lyrics_id = content.get('lyricsId')
-		self.imageUrl = content.get('imagePath')
-
-		self.duration = content.get('duration') or 0
-		minutes = self.duration // 60
-		seconds = self.duration % 60
-		self.duration_str = f"{minutes}:{seconds:02d}"
-		self.duration_str_padded = f"{minutes:02d}:{seconds:02d}"
+		self.id = track_dict['content']['id']
+
+	@property
+	def mrl(self):
+		return self._dict['streamUrl'].replace("https", 'http')
+
+	name = property(lambda self: self._dict['content'].get('title'))
+	version = property(lambda self: self._dict['content'].get('version'))
+	artist = property(lambda self: self._dict['content'].get('artistName'))
+	artist_id = property(lambda self: self._dict['content'].get('artistId'))
+	album = property(lambda self: self._dict['content'].get('albumName'))
+	album_id = property(lambda self: self._dict['content'].get('albumId'))
+	lyrics_id = property(lambda self: self._dict['content'].get('lyricsId'))
+	imageUrl = property(lambda self: self._dict['content'].get('imagePath'))
+
+	@property
+	def duration(self):
+		return self._dict['content'].get('duration') or 0
+
+	@property
+	def duration_str(self):
+		return "{}:{:02d}".format(*divmod(self.duration, 60))
+
+	@property
+	def duration_str_padded(self):
+		return "{:02d}:{:02d}".format(*divmod(self.duration, 60))
 
 	def get_dict(self):
 		return self._dict
@@ -172,17 +189,50 @@ class TrackListStation(Station):
 	This Station subclass implements a more advanced station which contains multiple tracks
 	- it has multiple Track objects which plays one after the other
 	- this is controlled by overriding self.iter_tracks() [required]
+	- with lookahead > 0, upcoming tracks are resolved in the background and the next one is preloaded into a
+		standby player while the current track plays. override self._peek_upcoming() if upcoming tracks can be
+		read without consuming self.iter_tracks()
 	'''
+	CACHING_POLICY = CachingPolicy('adaptive', 1000, 20000) # on-demand tracks don't need a large buffer to start
+
 	def __init__(self, station_dict):
 		super().__init__(station_dict=station_dict)
 
 		self.current_track = None
 		self.repeat = False
+		self.lookahead = 0
+		self._upcoming = deque()
+		self._lookahead_lock = threading.RLock()
 		self._track_generator = self.iter_tracks()
 
 	def iter_tracks(self):
 		raise NotImplementedError("'iter_tracks' should be overridden in a subclass")
 
+	def set_lookahead(self, depth):
+		'''number of upcoming tracks to resolve while the current one plays (0 disables preloading)'''
+		self.lookahead = max(0, int(depth))
+
+	def _peek_upcoming(self):
+		'''return upcoming tracks without consuming them - pulls ahead from the track generator'''
+		with self._lookahead_lock:
+			while len(self._upcoming) < self.lookahead:
+				self._upcoming.append(next(self._track_generator))
+			return list(self._upcoming)
+
+	def _next_track(self):
+		with self._lookahead_lock:
+			if self._upcoming:
+				return self._upcoming.popleft()
+			return next(self._track_generator)
+
+	def _preload_next(self):
+		try:
+			upcoming = self._peek_upcoming()
+			if upcoming and not self.repeat:
+				get_backend().preload(upcoming[0].mrl, caching_policy=self.CACHING_POLICY)
+		except Exception as e:
+			if os.environ.get('RADIO_DEBUG') == "1": print(e)
+
 	def get_current_track(self):
 		return self.current_track
 
@@ -196,12 +246,10 @@ class TrackListStation(Station):
 			print(e)
 
 	def _print_time_cb(self, event): # overridden
-		if self.current_track is not None:
-			remaining = int(self.current_track.duration - event.elapsed)
-			m = remaining // 60
-			s = (remaining % 60)
-			countdown = f"\t-{m:02d}:{s:02d}/{self.current_track.duration_str_padded}\r"
-			sys.stdout.write(Colors.colorize(countdown, Colors.WHITE, bold=True))
+		track = self.current_track
+		if track is not None:
+			remaining = int(track.duration - event.elapsed)
+			status_line.update((track.id, remaining), lambda: f"\t-{remaining // 60:02d}:{remaining % 60:02d}/{track.duration_str_padded}\r")
 
 
 	def _end_reached_cb(self, event): # overridden
@@ -210,7 +258,7 @@ class TrackListStation(Station):
 	def _play_next(self):
 		if self.repeat == False:
 			# go to the next track only if not in repeat mode
-			self.current_track = next(self._track_generator)
+			self.current_track = self._next_track()
 			self.mrl = self.current_track.mrl
 
 		if self.mrl != self.CURRENT_PLAYING_MRL:
@@ -226,6 +274,8 @@ class TrackListStation(Station):
 				print(e)
 
 		super().play()
+		if self.lookahead > 0:
+			threading.Thread(target=self._preload_next, daemon=True).start()
 
 
 	def play(self):
@@ -242,8 +292,13 @@ class LiveStation(Station):
 	'''
 	This is a small enhancement to Station class
 	- for live radio, we don't have a song name.
-	- this class implements metadata parsing and prints self when track changes by overriding _print_time_cb
+	- this class implements metadata parsing and prints self when track changes
+	- metadata is refreshed when libVLC reports a meta change (at most once every META_MIN_INTERVAL seconds)
+		and polled every META_REFRESH_INTERVAL seconds for streams that don't report changes.
+		position events only update the clock
 	'''
+	META_MIN_INTERVAL = 1
+	META_REFRESH_INTERVAL = 15
 
 	def __init__(self, station_dict):
 		super().__init__(station_dict)
@@ -251,6 +306,11 @@ class LiveStation(Station):
 		self.artist = None
 		self.title = None
 		self.duration = None
+		self._meta_player = None
+		self._meta_timer = None
+		self._meta_due = None
+		self._last_meta_refresh = 0
+		self._meta_lock = threading.Lock()
 
 	def _get_descr(self): # override
 		if self.now_playing is not None:
@@ -262,16 +322,57 @@ class LiveStation(Station):
 			)
 		return super()._get_descr()
 
-	def _print_time_cb(self, event): # override
-		player = self.get_player()
+	def _schedule_meta_refresh(self, delay):
+		due = time.time() + delay
+		with self._meta_lock:
+			if self._meta_timer is not None:
+				if self._meta_due <= due:
+					return # an earlier refresh is already pending
+				self._meta_timer.cancel()
+			self._meta_due = due
+			self._meta_timer = threading.Timer(delay, self._refresh_meta)
+			self._meta_timer.daemon = True
+			self._meta_timer.start()
+
+	def _cancel_meta_refresh(self):
+		with self._meta_lock:
+			if self._meta_timer is not None:
+				self._meta_timer.cancel()
+				self._meta_timer = None
+			self._meta_player = None
+
+	def _meta_changed_cb(self, event):
+		wait = self.META_MIN_INTERVAL - (time.time() - self._last_meta_refresh)
+		self._schedule_meta_refresh(max(0, wait))
+
+	def _refresh_meta(self):
+		with self._meta_lock:
+			self._meta_timer = None
+			player = self._meta_player
+		if player is None or player.is_stopped():
+			return # station was stopped or replaced by another one
+		self._last_meta_refresh = time.time()
 		meta = player.parse_metadata()
-		if str(meta.get('now_playing')).strip().lower() != str(self.now_playing).strip().lower():
-			self.now_playing = str(meta.get('now_playing')).strip()
+		now_playing = str(meta.get('now_playing')).strip()
+		if now_playing.lower() != str(self.now_playing).strip().lower():
+			self.now_playing = now_playing
 			self.title = str(meta.get('title')).strip()
 			self.artist = str(meta.get('artist')).strip()
 			self.duration = str(meta.get('duration')).strip()
 			print(self, end='\n\r', flush=True)
-		return super()._print_time_cb(event)
+		self._schedule_meta_refresh(self.META_REFRESH_INTERVAL)
+
+	def play(self): # override
+		if self.mrl is not None:
+			self.get_player().register_event(backend.META_CHANGED, self._meta_changed_cb)
+		super().play()
+		if self.mrl is not None:
+			self._meta_player = self.get_player()
+			self._schedule_meta_refresh(0)
+
+	def stop(self): # override
+		self._cancel_meta_refresh()
+		super().stop()
 
 	def forward(self): # override - disable forwarding
 		pass
@@ -0,0 +1,139 @@
+'''
+asyncio variant of the iHeart API client, for fanning out independent calls
+- requests has no asyncio API (and aiohttp is not a dependency), so every call runs the pooled, keep-alive
+	client from client.py on a thread pool. a semaphore bounds the calls in flight to the connection pool size
+- the sync facade at the bottom runs coroutines on a private event loop thread, so blocking code (the CLI)
+	can use multi-call workflows without becoming async itself
+'''
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import client
+
+
+
+class AsyncIHeartClient(object):
+	'''
+	Same surface as client.iHeartClient, as coroutines
+	- calls go through client.get_client() unless a client is given, so client.configure() replacements are picked up
+	'''
+
+	def __init__(self, sync_client=None, concurrency=None):
+		self._client = sync_client
+		self.concurrency = concurrency or (sync_client or client.get_client()).pool_size
+		self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+		self._semaphore = None
+		self._semaphore_loop = None
+
+	@property
+	def client(self):
+		return self._client or client.get_client()
+
+	def _get_semaphore(self, loop):
+		# asyncio primitives are bound to the loop they are first used on (python < 3.10)
+		if self._semaphore_loop is not loop:
+			self._semaphore = asyncio.Semaphore(self.concurrency)
+			self._semaphore_loop = loop
+		return self._semaphore
+
+	async def _call(self, name, *args, **kwargs):
+		loop = asyncio.get_running_loop()
+		async with self._get_semaphore(loop):
+			return await loop.run_in_executor(self._executor, functools.partial(getattr(self.client, name), *args, **kwargs))
+
+	def close(self):
+		self._executor.shutdown(wait=False)
+
+	# -=-=-=-=-=-=-=-=-=-=-=-=- single calls -=-=-=-=-=-=-=-=-=-=-=-=-
+
+	async def search(self, keyword, startIndex=0, maxRows=10, marketId=159):
+		return await self._call('search', keyword, startIndex=startIndex, maxRows=maxRows, marketId=marketId)
+
+	async def get_station_streams(self, stream_id):
+		return await self._call('get_station_streams', stream_id)
+
+	async def get_live_meta(self, stream_id):
+		return await self._call('get_live_meta', stream_id)
+
+	async def get_artist_profile(self, artist_id):
+		return await self._call('get_artist_profile', artist_id)
+
+	async def get_artist_bio(self, artist_id):
+		return await self._call('get_artist_bio', artist_id)
+
+	async def get_similar_artists(self, artist_id):
+		return await self._call('get_similar_artists', artist_id)
+
+	async def get_artist_station(self, user_id, artist_id):
+		return await self._call('get_artist_station', user_id, artist_id)
+
+	async def get_artist_streams(self, astream_id):
+		return await self._call('get_artist_streams', astream_id)
+
+	async def get_track_info(self, track_id):
+		return await self._call('get_track_info', track_id)
+
+	# -=-=-=-=-=-=-=-=-=-=-=-=- fan-out workflows -=-=-=-=-=-=-=-=-=-=-=-=-
+
+	async def get_artist_info(self, artist_id):
+		'''profile, bio and similar artists, requested concurrently'''
+		profile, bio, similar = await asyncio.gather(
+			self.get_artist_profile(artist_id),
+			self.get_artist_bio(artist_id),
+			self.get_similar_artists(artist_id),
+		)
+		return {'profile': profile, 'bio': bio, 'similar': similar}
+
+	async def get_each_station_streams(self, stream_ids):
+		'''{stream_id: streams} with one request per station, all in flight together. failed lookups are left out'''
+		results = await asyncio.gather(*[self.get_station_streams(i) for i in stream_ids], return_exceptions=True)
+		return {i: r for i, r in zip(stream_ids, results) if not isinstance(r, Exception)}
+
+
+
+# **************************************************************************************
+# ************************************ Sync facade *************************************
+# **************************************************************************************
+
+_ACLIENT = None
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+
+
+def get_aclient():
+	'''returns the shared async client'''
+	global _ACLIENT
+	if _ACLIENT is None:
+		_ACLIENT = AsyncIHeartClient()
+	return _ACLIENT
+
+
+def _get_loop():
+	global _LOOP
+	with _LOOP_LOCK:
+		if _LOOP is None:
+			_LOOP = asyncio.new_event_loop()
+			threading.Thread(target=_LOOP.run_forever, name='iheart-aclient', daemon=True).start()
+	return _LOOP
+
+
+def run(coro, timeout=None):
+	'''run a coroutine on the background event loop and block until its result is ready'''
+	return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
+
+
+def run_all(*coros, timeout=None):
+	'''run coroutines concurrently and return their results in order'''
+	async def _gather():
+		return await asyncio.gather(*coros)
+	return run(_gather(), timeout=timeout)
+
+
+def iget_artist_info(artist_id):
+	return run(get_aclient().get_artist_info(artist_id))
+
+
+def iget_each_station_streams(stream_ids):
+	return run(get_aclient().get_each_station_streams(list(stream_ids)))
@@ -1,6 +1,11 @@
-import requests
 import uuid
 import os
+import json
+import time
+import threading
+from concurrent import futures
+
+API_HOST = 'https://us.api.iheart.com'
 
 new_user_url = 'https://us.api.iheart.com/api/v1/account/loginOrCreateOauthUser'
 markets_url = 'https://us.api.iheart.com/api/v2/content/markets?countryCode=US&limit=1&cache=true&zipCode={zipCode}'
@@ -31,23 +36,366 @@ HEADERS = {
 	"User-Agent": "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:68.0) Gecko/20100101 Firefox/68.0",
 	"Accept": "application/json, text/plain, */*",
 	"Accept-Language": "en-US,en;q=0.5",
-	"Accept-Encoding": "gzip, deflate, br",
+	"Accept-Encoding": "gzip, deflate", # requests can't decode br without extra packages
 	"Referer": "https://www.iheart.com/",
 	"X-hostName": "webapp.US",
 	"X-Locale": "en-US",
 	"Origin": "https://www.iheart.com",
 	"DNT": "1",
-	# "Connection": "keep-alive"
+	"Connection": "keep-alive"
 }
 
+DEFAULT_POOL_SIZE = 4
+SESSION_MAX_AGE = 7*24*60*60 # seconds a cached anonymous session is reused before logging in again
+
+# seconds a cached response stays fresh, per endpoint (see iHeartClient._cached)
+# artist stations and playback streams are per-session POSTs and are never cached. live meta changes every song
+CACHE_TTLS = {
+	'search': 60*60,
+	'artist_profile': 24*60*60,
+	'artist_bio': 24*60*60,
+	'track_info': 7*24*60*60,
+	'station_streams': 10*60,
+}
+# endpoints whose expired entries are served right away while a background request refreshes them (seconds past expiry)
+# stream urls go stale (tokens, moved servers), so they are only served for a short while. see iHeartLiveStation.play
+STALE_WHILE_REVALIDATE = {'station_streams': 20*60}
+
+
+
+class iHeartClient(object):
+	'''
+	Owns a pooled keep-alive requests.Session to the iHeart API
+	- one client is shared by all stations (see get_client()), so consecutive calls reuse open connections
+	- auth headers set by login() live on the session instead of the global HEADERS
+	- the session (and requests) is only loaded on first use, usually by the background login
+	- catalog and search responses are kept in an optional ResponseCache (see CACHE_TTLS)
+	'''
+
+	def __init__(self, pool_size=DEFAULT_POOL_SIZE, base_url=API_HOST, cache=None):
+		self.pool_size = pool_size
+		self.base_url = base_url.rstrip('/')
+		self.user = None
+		self.cache = cache
+		self._pending_login = None # Future of a login() running in the background
+		self._login_args = None # (uuid_filepath, session_filepath) of the last login(), for re-login
+		self._relogin_lock = threading.Lock()
+		self._revalidating = set()
+		self._revalidating_lock = threading.Lock()
+		self._session = None
+		self._session_lock = threading.Lock()
+
+	@property
+	def session(self):
+		if self._session is None:
+			with self._session_lock:
+				if self._session is None:
+					import requests # imported on first use - it adds noticeably to cli startup
+					from requests.adapters import HTTPAdapter
+					session = requests.Session()
+					session.headers.update(HEADERS)
+					if self.base_url != API_HOST:
+						del session.headers['Host'] # let requests set Host for non-default (test / benchmark) servers
+					adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+					session.mount('https://', adapter)
+					session.mount('http://', adapter)
+					self._session = session
+		return self._session
+
+	def _url(self, url):
+		if self.base_url != API_HOST and url.startswith(API_HOST):
+			return self.base_url + url[len(API_HOST):]
+		return url
+
+	def _request(self, method, url, **kwargs):
+		'''
+		send a request with the session's auth headers
+		- on a 401 (expired / unknown session) log in again and retry the request once
+		'''
+		self._await_login()
+		session_id = self.session.headers.get('X-Session-Id')
+		res = self.session.request(method, self._url(url), **kwargs)
+		if res.status_code == 401 and self._login_args is not None:
+			with self._relogin_lock:
+				if self.session.headers.get('X-Session-Id') == session_id: # not already renewed by another thread
+					self.login(*self._login_args, reuse_session=False)
+			res = self.session.request(method, self._url(url), **kwargs)
+		return res
+
+	def get(self, url, **kwargs):
+		return self._request('GET', url, **kwargs)
+
+	def post(self, url, **kwargs):
+		return self._request('POST', url, **kwargs)
+
+	def get_json(self, url):
+		res = self.get(url)
+		try:
+			return res.json()
+		except:
+			raise Exception(res.text)
+
+	def close(self):
+		if self._session is not None:
+			self._session.close()
+
+	def _cached(self, endpoint, key, fetch, cacheable=None, refresh=False):
+		'''
+		return the cached response for (endpoint, key) or call fetch() and cache its result
+		- only results that pass cacheable(result) are stored. fetch may also raise on errors
+		- refresh skips the cached entry and replaces it
+		'''
+		if self.cache is None:
+			return fetch()
+		key = '{}:{}'.format(endpoint, key)
+		value, fresh = (None, False) if refresh else self.cache.get(key, max_stale=STALE_WHILE_REVALIDATE.get(endpoint, 0))
+		if value is not None:
+			if not fresh:
+				self._revalidate(endpoint, key, fetch)
+			return value
+		value = fetch()
+		if cacheable is None or cacheable(value):
+			self.cache.set(key, value, CACHE_TTLS[endpoint])
+		return value
+
+	def _revalidate(self, endpoint, key, fetch):
+		with self._revalidating_lock:
+			if key in self._revalidating:
+				return
+			self._revalidating.add(key)
+		def _refresh():
+			try:
+				self.cache.set(key, fetch(), CACHE_TTLS[endpoint])
+			except Exception:
+				pass # keep serving the stale entry. next lookup retries
+			finally:
+				with self._revalidating_lock:
+					self._revalidating.discard(key)
+		threading.Thread(target=_refresh, daemon=True).start()
+
+	def _set_user(self, user):
+		self.session.headers.update({
+			'X-Ihr-Profile-Id': str(user['profileId']),
+			'X-Ihr-Session-Id': user['sessionId'],
+			'X-User-Id': str(user['profileId']),
+			'X-Session-Id': user['sessionId'],
+		})
+		self.user = user
+
+	@staticmethod
+	def _load_session(session_filepath):
+		try:
+			with open(session_filepath, 'r') as f:
+				user = json.load(f)
+			if user['expires'] > time.time():
+				return user
+		except Exception:
+			pass # missing, unreadable or expired
+		return None
+
+	def login(self, uuid_filepath, session_filepath=None, reuse_session=True):
+		'''
+		anonymous login with the device uuid stored in uuid_filepath
+		- with session_filepath, the session (profileId, sessionId) is cached there for SESSION_MAX_AGE and
+			restored without a round trip. requests answered with a 401 log in again (see _request)
+		'''
+		self._login_args = (uuid_filepath, session_filepath)
+		if session_filepath is not None and reuse_session:
+			user = self._load_session(session_filepath)
+			if user is not None:
+				self._set_user(user)
+				return user
+
+		accessToken = 'anon'
+		uu = ''
+		if os.path.isfile(uuid_filepath):
+			with open(uuid_filepath, 'r') as u:
+				uu = u.read()
+		if not uu:
+			uu = str(uuid.uuid1())
+		body = {
+			'acessToken': accessToken,
+			'accessTokenType': accessToken,
+			'deviceId': uu,
+			'deviceName': 'python-CLI',
+			'host': 'webapp.US',
+			'oauthUuid': uu,
+			'userName': accessToken+uu
+		}
+		res = self.session.post(self._url(new_user_url), data=body) # not self.post - that waits for a background login
+		try:
+			with open(uuid_filepath, 'w') as u:
+				u.write(uu)
+			user = res.json()
+			self._set_user(user)
+		except:
+			raise Exception(res.text)
+		if session_filepath is not None:
+			try:
+				with open(session_filepath, 'w') as f:
+					json.dump(dict(user, expires=time.time() + SESSION_MAX_AGE), f)
+			except Exception as e:
+				if os.environ.get('RADIO_DEBUG') == "1": print(e)
+		return user
+
+	def login_in_background(self, uuid_filepath, session_filepath=None):
+		'''
+		start login() on a thread and return right away
+		- API requests made before it completes wait for it. if it fails, the first waiting request raises the error
+		'''
+		pending = futures.Future()
+		def _login():
+			try:
+				pending.set_result(self.login(uuid_filepath, session_filepath=session_filepath))
+			except Exception as e:
+				pending.set_exception(e)
+		self._pending_login = pending
+		threading.Thread(target=_login, daemon=True).start()
+		return pending
+
+	def _await_login(self):
+		pending = self._pending_login
+		if pending is not None:
+			try:
+				pending.result()
+			finally:
+				self._pending_login = None # a failed login is reported once. later requests go out without auth
+
+	def get_user(self):
+		'''the logged in user, waiting for a background login'''
+		self._await_login()
+		return self.user
+
+	def get_market_id(self, zipCode):
+		res = self.get(markets_url.format(zipCode=zipCode)).json()['hits']
+		if len(res)==0:
+			raise Exception("Unsupported zipCode")
+
+	def search(self, keyword, startIndex=0, maxRows=10, marketId=159):
+		def fetch():
+			return self.get(search_url, params={
+				'boostMarketId': marketId,
+				'startIndex':startIndex,
+				'maxRows':maxRows,
+				'keyword':True,
+				'keywords': keyword,
+			}).json()
+		key = '{}|{}|{}|{}'.format(keyword.strip().lower(), startIndex, maxRows, marketId)
+		return self._cached('search', key, fetch, cacheable=lambda res: 'results' in res)
+
+	def get_station_streams(self, stream_id, refresh=False):
+		'''refresh bypasses the api cache - for when a cached stream url turned out to be dead'''
+		if isinstance(stream_id, (list, set)):
+			stream_id = ','.join(stream_id)
+		def fetch():
+			res = self.get(station_stream_url.format(stream_id=stream_id)).json()
+			if 'hits' in res:
+				return res['hits'][0].get("streams") or {}
+			else:
+				raise Exception(str(res))
+		return self._cached('station_streams', stream_id, fetch, refresh=refresh)
+
+	def get_station_streams_many(self, stream_ids):
+		'''
+		{stream_id: streams} for many live stations with a single request
+		- ids that are fresh in the cache are not requested. ids missing from the response are left out
+		'''
+		out = {}
+		missing = []
+		for stream_id in map(str, stream_ids):
+			cached, fresh = self.cache.get('station_streams:' + stream_id) if self.cache is not None else (None, False)
+			if fresh:
+				out[stream_id] = cached
+			else:
+				missing.append(stream_id)
+		if missing:
+			res = self.get(station_stream_url.format(stream_id=','.join(missing))).json()
+			if 'hits' not in res:
+				raise Exception(str(res))
+			for hit in res['hits']:
+				stream_id = str(hit.get('id'))
+				if stream_id in missing:
+					out[stream_id] = hit.get("streams") or {}
+					if self.cache is not None:
+						self.cache.set('station_streams:' + stream_id, out[stream_id], CACHE_TTLS['station_streams'])
+		return out
+
+	def get_live_meta(self, stream_id):
+		return self.get_json(meta_url.format(stream_id=stream_id))
+
+	def get_artist_profile(self, artist_id):
+		return self._cached('artist_profile', artist_id, lambda: self.get_json(artist_profile_url.format(artist_id=artist_id)))
+
+	def get_artist_bio(self, artist_id):
+		return self._cached('artist_bio', artist_id, lambda: self.get_json(artist_url.format(artist_id=artist_id)))
+
+	def get_similar_artists(self, artist_id):
+		return self._cached('artist_profile', 'similar:{}'.format(artist_id), lambda: self.get_json(similar_artists_url.format(artist_id=artist_id)))
+
+	def get_artist_station(self, user_id, artist_id):
+		res = self.post(
+			artist_playlist_url.format(user_id=user_id, artist_id=artist_id),
+			data={'contentId':artist_id},
+		)
+		try:
+			res_json = res.json()
+			if 'error' in res_json:
+				raise Exception(str(res_json['error']))
+			return res_json
+		except:
+			raise Exception(res.text)
+
+	def get_artist_streams(self, astream_id):
+		res = self.post(artist_stream_url, json={
+			'hostName': 'webapp.US',
+			'playedFrom': 1,
+			'stationId': astream_id,
+			'stationType': 'RADIO'
+		})
+		try:
+			res_json = res.json()
+			if 'error' in res_json:
+				raise Exception(str(res_json['error']))
+			return res_json.get('items') or []
+		except:
+			raise Exception(res.text)
+
+	def get_track_info(self, track_id):
+		return self._cached('track_info', track_id, lambda: self.get_json(track_url.format(track_id=track_id)))
+
+
+
+_CLIENT = None
+
+def get_client():
+	'''returns the shared client used by the module level API functions'''
+	global _CLIENT
+	if _CLIENT is None:
+		_CLIENT = iHeartClient()
+	return _CLIENT
+
+
+def configure(pool_size=DEFAULT_POOL_SIZE, base_url=API_HOST, cache=None):
+	'''
+	replace the shared client. auth headers from an earlier login are carried over
+	- cache is an optional iheart.cache.ResponseCache for catalog and search responses
+	'''
+	global _CLIENT
+	old = _CLIENT
+	_CLIENT = iHeartClient(pool_size=pool_size, base_url=base_url, cache=cache)
+	if old is not None:
+		if old.user is not None:
+			_CLIENT.user = old.user
+			_CLIENT._login_args = old._login_args
+			for k, v in old.session.headers.items():
+				if k.startswith('X-') and k not in HEADERS:
+					_CLIENT.session.headers[k] = v
+		old.close()
+	return _CLIENT
 
 
 def _generic_get(url):
-	res = requests.get(url, headers=HEADERS)
-	try:
-		return res.json()
-	except:
-		raise Exception(res.text)
+	return get_client().get_json(url)
 
 
 # **************************************************************************************
@@ -55,107 +403,51 @@ def _generic_get(url):
 # **************************************************************************************
 
 
-def ilogin(uuid_filepath):
-	global HEADERS
-	accessToken = 'anon'
-	uu = ''
-	if os.path.isfile(uuid_filepath):
-		with open(uuid_filepath, 'r') as u:
-			uu = u.read()
-	if not uu:
-		uu = str(uuid.uuid1())
-	body = {
-		'acessToken': accessToken,
-		'accessTokenType': accessToken,
-		'deviceId': uu,
-		'deviceName': 'python-CLI',
-		'host': 'webapp.US',
-		'oauthUuid': uu,
-		'userName': accessToken+uu
-	}
-	res = requests.post(new_user_url, data=body, headers=HEADERS)
-	try:
-		with open(uuid_filepath, 'w') as u:
-			u.write(uu)
-		user = res.json()
-		HEADERS.update({
-			'X-Ihr-Profile-Id': str(user['profileId']),
-			'X-Ihr-Session-Id': user['sessionId'],
-			'X-User-Id': str(user['profileId']),
-			'X-Session-Id': user['sessionId'],
-		})
-		return user
-	except:
-		raise Exception(res.text)
+def ilogin(uuid_filepath, background=False, session_filepath=None):
+	if background:
+		return get_client().login_in_background(uuid_filepath, session_filepath=session_filepath)
+	return get_client().login(uuid_filepath, session_filepath=session_filepath)
+
+
+def iget_user():
+	return get_client().get_user()
 
 
 def iget_market_id(zipCode):
-	res = requests.get(markets_url.format(zipCode=zipCode), headers=HEADERS).json()['hits']
-	if len(res)==0:
-		raise Exception("Unsupported zipCode")
+	return get_client().get_market_id(zipCode)
 
 
 def isearch(keyword, startIndex=0, maxRows=10, marketId=159):
-	res = requests.get(search_url, params={
-		'boostMarketId': marketId,
-		'startIndex':startIndex,
-		'maxRows':maxRows,
-		'keyword':True,
-		'keywords': keyword,
-	}, headers=HEADERS)
-	return res.json()
-
-
-def iget_station_streams(stream_id):
-	if isinstance(stream_id, (list, set)):
-		stream_id = ','.join(stream_id)
-	res = requests.get(station_stream_url.format(stream_id=stream_id), headers=HEADERS).json()
-	if 'hits' in res:
-		return res['hits'][0].get("streams") or {}
-	else:
-		raise Exception(str(res))
+	return get_client().search(keyword, startIndex=startIndex, maxRows=maxRows, marketId=marketId)
+
+
+def iget_station_streams(stream_id, refresh=False):
+	return get_client().get_station_streams(stream_id, refresh=refresh)
+
+def iget_station_streams_many(stream_ids):
+	return get_client().get_station_streams_many(stream_ids)
 
 def iget_live_meta(stream_id):
-	return _generic_get(meta_url.format(stream_id=stream_id))
+	return get_client().get_live_meta(stream_id)
 
 
 def iget_artist_profile(artist_id):
-	return _generic_get(artist_profile_url.format(artist_id=artist_id))
+	return get_client().get_artist_profile(artist_id)
 
 def iget_artist_bio(artist_id):
-	return _generic_get(artist_url.format(artist_id=artist_id))
+	return get_client().get_artist_bio(artist_id)
+
+def iget_similar_artists(artist_id):
+	return get_client().get_similar_artists(artist_id)
 
 
 def iget_artist_station(user_id, artist_id):
-	res = requests.post(
-		artist_playlist_url.format(user_id=user_id, artist_id=artist_id),
-		data={'contentId':artist_id},
-		headers=HEADERS
-	)
-	try:
-		res_json = res.json()
-		if 'error' in res_json:
-			raise Exception(str(res_json['error']))
-		return res_json
-	except:
-		raise Exception(res.text)
+	return get_client().get_artist_station(user_id, artist_id)
 
 
 def iget_artist_streams(astream_id):
-	res = requests.post(artist_stream_url, json={
-		'hostName': 'webapp.US',
-		'playedFrom': 1,
-		'stationId': astream_id,
-		'stationType': 'RADIO'
-	}, headers=HEADERS)
-	try:
-		res_json = res.json()
-		if 'error' in res_json:
-			raise Exception(str(res_json['error']))
-		return res_json.get('items') or []
-	except:
-		raise Exception(res.text)
+	return get_client().get_artist_streams(astream_id)
 
 
 def iget_track_info(track_id):
-	return _generic_get(track_url.format(track_id=track_id))
+	return get_client().get_track_info(track_id)
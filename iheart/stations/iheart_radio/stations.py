@@ -1,17 +1,23 @@
 
 import os
 import time
+import threading
+from concurrent.futures import Future
 
 from . import client
 from ..base import LiveStation, TrackListStation, Track
 from iheart.colors import Colors
+from iheart.backend import PlaybackError
 
 
 
 class iHeartLiveStation(LiveStation):
+	PREFETCH_WAIT = 3 # seconds play() waits for an in-flight batch stream lookup before asking on its own
 
 	def __init__(self, station_dict):
 		super().__init__(station_dict=station_dict)
+		self.streams = None
+		self._streams_future = None # set by prefetch_streams()
 		self.description = (self._dict.get('description') or '').strip()
 		self.callLetters = self._dict.get('callLetters')
 		self.frequency = self._dict.get('frequency')
@@ -27,8 +33,36 @@ class iHeartLiveStation(LiveStation):
 			)
 		return super()._get_descr()
 
-	def _parse_stream(self):
-		self.streams = client.iget_station_streams(self.id)
+	@classmethod
+	def prefetch_streams(cls, stations):
+		'''
+		resolve the streams of a list of live stations with one request, on a background thread
+		- each station's streams / mrl are filled in when the request completes
+		- the first play() of a station uses the prefetched streams (waiting up to PREFETCH_WAIT if still in flight)
+		'''
+		stations = [s for s in stations if isinstance(s, cls)]
+		if not stations:
+			return None
+		future = Future()
+		def _resolve():
+			try:
+				future.set_result(client.iget_station_streams_many([s.id for s in stations]))
+			except Exception as e:
+				if os.environ.get('RADIO_DEBUG') == "1": print(e)
+				future.set_exception(e)
+		for s in stations:
+			s._streams_future = future
+			future.add_done_callback(s._prefetched_cb)
+		threading.Thread(target=_resolve, daemon=True).start()
+		return future
+
+	def _prefetched_cb(self, future):
+		streams = None if future.exception() else future.result().get(str(self.id))
+		if streams is not None:
+			self.set_streams(streams)
+
+	def set_streams(self, streams):
+		self.streams = streams
 		if 'hls_stream' in self.streams:
 			self.mrl = self.streams['hls_stream'].strip()
 		elif 'secure_shoutcast_stream' in self.streams:
@@ -41,11 +75,30 @@ class iHeartLiveStation(LiveStation):
 			except Exception as e:
 				print(e)
 
+	def _parse_stream(self):
+		future, self._streams_future = self._streams_future, None
+		if future is not None: # prefetched streams are used once. later plays resolve again (likely from the api cache)
+			try:
+				streams = future.result(timeout=self.PREFETCH_WAIT).get(str(self.id))
+				if streams is not None:
+					return self.set_streams(streams)
+			except Exception:
+				pass
+		self.set_streams(client.iget_station_streams(self.id))
+
 	def play(self):
 		self._parse_stream()
 		if self.mrl is None:
 			raise Exception("Stream not available for {}".format(self))
-		super().play()
+		try:
+			super().play()
+		except (PlaybackError, TimeoutError):
+			# the url may have been served stale from the api cache - ask the api again and retry if it changed
+			failed_mrl = self.mrl
+			self.set_streams(client.iget_station_streams(self.id, refresh=True))
+			if self.mrl == failed_mrl:
+				raise
+			super().play()
 
 	def toggle_pause(self, pause=True):
 		'''special toggle for iheart live stations'''
@@ -70,6 +123,17 @@ class iHeartArtistStation(TrackListStation):
 		self.search_score = self._dict.get('score')
 		self.rank = self._dict.get('rank')
 
+	def info(self): # override - current track plus the artist's profile, bio and similar artists
+		out = dict(super().info() or {})
+		track = self.current_track
+		artist_id = track.artist_id if track is not None and track.artist_id else self.id
+		try:
+			from . import aclient # asyncio is only loaded when it's needed
+			out['artist_info'] = aclient.iget_artist_info(artist_id) # the three requests go out together
+		except Exception as e:
+			print(e)
+		return out
+
 	def iter_tracks(self):
 		while True:
 			try:
@@ -1,5 +1,11 @@
-import requests
-from bs4 import BeautifulSoup
+import re
+import time
+import hashlib
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qs
 
 base_url = "https://www.internet-radio.com"
 
@@ -21,7 +27,54 @@ HEADERS = {
 }
 
 
+IR_SEARCH_WORKERS = 4 # result pages fetched ahead concurrently by ir_iter_search
+
+GENRE_CACHE_TTL = 7*24*60*60 # the genre list hardly ever changes
+
+_CACHE = None # optional iheart.cache.ResponseCache. see configure()
+_INDEX = None # optional StationIndex recording every station seen in search results
+_GENRES = None # (set of genres, expiry timestamp)
+_GENRES_LOCK = threading.Lock()
+_GENRES_REFRESHING = False
+
+
+def configure(cache=None, index=None):
+    '''set the disk cache used for the genre list and the station index'''
+    global _CACHE, _GENRES, _INDEX
+    _CACHE = cache
+    _GENRES = None
+    _INDEX = index
+
+
+def get_index():
+    return _INDEX
+
+
+def _ir_normalize_url(url):
+    '''
+    the stream url behind a station link, in a canonical form
+    - playlist generator links (?u=<stream>&t=.m3u) are reduced to the stream they point to, so m3u and pls links match
+    - scheme and host are lower cased, default ports and fragments dropped
+    '''
+    parts = urlsplit(url.strip())
+    stream = parse_qs(parts.query).get('u')
+    if stream and parts.path.rstrip('/').endswith('playlistgenerator'):
+        parts = urlsplit(stream[0].strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme, netloc.rpartition(':')[2]) in (('http', '80'), ('https', '443')):
+        netloc = netloc.rpartition(':')[0]
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+def ir_station_id(url):
+    '''stable station id - truncated blake2b of the normalized stream url (same on every run, unlike hash())'''
+    return 'ir-' + hashlib.blake2b(_ir_normalize_url(url).encode('utf-8'), digest_size=8).hexdigest()
+
+
 def ir_get_stations():
+    import requests # requests, bs4 and lxml are imported on first use - they add noticeably to cli startup
+    from bs4 import BeautifulSoup
     res = requests.get(all_stations_url, headers=HEADERS)
     soup = BeautifulSoup(res.content, 'lxml')
     stations = []
@@ -30,8 +83,47 @@ def ir_get_stations():
     return stations
 
 
+def _ir_store_genres(genres):
+    global _GENRES
+    genres = sorted(set(g.strip().lower() for g in genres))
+    _GENRES = (set(genres), time.time() + GENRE_CACHE_TTL)
+    if _CACHE is not None:
+        _CACHE.set('internet-radio:genres', genres, GENRE_CACHE_TTL)
+
+
+def _ir_refresh_genres():
+    global _GENRES_REFRESHING
+    try:
+        _ir_store_genres(ir_get_stations())
+    except Exception:
+        pass # keep using the stale list
+    finally:
+        _GENRES_REFRESHING = False
+
+
+def ir_get_genres():
+    '''
+    set of genre names (lower case), cached in memory and in the disk cache for GENRE_CACHE_TTL
+    - a stale list is returned right away and refreshed in the background
+    - only the very first call (empty cache) scrapes the genre page in the foreground
+    '''
+    global _GENRES, _GENRES_REFRESHING
+    with _GENRES_LOCK:
+        if _GENRES is None and _CACHE is not None:
+            genres, fresh = _CACHE.get('internet-radio:genres', max_stale=365*24*60*60)
+            if genres is not None:
+                _GENRES = (set(genres), time.time() + (GENRE_CACHE_TTL if fresh else 0))
+        if _GENRES is None:
+            _ir_store_genres(ir_get_stations())
+        genres, expires = _GENRES
+        if expires < time.time() and not _GENRES_REFRESHING:
+            _GENRES_REFRESHING = True
+            threading.Thread(target=_ir_refresh_genres, daemon=True).start()
+        return genres
+
+
 def _ir_find_actual_url(search_term):
-    stations = ir_get_stations()
+    stations = ir_get_genres()
     search_term = search_term.strip().lower()
     if search_term in stations:
         return station_url.format(station=search_term)
@@ -50,44 +142,131 @@ def _ir_parse_meta(meta_txt):
     return meta
 
 
-def ir_search(term, maxRows=10, sortby="listeners"):
+def _ir_parse_rows(doc):
+    '''yield station dicts from the results table of a parsed page. they are recorded in the station index if one is set'''
+    tables = doc.xpath('//table')
+    if not tables:
+        return
+    for tr in tables[0].iterfind('.//tr'):
+        href = tr.xpath('.//a[@title="M3U Playlist File"]/@href')
+        radio_name = tr.xpath('.//h4[contains(concat(" ", normalize-space(@class), " "), " text-danger ")]')
+        if not href or not radio_name:
+            continue
+        name = radio_name[0].text_content().strip()
+        if name == "":
+            continue
+        url = base_url+href[0]
+        current_track = radio_name[0].getparent().find('.//b')
+        meta = tr.xpath('.//td[contains(concat(" ", normalize-space(@class), " "), " text-right ")]')
+
+        resdict = {
+            'id': ir_station_id(url),
+            'user_id': 'anonymous',
+            'name': name,
+            'current_track': current_track.text_content().strip() if current_track is not None else '',
+            'mrl': url,
+        }
+        if meta:
+            resdict.update(_ir_parse_meta(meta[0].text_content()))
+        if _INDEX is not None:
+            _INDEX.add(resdict)
+        yield resdict
+
+
+def _ir_next_href(doc):
+    href = doc.xpath('//li[contains(concat(" ", normalize-space(@class), " "), " next ")]/a/@href')
+    return href[0] if href else None
+
+
+def _ir_page_pattern(href, page):
+    '''
+    split the link to a numbered page around its page number, so that any page url can be built
+    returns (prefix, suffix) or None if the number is not found in the link
+    '''
+    for match in reversed(list(re.finditer(r'\d+', href))):
+        if int(match.group()) == page:
+            return (base_url + href[:match.start()], href[match.end():])
+    return None
+
+
+def ir_iter_search(term, sortby="listeners", limit=None, workers=IR_SEARCH_WORKERS):
+    '''
+    generator of station dicts for a search term or genre, in page order
+    - pages are parsed with lxml XPath, looking only at the results table and the pager
+    - once the page url pattern is known (from the first 'next' link), the following pages are
+        fetched ahead on a thread pool. at most `workers` pages are in flight, and no more than
+        `limit` results need
+    - if no page number can be found in the links, pages are followed one by one
+    '''
     if sortby not in ['featured', 'listeners', 'bitrate']:
         raise ValueError(f"invalid value for sortby - {sortby}")
-    out = []
-    page_url = _ir_find_actual_url(search_term=term)
+    return _ir_iter_pages(_ir_find_actual_url(search_term=term), sortby, limit, workers)
+
+
+def _ir_iter_pages(page_url, sortby, limit, workers):
+    import requests
+    from requests.adapters import HTTPAdapter
     sess = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=workers)
+    sess.mount('https://', adapter)
+    sess.mount('http://', adapter)
     sess.cookies.set("sortby", sortby)
 
-    while len(out) < maxRows:
-        res = sess.get(page_url, headers=HEADERS)
-        soup = BeautifulSoup(res.content, 'lxml')
-        table = soup.find('table')
-        rows = table.find_all('tr')
-
-        for tr in rows:
-            url = base_url+tr.find('a', attrs={'title':'M3U Playlist File'})['href']
-            radio_name = tr.find('h4', attrs={'class':'text-danger'})
-            if radio_name.text.strip()=="":
-                continue
-
-            meta = _ir_parse_meta(tr.find('td', {'class':'text-right'}).text)
-
-            resdict = {
-                'id': hash(url),
-                'user_id': 'anonymous',
-                'name': radio_name.text.strip(),
-                'current_track': radio_name.parent.find('b').text.strip(),
-                'mrl': url,
-            }
-            resdict.update(meta)
-            out.append(resdict)
-
-        next_btn = soup.find('li', attrs={'class':'next'})
-        if not next_btn:
-            break
-        page_url = base_url+next_btn.find('a')['href']
-
-    return out[:maxRows]
+    import lxml.html
+
+    def fetch(url):
+        content = sess.get(url, headers=HEADERS).content
+        return lxml.html.fromstring(content) if content.strip() else None
+
+    doc = fetch(page_url)
+    if doc is None:
+        return
+    count = 0
+    for station in _ir_parse_rows(doc):
+        count += 1
+        yield station
+    next_href = _ir_next_href(doc)
+    pattern = _ir_page_pattern(next_href, 2) if next_href else None
+
+    if pattern is None:
+        while next_href and (limit is None or count < limit):
+            doc = fetch(base_url+next_href)
+            if doc is None:
+                return
+            for station in _ir_parse_rows(doc):
+                count += 1
+                yield station
+            next_href = _ir_next_href(doc)
+        return
+
+    per_page = max(count, 1)
+    page = 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            while True:
+                while len(pending) < workers and (limit is None or count + len(pending)*per_page < limit):
+                    pending.append(pool.submit(fetch, pattern[0] + str(page) + pattern[1]))
+                    page += 1
+                if not pending:
+                    return
+                doc = pending.popleft().result()
+                if doc is None:
+                    return
+                rows = 0
+                for station in _ir_parse_rows(doc):
+                    rows += 1
+                    count += 1
+                    yield station
+                if rows == 0 or _ir_next_href(doc) is None: # past the last page
+                    return
+        finally:
+            for f in pending:
+                f.cancel()
+
+
+def ir_search(term, maxRows=10, sortby="listeners"):
+    return list(islice(ir_iter_search(term, sortby=sortby, limit=maxRows), maxRows))
 
 
 if __name__ == '__main__':
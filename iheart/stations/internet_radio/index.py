@@ -0,0 +1,77 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+
+class StationIndex(object):
+    '''
+    On-disk index of internet-radio.com stations seen in search results, keyed by their stable id
+    - lets a previously seen station be looked up and replayed without scraping the site again
+    - the most recently seen max_entries stations are kept
+    - the file is only rewritten by save() when something changed
+    '''
+
+    def __init__(self, path, max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._stations = None # loaded on first use
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._stations is None:
+            self._stations = OrderedDict()
+            if os.path.isfile(self.path):
+                try:
+                    with open(self.path, 'r') as f:
+                        self._stations = json.load(f, object_pairs_hook=OrderedDict)
+                except Exception as e:
+                    if os.environ.get('RADIO_DEBUG') == "1": print(e)
+        return self._stations
+
+    def add(self, station_dict):
+        with self._lock:
+            stations = self._load()
+            station_id = station_dict['id']
+            stations.pop(station_id, None)
+            stations[station_id] = dict(station_dict, last_seen=time.time()) # most recent last
+            while len(stations) > self.max_entries:
+                stations.popitem(last=False)
+            self._dirty = True
+
+    def get(self, station_id):
+        with self._lock:
+            return self._load().get(station_id)
+
+    def find(self, term):
+        '''stations whose name contains term, most recently seen first'''
+        term = term.strip().lower()
+        with self._lock:
+            return [s for s in reversed(self._load().values()) if term in s['name'].lower()]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load())
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            dirname = os.path.dirname(self.path) or '.'
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(self._stations, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+            except Exception:
+                os.remove(tmp)
+                raise
+            self._dirty = False
@@ -1,12 +1,15 @@
 from ..base import LiveStation
-from .client import ir_search
+from .client import ir_search, get_index
 
 from iheart.colors import Colors
 
 
 class InternetRadio(LiveStation):
 
-    def __init__(self):
+    def __init__(self, station_dict=None):
+        if station_dict is not None: # replay a known station (station index, last played) without scraping
+            super().__init__(station_dict)
+            return
         station_dicts = ir_search("rock", sortby="featured")
         print("Options not implemented yet. Here's what it looks like for search term 'rock'")
         for i, d in enumerate(station_dicts):
@@ -16,6 +19,14 @@ class InternetRadio(LiveStation):
         super().__init__(station_dicts[0])
 
 
+    @classmethod
+    def from_index(cls, station_id):
+        '''station previously seen in search results, or None if it is not in the station index'''
+        index = get_index()
+        station_dict = index.get(station_id) if index is not None else None
+        return cls(station_dict) if station_dict is not None else None
+
+
     def info(self):
         return self.get_dict()
 
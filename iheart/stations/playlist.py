@@ -1,18 +1,161 @@
 import random
-from collections import deque
 
 from .base import TrackListStation, Track
 from iheart.colors import Colors
 
 
+
+class _AliveTree(object):
+	'''
+	Fenwick (binary indexed) tree over the alive / removed flags of playlist positions
+	- converts between a position and its index among the remaining tracks in O(log n)
+	'''
+
+	def __init__(self, n):
+		self.n = n
+		self.total = n
+		self._alive = bytearray(b'\x01') * n
+		tree = [0] + [1] * n
+		for i in range(1, n+1): # O(n) build
+			j = i + (i & -i)
+			if j <= n:
+				tree[j] += tree[i]
+		self._tree = tree
+		self._top_bit = 1 << (n.bit_length() - 1) if n else 0
+
+	def alive(self, pos):
+		return self._alive[pos] == 1
+
+	def remove(self, pos):
+		if not self._alive[pos]:
+			return
+		self._alive[pos] = 0
+		self.total -= 1
+		i = pos + 1
+		while i <= self.n:
+			self._tree[i] -= 1
+			i += i & -i
+
+	def rank(self, pos):
+		'''number of alive positions before pos'''
+		s = 0
+		i = pos
+		while i > 0:
+			s += self._tree[i]
+			i -= i & -i
+		return s
+
+	def select(self, k):
+		'''position of the k-th (0 based) alive entry'''
+		pos = 0
+		remaining = k + 1
+		bit = self._top_bit
+		while bit:
+			nxt = pos + bit
+			if nxt <= self.n and self._tree[nxt] < remaining:
+				pos = nxt
+				remaining -= self._tree[nxt]
+			bit >>= 1
+		return pos
+
+
+
+class _ShuffleOrder(object):
+	'''
+	Pseudo-random permutation of range(n), computed index by index
+	- a small Feistel network over the next even power of two >= n, with cycle walking to stay below n
+	- O(1) to create and O(1) memory whatever n is. permute(i) is the position played i-th, unpermute(pos) its inverse
+	'''
+	ROUNDS = 4
+
+	def __init__(self, n, rng):
+		self.n = n
+		self._half_bits = max(1, ((n - 1).bit_length() + 1) // 2)
+		self._mask = (1 << self._half_bits) - 1
+		self._keys = [rng.getrandbits(32) for _ in range(self.ROUNDS)]
+
+	def _f(self, x, key):
+		x = ((x ^ key) * 0x9E3779B1) & 0xFFFFFFFF
+		x ^= x >> 15
+		x = (x * 0x85EBCA77) & 0xFFFFFFFF
+		x ^= x >> 13
+		return x & self._mask
+
+	def _encrypt(self, x):
+		left, right = x >> self._half_bits, x & self._mask
+		for key in self._keys:
+			left, right = right, left ^ self._f(right, key)
+		return (left << self._half_bits) | right
+
+	def _decrypt(self, x):
+		left, right = x >> self._half_bits, x & self._mask
+		for key in reversed(self._keys):
+			left, right = right ^ self._f(left, key), left
+		return (left << self._half_bits) | right
+
+	def permute(self, i):
+		x = self._encrypt(i)
+		while x >= self.n: # the domain is less than 4n, so this takes a few steps at most on average
+			x = self._encrypt(x)
+		return x
+
+	def unpermute(self, pos):
+		x = self._decrypt(pos)
+		while x >= self.n:
+			x = self._decrypt(x)
+		return x
+
+
+
+class _TrackListView(object):
+	'''read-only sequence of a playlist's remaining tracks in their original order'''
+
+	def __init__(self, playlist):
+		self._playlist = playlist
+
+	def __len__(self):
+		return self._playlist._alive.total
+
+	def __getitem__(self, idx):
+		if idx < 0:
+			idx += len(self)
+		if not 0 <= idx < len(self):
+			raise IndexError("track index out of range")
+		return self._playlist._track_at(self._playlist._alive.select(idx))
+
+	def __iter__(self):
+		for pos, track in enumerate(self._playlist._tracks):
+			if track is not None:
+				yield self._playlist._track_at(pos)
+
+
+
 class LocalPlaylist(TrackListStation):
-	'''Json stored playlist implementation using TrackListStation class'''
+	'''
+	Json stored playlist implementation using TrackListStation class
+	- tracks keep their position in the original order. removed tracks leave a hole, so positions never shift
+	- an id -> position index and a Fenwick tree over the holes make remove, jump and index lookups O(1) / O(log n)
+	- tracks are held as the stored dicts. Track objects are created when a track is played or listed
+	- the play order is either the original order or a shuffle order. both are walked from the current track,
+		so toggling shuffle or jumping continues from where the playlist is
+	- shuffle orders are computed lazily (see _ShuffleOrder) and a new one is drawn every time a cycle ends.
+		pass shuffle_seed to make them reproducible
+	'''
 
-	def __init__(self, playlist_dict):
+	def __init__(self, playlist_dict, shuffle_seed=None):
 		playlist_dict['id'] = playlist_dict['name']
 		super().__init__(playlist_dict)
-		self.track_list = deque([Track(trk_dict) for trk_dict in playlist_dict['track_dict_list']]) # deque so as to use rotate
-		self.tracks_to_play = self.track_list.copy() # make copy to implement shuffle
+		# raw track dicts - Track objects are only made for tracks about to play or be shown. None once removed
+		self._tracks = [trk_dict for trk_dict in playlist_dict['track_dict_list'] if 'streamUrl' in trk_dict]
+		self._positions = {trk_dict['content']['id']: pos for pos, trk_dict in enumerate(self._tracks)}
+		self._alive = _AliveTree(len(self._tracks))
+		self._rng = random.Random(shuffle_seed)
+		self._order = None # _ShuffleOrder of the current cycle, None when not shuffling
+		self._next_order = None # order of the next cycle, once something has looked past the end of this one
+		self._restart = False # start the play order from its beginning instead of after the current track
+		self._current = None # position of the current track
+		self._jump = None # position to play next, set by jump_to()
+		self.track_list = _TrackListView(self)
 		self.shuffle = False
 		self.now_playing_id = None
 
@@ -22,42 +165,78 @@ class LocalPlaylist(TrackListStation):
 			Colors.colorize("[Shuffle]", Colors.PINK) if self.shuffle else '',
 		)
 
+	def _track_at(self, pos):
+		return Track(self._tracks[pos])
+
+	def _next_cycle(self):
+		if self._next_order is None:
+			n = len(self._tracks)
+			self._next_order = _ShuffleOrder(n, self._rng)
+			while n > 1 and self._next_order.permute(0) == self._order.permute(n-1): # don't play the same track twice in a row
+				self._next_order = _ShuffleOrder(n, self._rng)
+		return self._next_order
+
+	def _following(self, pos, order):
+		'''(position, order) played after pos in the play order. pos may have been removed. None means the start'''
+		if order is None:
+			rank = 0 if pos is None else self._alive.rank(pos) + (1 if self._alive.alive(pos) else 0)
+			return self._alive.select(rank % self._alive.total), None
+		i = -1 if pos is None else order.unpermute(pos)
+		while True: # skip removed tracks
+			i += 1
+			if i == order.n:
+				order, i = self._next_cycle(), 0
+			pos = order.permute(i)
+			if self._alive.alive(pos):
+				return pos, order
+
+	def _play_order(self, count):
+		upcoming = []
+		pos, order = self._current, self._order
+		for _ in range(min(count, self._alive.total)):
+			if not upcoming and self._jump is not None:
+				pos = self._jump
+			elif not upcoming and self._restart:
+				pos, order = self._following(None, order)
+			else:
+				pos, order = self._following(pos, order)
+			upcoming.append((pos, order))
+		return upcoming
+
 	def iter_tracks(self):
 		while True:
-			new_track = self.tracks_to_play[0]
+			if self._alive.total == 0:
+				raise IndexError("playlist is empty")
+			self._current, order = self._play_order(1)[0]
+			if order is not self._order: # a new shuffle cycle started
+				self._order, self._next_order = order, None
+			self._jump = None
+			self._restart = False
+			new_track = self._track_at(self._current)
 			self.now_playing_id = new_track.id
 			yield new_track
-			self.tracks_to_play.rotate(-1) # rotate left to go to next track
+
+	def _peek_upcoming(self): # overridden - read ahead in the play order without consuming it
+		return [self._track_at(pos) for pos, _ in self._play_order(self.lookahead)]
 
 	def remove_track(self, track_id):
-		def filter_func(t):
-			return t.id != track_id
-		self.track_list = deque(filter(filter_func, self.track_list))
-		self.tracks_to_play = deque(filter(filter_func, self.tracks_to_play))
+		pos = self._positions.pop(track_id, None)
+		if pos is not None:
+			self._alive.remove(pos)
+			self._tracks[pos] = None
 
 	def toggle_shuffle(self):
 		self.shuffle = not self.shuffle
 		if self.shuffle:
-			random.shuffle(self.tracks_to_play) # shuffle playlist
+			self._order = _ShuffleOrder(len(self._tracks), self._rng) # O(1) - positions are drawn as they play
+			self._restart = True # a full cycle follows the current track
 		else: # shuffle off
-			# if there is a song playing in shuffle mode,
-			# rotate tracklist such that the playlist continues from the current track
-			current_idx = 0
-			if self.now_playing_id is not None:
-				for i, t in enumerate(self.track_list):
-					if t.id==self.now_playing_id:
-						current_idx = i
-						break
-
-			self.tracks_to_play = self.track_list.copy() # make copy of original track list
-			self.tracks_to_play.rotate(-1*current_idx) # rotate left to current track
+			# the playlist continues from the current track in the original order
+			self._order = None
+			self._restart = False
+		self._next_order = None
 
 	def jump_to(self, idx):
 		if idx < len(self.track_list):
-			track = self.track_list[idx]
-			for i, t in enumerate(self.tracks_to_play):
-				if t.id==track.id:
-					self.tracks_to_play.rotate(-1*(i-1)) # rotate left so that selected track will play next
-					self.forward() # then trigger jump to next song
-					break
-
+			self._jump = self._alive.select(idx) # selected track will play next
+			self.forward() # then trigger jump to next song
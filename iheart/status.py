@@ -0,0 +1,56 @@
+import sys
+import time
+import threading
+
+from .colors import Colors
+
+
+
+class StatusLine(object):
+	'''
+	Renders the one line playback status (the clock) that is redrawn in place using '\r'
+	- player callbacks only call update() with a cheap key (eg. whole seconds) and a function that formats the text
+	- the text is formatted and written only when the key changes, and at most MAX_FPS times a second
+	- the colorized prefix / suffix is computed once and reused, so a redraw is a single write
+	- clock returns seconds (time.monotonic by default). tests pass their own
+	'''
+	MAX_FPS = 4
+
+	def __init__(self, color=Colors.WHITE, bold=True, stream=None, clock=time.monotonic):
+		self.color = color
+		self.bold = bold
+		self.stream = stream # defaults to sys.stdout at write time
+		self.clock = clock
+		self._key = None
+		self._last_flush = None # clock() of the last draw. None draws right away
+		self._affixes = None
+		self._lock = threading.Lock()
+
+	def _get_affixes(self):
+		if self._affixes is None or self._affixes[0] != Colors.DISABLED:
+			prefix, _, suffix = Colors.colorize('\0', self.color, bold=self.bold).partition('\0')
+			self._affixes = (Colors.DISABLED, prefix, suffix)
+		return self._affixes[1], self._affixes[2]
+
+	def update(self, key, render):
+		'''redraw with render() if key changed since the last draw. returns True if something was written'''
+		if key == self._key:
+			return False
+		now = self.clock()
+		if self._last_flush is not None and now - self._last_flush < 1 / self.MAX_FPS:
+			return False # key stays stale, so the next update draws it
+		with self._lock:
+			self._key = key
+			self._last_flush = now
+			prefix, suffix = self._get_affixes()
+			(self.stream or sys.stdout).write(prefix + render() + suffix)
+		return True
+
+	def reset(self):
+		'''forget the last drawn state so that the next update redraws (eg. after the line was wiped)'''
+		self._key = None
+		self._last_flush = None
+
+
+
+status_line = StatusLine()
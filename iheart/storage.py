@@ -1,5 +1,10 @@
 import os
 import json
+import gzip
+import atexit
+import shutil
+import tempfile
+import threading
 from collections import OrderedDict
 from datetime import datetime as dt
 
@@ -11,6 +16,18 @@ from .conf import ConfigurationManager
 
 
 
+def get_storage(config_manager: ConfigurationManager, supported_stations: list=[]):
+	'''storage for the backend selected by the 'storage-backend' config key - json (default) or sqlite'''
+	backend = config_manager.get_str(key='storage-backend', default='json').strip().lower()
+	if backend == 'sqlite':
+		from .storage_sqlite import iRadio_SQLiteStorage
+		return iRadio_SQLiteStorage(config_manager=config_manager, supported_stations=supported_stations)
+	elif backend != 'json':
+		raise ValueError(f"invalid storage-backend - {backend}")
+	return iRadio_Storage(config_manager=config_manager, supported_stations=supported_stations)
+
+
+
 class iRadio_Storage(object):
 
 	DATA = {
@@ -18,17 +35,27 @@ class iRadio_Storage(object):
 		'playlists': {},
 	}
 
+	SESSION_NAME_FORMAT = "SESSION-%Y-%m-%d--%H-%M-%S"
+	ARCHIVE_NAME_FORMAT = "ARCHIVE-%Y-%m.jsonl.gz"
+
 	def __init__(self, config_manager: ConfigurationManager, supported_stations: list=[]):
 		self._config_manager = config_manager
 		self._debug = os.environ.get('RADIO_DEBUG') == "1"
 		self._config = self._load_config()
 		self._data = self._load_data()
+		# only changed files are written. with 'storage-write-delay' > 0, writes are coalesced and done in the background
+		self._dirty_playlists = set()
+		self._last_played_dirty = False
+		self._write_timer = None
+		self._write_lock = threading.RLock()
+		if self._config['write-delay'] > 0:
+			atexit.register(self.flush)
 		self._STATION_CLASS_MAP = {s.__name__: s for s in supported_stations}
 		# history
 		self._current_track = None
 		self._current_track_start_dt = None
-		self._session_name = dt.now().strftime("SESSION-%Y-%m-%d--%H-%M-%S")
-		self._session_hist = []
+		self._session_name = dt.now().strftime(self.SESSION_NAME_FORMAT)
+		self.compact_history()
 
 
 	def _load_config(self):
@@ -37,10 +64,15 @@ class iRadio_Storage(object):
 			os.makedirs(datadir)
 		temp_conf = {
 			'last-played-file': os.path.join(datadir, 'last_played.json'),
+			'stream-stats-file': os.path.join(datadir, 'stream_stats.json'),
 			'playlist-dir-path': os.path.join(datadir, 'playlists'),
+			'playlist-manifest-file': os.path.join(datadir, 'playlists', '.manifest.json'), # names and track counts, so startup doesn't parse every playlist
 			'history-dir-path': os.path.join(datadir, 'history'),
 			'track-history': self._config_manager.get_bool(key='track-history', default=True),
 			'history-min-play-seconds': self._config_manager.get_int(key='history-min-play-seconds', default=10), # only songs that are atleast played for this long get saved in history
+			'history-compact-days': self._config_manager.get_int(key='history-compact-days', default=30), # sessions older than this are merged into monthly archives
+			'history-keep-months': self._config_manager.get_int(key='history-keep-months', default=0), # archives older than this are deleted (0 keeps everything)
+			'write-delay': self._config_manager.get_int(key='storage-write-delay', default=0), # seconds to wait and batch changes before writing (0 writes right away)
 		}
 		if not os.path.isdir(temp_conf['playlist-dir-path']):
 			os.makedirs(temp_conf['playlist-dir-path'])
@@ -51,31 +83,144 @@ class iRadio_Storage(object):
 
 	def _load_data(self):
 		default_data = self.DATA.copy()
+		default_data['playlists'] = {} # only playlists that were touched get parsed, see _get_playlist()
 		if os.path.isfile(self._config['last-played-file']):
 			try:
 				with open(self._config['last-played-file'], 'r') as conf:
 					default_data['last_played'] = json.load(conf, object_pairs_hook=OrderedDict)
 			except Exception as e:
 				if self._debug: print(e)
-		for f in os.listdir(self._config['playlist-dir-path']):
-			if f.endswith('.playlist.json'):
-				pl_name = f.replace(".playlist.json", "")
+		self._playlist_index = self._load_playlist_index(default_data['playlists'])
+		return default_data
+
+
+	def _load_playlist_index(self, loaded):
+		'''
+		Playlist name -> {'count', 'mtime_ns', 'size'} for every playlist file, read from the manifest
+		- files that changed since the manifest was written (or are missing from it) are parsed to get their
+			track count. those bodies are kept in 'loaded' so they are not parsed again
+		'''
+		manifest = {}
+		if os.path.isfile(self._config['playlist-manifest-file']):
+			try:
+				with open(self._config['playlist-manifest-file'], 'r') as m:
+					manifest = json.load(m)
+			except Exception as e:
+				if self._debug: print(e)
+
+		index = OrderedDict()
+		changed = False
+		for entry in sorted(os.scandir(self._config['playlist-dir-path']), key=lambda e: e.name):
+			if entry.name.endswith('.playlist.json'):
+				pl_name = entry.name.replace(".playlist.json", "")
+				stat = entry.stat()
+				known = manifest.get(pl_name)
+				if known and known.get('mtime_ns') == stat.st_mtime_ns and known.get('size') == stat.st_size:
+					index[pl_name] = known
+					continue
 				try:
-					with open(os.path.join(self._config['playlist-dir-path'], f), 'r') as pl:
-						default_data['playlists'][pl_name] = json.load(pl, object_pairs_hook=OrderedDict)
+					with open(entry.path, 'r') as pl:
+						loaded[pl_name] = json.load(pl, object_pairs_hook=OrderedDict)
+					index[pl_name] = {'count': len(loaded[pl_name]), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+					changed = True
 				except Exception as e:
 					if self._debug: print(e)
-		return default_data
+		if changed or len(index) != len(manifest):
+			self._write_manifest(index)
+		return index
+
+
+	def _write_manifest(self, index):
+		try:
+			self._atomic_write(self._config['playlist-manifest-file'], index)
+		except Exception as e:
+			if self._debug: print(e)
+
+
+	def _get_playlist(self, playlist_name, create=False):
+		'''playlist body, parsed on first use. returns None for unknown playlists unless create is set'''
+		playlists = self._data['playlists']
+		if playlist_name not in playlists:
+			if playlist_name in self._playlist_index:
+				with open(self._playlist_file(playlist_name), 'r') as pl:
+					playlists[playlist_name] = json.load(pl, object_pairs_hook=OrderedDict)
+			elif create:
+				playlists[playlist_name] = OrderedDict()
+				self._playlist_index[playlist_name] = {'count': 0}
+			else:
+				return None
+		return playlists[playlist_name]
+
+
+	@staticmethod
+	def _atomic_write(path, obj):
+		# write to a temp file in the same directory and rename over the target, so a crash never leaves half a file
+		fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+		try:
+			with os.fdopen(fd, 'w') as f:
+				json.dump(obj, f, indent=4, default=str)
+				f.flush()
+				os.fsync(f.fileno())
+			os.replace(tmp_path, path)
+		except:
+			os.remove(tmp_path)
+			raise
+
+
+	def _playlist_file(self, pl_name):
+		return os.path.join(self._config['playlist-dir-path'], '{}.playlist.json'.format(pl_name))
 
 
 	def write(self):
-		for pl_name, obj in self.get_playlists().items():
-			pl_file = os.path.join(self._config['playlist-dir-path'], '{}.playlist.json'.format(pl_name))
-			with open(pl_file, 'w') as pl:
-				json.dump(obj, pl, indent=4, default=str)
+		'''write changed playlists / last played now'''
+		with self._write_lock:
+			if self._write_timer is not None:
+				self._write_timer.cancel()
+				self._write_timer = None
+			playlists = self._data['playlists']
+			index_changed = bool(self._dirty_playlists)
+			while self._dirty_playlists:
+				pl_name = self._dirty_playlists.pop()
+				if pl_name in playlists:
+					pl_file = self._playlist_file(pl_name)
+					self._atomic_write(pl_file, playlists[pl_name])
+					stat = os.stat(pl_file)
+					self._playlist_index[pl_name] = {'count': len(playlists[pl_name]), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+			if index_changed:
+				self._write_manifest(self._playlist_index)
+
+			if self._last_played_dirty:
+				self._last_played_dirty = False
+				self._atomic_write(self._config['last-played-file'], self._data['last_played'])
+
+	flush = write
+
+
+	def _schedule_write(self):
+		if self._config['write-delay'] <= 0:
+			return self.write()
+		with self._write_lock:
+			if self._write_timer is None:
+				self._write_timer = threading.Timer(self._config['write-delay'], self.write)
+				self._write_timer.daemon = True
+				self._write_timer.start()
+
+
+	def load_stream_stats(self):
+		'''per stream host playback stats recorded by the player (time to first audio, rebuffers, cache size)'''
+		if os.path.isfile(self._config['stream-stats-file']):
+			try:
+				with open(self._config['stream-stats-file'], 'r') as f:
+					return json.load(f)
+			except Exception as e:
+				if self._debug: print(e)
+		return {}
 
-		with open(self._config['last-played-file'], 'w') as conf:
-			conf.write(json.dumps(self._data['last_played'], indent=4, default=str))
+
+	def save_stream_stats(self, stats, keep=500):
+		# stats are per stream host (see backend.stream_key). only the most recently played ones are kept
+		recent = sorted(stats.items(), key=lambda kv: kv[1].get('last_played', 0), reverse=True)[:keep]
+		self._atomic_write(self._config['stream-stats-file'], OrderedDict(recent))
 
 
 	# converters
@@ -111,34 +256,62 @@ class iRadio_Storage(object):
 	def add_to_playlist(self, playlist_name, track):
 		if not isinstance(track, dict):
 			track = self.current_track_to_dict(track)
-		if playlist_name not in self._data['playlists']:
-			self._data['playlists'][playlist_name] = OrderedDict()
-		if '__id__' in track:
-			track_id = str(track['__id__']) # json.dump automatically converts keys to strings. make it explicit!
-			if track_id not in self._data['playlists'][playlist_name]:
-				self._data['playlists'][playlist_name][track_id] = track #__id__ is unique iheart id
-			self.write()
+		with self._write_lock: # a background write may be serializing the playlist
+			playlist = self._get_playlist(playlist_name, create=True)
+			if '__id__' in track:
+				track_id = str(track['__id__']) # json.dump automatically converts keys to strings. make it explicit!
+				if track_id not in playlist:
+					playlist[track_id] = track #__id__ is unique iheart id
+					self._playlist_index[playlist_name]['count'] = len(playlist)
+					self._dirty_playlists.add(playlist_name)
+				self._schedule_write()
 
 
 	def delete_from_playlist_by_id(self, playlist_name, track_id):
 		track_id = str(track_id) # json.dump automatically converts keys to strings. make it explicit!
-		if playlist_name in self._data['playlists'] and track_id in self._data['playlists'][playlist_name]:
-			del self._data['playlists'][playlist_name][track_id]
-			self.write()
+		with self._write_lock:
+			playlist = self._get_playlist(playlist_name)
+			if playlist is not None and track_id in playlist:
+				del playlist[track_id]
+				self._playlist_index[playlist_name]['count'] = len(playlist)
+				self._dirty_playlists.add(playlist_name)
+				self._schedule_write()
 
 
 	def get_playlists(self):
-		return self._data['playlists']
+		'''all playlists fully loaded - prefer list_playlists() and get_playlist_tracks()'''
+		with self._write_lock:
+			return OrderedDict((name, self._get_playlist(name)) for name in self._playlist_index)
+
+
+	def list_playlists(self):
+		'''playlist name -> number of tracks'''
+		return OrderedDict((name, entry['count']) for name, entry in self._playlist_index.items())
+
+
+	def get_playlist_tracks(self, playlist_name):
+		'''track dicts of a playlist in the order they were added'''
+		with self._write_lock:
+			playlist = self._get_playlist(playlist_name)
+			if playlist is None:
+				raise KeyError(playlist_name)
+			return list(playlist.values())
 
 	# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 	# -=-=-=-=-=-=-=-= History ops -=-=-=-=-=-=-=-=-=-
 	# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
+	def get_last_played(self):
+		return self._data['last_played']
+
+
 	def update_last_played(self, track): # this is called when station changes
 		if not isinstance(track, dict):
 			track = self.station_to_dict(track)
-		self._data['last_played'] = track
-		self.write()
+		with self._write_lock:
+			self._data['last_played'] = track
+			self._last_played_dirty = True
+			self._schedule_write()
 
 
 	def now_playing(self, track):
@@ -151,10 +324,117 @@ class iRadio_Storage(object):
 					track_dict['play_start_dt'] = self._current_track_start_dt
 					track_dict['play_end_dt'] = end_dt
 					track_dict['played_duration'] = duration
-					self._session_hist.append(track_dict)
-
-					with open(os.path.join(self._config['history-dir-path'], self._session_name), 'w') as sess:
-						sess.write(json.dumps(self._session_hist, indent=4, default=str))
+					track_dict['session'] = self._session_name
+					self._append_history(track_dict)
 
 			self._current_track = track
 			self._current_track_start_dt = dt.now()
+
+
+	def _append_history(self, record):
+		# history is json lines - one record per play, appended and flushed as it happens
+		session_file = os.path.join(self._config['history-dir-path'], self._session_name + '.jsonl')
+		with open(session_file, 'a') as sess:
+			sess.write(json.dumps(record, default=str) + '\n')
+
+
+	def _history_files(self):
+		'''history files, oldest first. archives sort before sessions'''
+		hist_dir = self._config['history-dir-path']
+		names = [f for f in os.listdir(hist_dir) if f.startswith(('ARCHIVE-', 'SESSION-'))]
+		return [os.path.join(hist_dir, f) for f in sorted(names)]
+
+
+	@staticmethod
+	def _iter_history_file(path):
+		if path.endswith('.jsonl.gz'):
+			opener = gzip.open
+		else:
+			opener = open
+		with opener(path, 'rt') as f:
+			if not path.endswith(('.jsonl', '.jsonl.gz')): # old sessions were a single json list
+				yield from json.load(f)
+				return
+			for line in f:
+				if line.strip():
+					yield json.loads(line)
+
+
+	def iter_history(self):
+		'''lazily yield every history record, oldest first'''
+		for path in self._history_files():
+			try:
+				yield from self._iter_history_file(path)
+			except Exception as e:
+				if self._debug: print(e)
+
+
+	def _archived_sessions(self, archive):
+		'''names of the sessions that have records in archive'''
+		if not os.path.isfile(archive):
+			return set()
+		return set(record.get('session') for record in self._iter_history_file(archive))
+
+
+	def _append_to_archive(self, archive, session_name, session_path):
+		# copy the archive with a new gzip member for the session, then rename it over the old one
+		fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(archive), prefix='.tmp-')
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				if os.path.isfile(archive):
+					with open(archive, 'rb') as old:
+						shutil.copyfileobj(old, f)
+				lines = []
+				for record in self._iter_history_file(session_path):
+					record.setdefault('session', session_name)
+					lines.append(json.dumps(record, default=str) + '\n')
+				f.write(gzip.compress(''.join(lines).encode('utf-8'))) # readers handle concatenated gzip members
+				f.flush()
+				os.fsync(f.fileno())
+			os.replace(tmp_path, archive)
+		except:
+			os.remove(tmp_path)
+			raise
+
+
+	def compact_history(self, now=None):
+		'''
+		Merge sessions older than 'history-compact-days' into gzipped monthly archives (ARCHIVE-YYYY-MM.jsonl.gz)
+		and delete archives older than 'history-keep-months' (if set)
+		- archives are replaced atomically before the session file is removed. a session that is already in its
+			archive (the last run stopped in between) is only removed, so records are never archived twice
+		'''
+		now = now or dt.now()
+		hist_dir = self._config['history-dir-path']
+		archived = {} # archive path -> names of the sessions in it
+		for path in self._history_files():
+			name = os.path.basename(path)
+			if not name.startswith('SESSION-') or name.startswith(self._session_name):
+				continue
+			try:
+				session_name = name.replace('.jsonl', '')
+				started = dt.strptime(session_name, self.SESSION_NAME_FORMAT)
+				if (now - started).days < self._config['history-compact-days']:
+					continue
+				archive = os.path.join(hist_dir, started.strftime(self.ARCHIVE_NAME_FORMAT))
+				if archive not in archived:
+					archived[archive] = self._archived_sessions(archive)
+				if session_name not in archived[archive]:
+					self._append_to_archive(archive, session_name, path)
+					archived[archive].add(session_name)
+				os.remove(path)
+			except Exception as e:
+				if self._debug: print(e)
+
+		keep_months = self._config['history-keep-months']
+		if keep_months > 0:
+			oldest = now.year * 12 + now.month - keep_months
+			for path in self._history_files():
+				name = os.path.basename(path)
+				if name.startswith('ARCHIVE-'):
+					try:
+						month = dt.strptime(name, self.ARCHIVE_NAME_FORMAT)
+						if month.year * 12 + month.month <= oldest:
+							os.remove(path)
+					except Exception as e:
+						if self._debug: print(e)
@@ -0,0 +1,249 @@
+import os
+import json
+import sqlite3
+from collections import OrderedDict
+from datetime import datetime as dt
+
+from .storage import iRadio_Storage
+
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+	key TEXT PRIMARY KEY,
+	value TEXT
+);
+CREATE TABLE IF NOT EXISTS tracks (
+	id TEXT PRIMARY KEY,
+	data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS playlists (
+	id INTEGER PRIMARY KEY,
+	name TEXT UNIQUE NOT NULL,
+	track_count INTEGER NOT NULL DEFAULT 0,
+	next_position INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS playlist_tracks (
+	playlist_id INTEGER NOT NULL,
+	track_id TEXT NOT NULL,
+	position INTEGER NOT NULL,
+	PRIMARY KEY (playlist_id, track_id)
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS playlist_tracks_order ON playlist_tracks (playlist_id, position);
+CREATE TABLE IF NOT EXISTS history (
+	id INTEGER PRIMARY KEY,
+	session TEXT,
+	track_id TEXT,
+	play_start_dt TEXT,
+	play_end_dt TEXT,
+	played_duration REAL,
+	data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_start ON history (play_start_dt);
+'''
+
+
+
+class iRadio_SQLiteStorage(iRadio_Storage):
+	'''
+	iRadio_Storage backed by a single sqlite database (library.db in the data dir)
+	- playlists, their order, tracks and play history live in indexed tables, so startup doesn't depend on
+		library size and adding / deleting a playlist track is a couple of O(log n) index operations
+	- nothing is cached in memory. playlist tracks and history are read in batches
+	- the json layout (playlists/*.playlist.json, last_played.json, history/) is imported the first time the database is opened
+	- changes are committed right away, or batched when 'storage-write-delay' is set
+	'''
+	BATCH_SIZE = 1000
+
+	def _load_data(self):
+		self._db = sqlite3.connect(
+			os.path.join(self._config_manager.get_datadir(), 'library.db'),
+			check_same_thread=False, # history is written from player callbacks. all access goes through self._write_lock
+		)
+		self._db.executescript(SCHEMA)
+		if self._get_meta('json_imported') is None:
+			self.import_json()
+		return {'last_played': None, 'playlists': None} # not used by this backend
+
+
+	def _get_meta(self, key):
+		row = self._db.execute('SELECT value FROM meta WHERE key=?', (key,)).fetchone()
+		return json.loads(row[0]) if row is not None else None
+
+
+	def _set_meta(self, key, value):
+		self._db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value, default=str)))
+
+
+	def import_json(self):
+		'''one-shot import of the json storage layout found in the data dir'''
+		pl_dir = self._config['playlist-dir-path']
+		with self._db:
+			for f in sorted(os.listdir(pl_dir)):
+				if f.endswith('.playlist.json'):
+					try:
+						with open(os.path.join(pl_dir, f), 'r') as pl:
+							tracks = json.load(pl, object_pairs_hook=OrderedDict)
+						for track in tracks.values():
+							self._add_track(f.replace(".playlist.json", ""), track)
+					except Exception as e:
+						if self._debug: print(e)
+
+			if os.path.isfile(self._config['last-played-file']):
+				try:
+					with open(self._config['last-played-file'], 'r') as conf:
+						self._set_meta('last_played', json.load(conf, object_pairs_hook=OrderedDict))
+				except Exception as e:
+					if self._debug: print(e)
+
+			for record in super().iter_history():
+				self._insert_history(record)
+			self._set_meta('json_imported', dt.now())
+
+
+	def write(self):
+		with self._write_lock:
+			if self._write_timer is not None:
+				self._write_timer.cancel()
+				self._write_timer = None
+			self._db.commit()
+
+	flush = write
+
+
+	# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+	# -=-=-=-=-=-=-=-= Playlist ops -=-=-=-=-=-=-=-=-=
+	# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+	def _playlist_id(self, playlist_name, create=False):
+		row = self._db.execute('SELECT id FROM playlists WHERE name=?', (playlist_name,)).fetchone()
+		if row is None and create:
+			return self._db.execute('INSERT INTO playlists (name) VALUES (?)', (playlist_name,)).lastrowid
+		return row[0] if row is not None else None
+
+
+	def _add_track(self, playlist_name, track):
+		track_id = str(track['__id__'])
+		pl_id = self._playlist_id(playlist_name, create=True)
+		self._db.execute('INSERT OR REPLACE INTO tracks (id, data) VALUES (?, ?)', (track_id, json.dumps(track, default=str)))
+		added = self._db.execute('''
+			INSERT OR IGNORE INTO playlist_tracks (playlist_id, track_id, position)
+			SELECT id, ?, next_position FROM playlists WHERE id=?
+		''', (track_id, pl_id)).rowcount
+		if added:
+			self._db.execute('UPDATE playlists SET track_count=track_count+1, next_position=next_position+1 WHERE id=?', (pl_id,))
+
+
+	def add_to_playlist(self, playlist_name, track):
+		if not isinstance(track, dict):
+			track = self.current_track_to_dict(track)
+		with self._write_lock:
+			if '__id__' in track:
+				self._add_track(playlist_name, track)
+			else:
+				self._playlist_id(playlist_name, create=True)
+			self._schedule_write()
+
+
+	def delete_from_playlist_by_id(self, playlist_name, track_id):
+		with self._write_lock:
+			pl_id = self._playlist_id(playlist_name)
+			if pl_id is not None:
+				deleted = self._db.execute('DELETE FROM playlist_tracks WHERE playlist_id=? AND track_id=?', (pl_id, str(track_id))).rowcount
+				if deleted:
+					self._db.execute('UPDATE playlists SET track_count=track_count-1 WHERE id=?', (pl_id,))
+					self._schedule_write()
+
+
+	def list_playlists(self):
+		with self._write_lock:
+			return OrderedDict(self._db.execute('SELECT name, track_count FROM playlists ORDER BY id').fetchall())
+
+
+	def iter_playlist_tracks(self, playlist_name):
+		'''lazily yield track dicts of a playlist in the order they were added'''
+		with self._write_lock:
+			pl_id = self._playlist_id(playlist_name)
+		if pl_id is None:
+			raise KeyError(playlist_name)
+		position = -1
+		while True:
+			with self._write_lock:
+				rows = self._db.execute('''
+					SELECT pt.position, t.data FROM playlist_tracks pt JOIN tracks t ON t.id = pt.track_id
+					WHERE pt.playlist_id=? AND pt.position>? ORDER BY pt.position LIMIT ?
+				''', (pl_id, position, self.BATCH_SIZE)).fetchall()
+			if not rows:
+				return
+			for position, data in rows:
+				yield json.loads(data, object_pairs_hook=OrderedDict)
+
+
+	def get_playlist_tracks(self, playlist_name):
+		return list(self.iter_playlist_tracks(playlist_name))
+
+
+	def get_playlists(self):
+		'''all playlists fully loaded - prefer list_playlists() and get_playlist_tracks()'''
+		out = OrderedDict()
+		for name in self.list_playlists():
+			out[name] = OrderedDict((str(t['__id__']), t) for t in self.iter_playlist_tracks(name))
+		return out
+
+	# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+	# -=-=-=-=-=-=-=-= History ops -=-=-=-=-=-=-=-=-=-
+	# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+	def get_last_played(self):
+		with self._write_lock:
+			return self._get_meta('last_played')
+
+
+	def update_last_played(self, track): # this is called when station changes
+		if not isinstance(track, dict):
+			track = self.station_to_dict(track)
+		with self._write_lock:
+			self._set_meta('last_played', track)
+			self._schedule_write()
+
+
+	def _insert_history(self, record):
+		self._db.execute('''
+			INSERT INTO history (session, track_id, play_start_dt, play_end_dt, played_duration, data) VALUES (?, ?, ?, ?, ?, ?)
+		''', (
+			record.get('session'),
+			str(record.get('__id__')),
+			str(record.get('play_start_dt')),
+			str(record.get('play_end_dt')),
+			record.get('played_duration'),
+			json.dumps(record, default=str),
+		))
+
+
+	def _append_history(self, record):
+		with self._write_lock:
+			self._insert_history(record)
+			self._schedule_write()
+
+
+	def iter_history(self):
+		last_id = 0
+		while True:
+			with self._write_lock:
+				rows = self._db.execute('SELECT id, data FROM history WHERE id>? ORDER BY id LIMIT ?', (last_id, self.BATCH_SIZE)).fetchall()
+			if not rows:
+				return
+			for last_id, data in rows:
+				yield json.loads(data)
+
+
+	def compact_history(self, now=None):
+		'''history is already compact in the database. only applies 'history-keep-months' '''
+		keep_months = self._config['history-keep-months']
+		if keep_months > 0:
+			now = now or dt.now()
+			months = now.year * 12 + now.month - keep_months # first month to keep, zero based
+			cutoff = dt(months // 12, months % 12 + 1, 1)
+			with self._write_lock:
+				self._db.execute('DELETE FROM history WHERE play_start_dt < ?', (str(cutoff),))
+				self._schedule_write()
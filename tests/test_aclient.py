@@ -0,0 +1,58 @@
+import time
+
+from iheart.stations.iheart_radio import aclient
+
+
+class SlowClient:
+	'''iHeartClient stand-in where every call takes 0.1s'''
+	pool_size = 4
+
+	def _slow(self, value):
+		time.sleep(0.1)
+		return value
+
+	def get_artist_profile(self, artist_id):
+		return self._slow({'profile': artist_id})
+
+	def get_artist_bio(self, artist_id):
+		return self._slow({'bio': artist_id})
+
+	def get_similar_artists(self, artist_id):
+		return self._slow({'similar': artist_id})
+
+	def get_station_streams(self, stream_id):
+		if stream_id == 'bad':
+			raise Exception("not found")
+		return self._slow({'hls_stream': 'http://{}'.format(stream_id)})
+
+
+def test_fanout_takes_max_latency():
+	ac = aclient.AsyncIHeartClient(SlowClient())
+	st = time.time()
+	info = aclient.run(ac.get_artist_info(7))
+	assert time.time() - st < 0.25
+	assert info == {'profile': {'profile': 7}, 'bio': {'bio': 7}, 'similar': {'similar': 7}}
+
+	streams = aclient.run(ac.get_each_station_streams(['1', 'bad', '2']))
+	assert streams == {'1': {'hls_stream': 'http://1'}, '2': {'hls_stream': 'http://2'}}
+	ac.close()
+
+
+def test_concurrency_limit():
+	ac = aclient.AsyncIHeartClient(SlowClient(), concurrency=2)
+	st = time.time()
+	aclient.run_all(*[ac.get_artist_profile(i) for i in range(4)])
+	assert 0.2 <= time.time() - st < 0.35 # two waves of two
+	ac.close()
+
+
+def test_artist_station_info_fans_out(monkeypatch):
+	from iheart.stations import iHeartArtistStation
+	ac = aclient.AsyncIHeartClient(SlowClient())
+	monkeypatch.setattr(aclient, '_ACLIENT', ac)
+	station = iHeartArtistStation({'id': 7, 'name': 'Bob'})
+	st = time.time()
+	info = station.info() # no track playing yet - artist info only
+	assert time.time() - st < 0.25
+	assert info == {'artist_info': {'profile': {'profile': 7}, 'bio': {'bio': 7}, 'similar': {'similar': 7}}}
+	ac.close()
@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+from iheart import backend
+from iheart.backend import NullPlayer, PlaybackError, PlayerBackend, CachingPolicy
+from iheart.stations import Station, LocalPlaylist
+
+
+@pytest.fixture
+def null_backend():
+	NullPlayer.reset()
+	previous = backend.set_backend(NullPlayer)
+	yield NullPlayer
+	backend.set_backend(previous)
+	NullPlayer.DEFAULT_DURATION = None
+	NullPlayer.reset()
+
+
+def test_virtual_clock_events(null_backend):
+	NullPlayer.DURATIONS['http://a'] = 10
+	events = []
+	player = NullPlayer.get_player('http://a')
+	player.register_event(backend.POSITION_CHANGED, lambda e: events.append(('pos', e.elapsed)))
+	player.register_event(backend.END_REACHED, lambda e: events.append(('end', e.elapsed)))
+	player.play()
+	assert player.wait_until_playing() and player.is_playing()
+
+	NullPlayer.advance(2.5)
+	assert events == [('pos', 1), ('pos', 2)]
+	player.toggle_pause(True)
+	NullPlayer.advance(100) # nothing moves while paused
+	assert player.get_time() == 2.5 and len(events) == 2
+	player.toggle_pause(False)
+	player.forward() # 12.5 -> end of track
+	NullPlayer.advance(1)
+	assert events[-1] == ('end', 10) and not player.is_playing()
+	assert NullPlayer.now() == 103.5
+
+
+def test_plain_station_plays(null_backend):
+	station = Station({'id': 1, 'mrl': 'http://live'})
+	station.play()
+	assert station.is_playing() and station.CURRENT_PLAYING_MRL == 'http://live'
+	assert NullPlayer.HISTORY == ['http://live']
+	station.stop()
+	assert not station.is_playing()
+
+
+def test_failed_play_raises(null_backend):
+	NullPlayer.FAILING.add('http://broken')
+	with pytest.raises(PlaybackError):
+		Station({'id': 1, 'mrl': 'http://broken'}).play()
+
+
+def test_stalled_play_times_out(null_backend):
+	NullPlayer.STALLING.add('http://stalled')
+	station = Station({'id': 1, 'mrl': 'http://stalled'})
+	with pytest.raises(TimeoutError):
+		station.play()
+	assert station.CURRENT_PLAYING_MRL != 'http://stalled'
+	assert not station.is_playing()
+
+
+def test_playlist_plays_through_on_virtual_clock(null_backend, capsys):
+	NullPlayer.DEFAULT_DURATION = 180
+	tracks = [{'streamUrl': 'http://t/%d' % i, 'content': {'id': i, 'title': 't%d' % i, 'artistName': 'a', 'albumName': 'b', 'duration': 180}} for i in range(2000)]
+	pl = LocalPlaylist({'name': 'test', 'track_dict_list': tracks})
+	changes = []
+	pl.on_track_change(lambda track: changes.append(track.id))
+
+	start = time.perf_counter()
+	pl.play()
+	NullPlayer.advance(180 * 2000 - 1) # ~4 days of music
+	assert time.perf_counter() - start < 30
+	assert changes == list(range(2000))
+	assert NullPlayer.HISTORY == ['http://t/%d' % i for i in range(2000)]
+
+	NullPlayer.advance(1) # last track ends and the playlist wraps around
+	assert changes[-1] == 0
+	pl.stop()
+	assert not pl.is_playing()
+
+
+def test_caching_policy_parse():
+	policy = CachingPolicy.parse("adaptive:1500:50000")
+	assert (policy.mode, policy.initial, policy.maximum) == ('adaptive', 1500, 50000)
+	assert CachingPolicy.parse(str(policy)).maximum == 50000
+	policy = CachingPolicy.parse(" Fixed:20000 ")
+	assert (policy.mode, policy.initial, policy.maximum) == ('fixed', 20000, 20000)
+	assert str(policy) == "fixed:20000"
+	assert CachingPolicy.parse("adaptive:3000:1000").maximum == 3000 # never below initial
+	for bad in ("sometimes:1000", "adaptive:lots", "adaptive:1:2:3"):
+		with pytest.raises((ValueError, TypeError)):
+			CachingPolicy.parse(bad)
+
+
+def test_caching_policy_grows_up_to_maximum():
+	policy = CachingPolicy('adaptive', 1000, 5000)
+	assert [policy.grow(c) for c in (1000, 2000, 4000, 5000)] == [2000, 4000, 5000, 5000]
+	assert CachingPolicy('fixed', 1000).grow(1000) == 1000
+
+
+def test_learned_caching_is_per_host(monkeypatch):
+	monkeypatch.setattr(PlayerBackend, 'STREAM_STATS', {'cdn.example.com': {'caching': 4000}})
+	policy = CachingPolicy('adaptive', 1000, 5000)
+	assert policy.caching_for('http://CDN.example.com/track/1.m4a?token=a') == 4000
+	assert policy.caching_for('http://other.example.com/track/1.m4a') == 1000
+	PlayerBackend.STREAM_STATS['cdn.example.com']['caching'] = 99999
+	assert policy.caching_for('http://cdn.example.com/track/2.m4a') == 5000
+	assert CachingPolicy('fixed', 1000).caching_for('http://cdn.example.com/x') == 1000
@@ -0,0 +1,20 @@
+from benchmarks import suite, bench_playlist_ops
+
+
+def test_compare_flags_slowdowns_beyond_tolerance_and_noise():
+	baseline = {'storage': {'sqlite': {'100': {'add_ms': 2.0, 'open_ms': 0.2, 'disk_kb': 50}}, 'json': {'100': {'add_ms': 2.0}}}, 'playlist_ops': {'ops': 10}}
+	results = {'storage': {'sqlite': {'100': {'add_ms': 8.0, 'open_ms': 0.6, 'disk_kb': 20}}, 'json': {'100': {'add_ms': 8.0}}}, 'playlist_ops': {'ops': 99}}
+	regressions, improvements = suite.compare(results, baseline, tolerance=0.5)
+	# open_ms is within the noise floor, json writes have a higher floor and ops is not a metric
+	assert regressions == [('storage.sqlite.100.add_ms', 2.0, 8.0)]
+	assert improvements == [('storage.sqlite.100.disk_kb', 50, 20)]
+
+
+def test_rounds_keep_the_best_value():
+	assert suite._best({'a': {'x_ms': 3, 'n': 'first'}, 'b_us': None}, {'a': {'x_ms': 2, 'n': 'second'}, 'b_us': 1}) == \
+		{'a': {'x_ms': 2, 'n': 'first'}, 'b_us': None}
+
+
+def test_playlist_ops_runs():
+	out = bench_playlist_ops.run(sizes=(1000,), ops=50)
+	assert set(out['1000']) >= {'build_ms', 'next_track_ms', 'shuffle_toggle_ms', 'remove_ms'}
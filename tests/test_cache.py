@@ -0,0 +1,92 @@
+import time
+
+from iheart.cache import ResponseCache
+from iheart.stations.iheart_radio import client as iheart_client
+
+
+
+def test_ttl_and_stale(tmp_path):
+	cache = ResponseCache(str(tmp_path / 'cache.db'))
+	cache.set('a', {'x': 1}, ttl=60)
+	cache.set('b', [1, 2], ttl=-1) # already expired
+	assert cache.get('a') == ({'x': 1}, True)
+	assert cache.get('b') == (None, False)
+	assert cache.get('b', max_stale=60) == ([1, 2], False)
+	assert cache.stats() == {'hits': 1, 'stale_hits': 1, 'misses': 1, 'entries': 2}
+
+
+def test_lru_eviction_persists(tmp_path):
+	path = str(tmp_path / 'cache.db')
+	cache = ResponseCache(path, max_entries=2)
+	cache.set('a', 1, ttl=60)
+	cache.set('b', 2, ttl=60)
+	time.sleep(0.01)
+	cache.get('a') # b is now least recently used
+	cache.set('c', 3, ttl=60)
+	cache.close()
+
+	cache = ResponseCache(path, max_entries=2)
+	assert cache.get('a')[0] == 1
+	assert cache.get('b')[0] is None
+	assert cache.get('c')[0] == 3
+
+
+def test_client_serves_stale_streams_while_refreshing(tmp_path):
+	client = iheart_client.iHeartClient(cache=ResponseCache(str(tmp_path / 'cache.db')))
+	calls = []
+	def fetch():
+		calls.append(1)
+		return {'shoutcast_stream': 'http://stream/%d' % len(calls)}
+
+	assert client._cached('station_streams', '123', fetch)['shoutcast_stream'] == 'http://stream/1'
+	assert client._cached('station_streams', '123', fetch)['shoutcast_stream'] == 'http://stream/1'
+	assert len(calls) == 1
+
+	client.cache.set('station_streams:123', {'shoutcast_stream': 'http://stream/old'}, ttl=-1)
+	assert client._cached('station_streams', '123', fetch)['shoutcast_stream'] == 'http://stream/old'
+	for _ in range(100):
+		if not client._revalidating: break
+		time.sleep(0.01)
+	assert client._cached('station_streams', '123', fetch)['shoutcast_stream'] == 'http://stream/2'
+
+	client.cache.set('station_streams:123', {'shoutcast_stream': 'http://stream/dead'}, ttl=-2*60*60) # too old to serve
+	assert client._cached('station_streams', '123', fetch)['shoutcast_stream'] == 'http://stream/3'
+	assert client._cached('station_streams', '123', fetch, refresh=True)['shoutcast_stream'] == 'http://stream/4'
+
+
+def test_client_does_not_cache_failed_search(tmp_path):
+	client = iheart_client.iHeartClient(cache=ResponseCache(str(tmp_path / 'cache.db')))
+	responses = [{'error': 'down'}, {'results': {}}]
+	fetch = lambda: responses.pop(0)
+	assert 'error' in client._cached('search', 'q', fetch, cacheable=lambda r: 'results' in r)
+	assert 'results' in client._cached('search', 'q', fetch, cacheable=lambda r: 'results' in r)
+	assert client._cached('search', 'q', fetch, cacheable=lambda r: 'results' in r) == {'results': {}}
+
+
+def test_ir_genres_cached_and_refreshed_in_background(tmp_path, monkeypatch):
+	from iheart.stations.internet_radio import client as ir_client
+	scrapes = []
+	def fake_scrape():
+		scrapes.append(1)
+		return ['Jazz', 'Classic Rock']
+	monkeypatch.setattr(ir_client, 'ir_get_stations', fake_scrape)
+
+	cache = ResponseCache(str(tmp_path / 'cache.db'))
+	ir_client.configure(cache=cache)
+	assert ir_client.ir_get_genres() == {'jazz', 'classic rock'}
+	assert ir_client._ir_find_actual_url('Jazz').endswith('/stations/jazz/')
+	assert '/search/' in ir_client._ir_find_actual_url('bob marley')
+	assert len(scrapes) == 1
+
+	ir_client.configure(cache=cache) # new process - list comes from disk
+	assert 'jazz' in ir_client.ir_get_genres()
+	assert len(scrapes) == 1
+
+	ir_client._GENRES = ({'jazz'}, 0) # stale
+	assert ir_client.ir_get_genres() == {'jazz'}
+	for _ in range(100):
+		if not ir_client._GENRES_REFRESHING: break
+		time.sleep(0.01)
+	assert len(scrapes) == 2
+	assert ir_client.ir_get_genres() == {'jazz', 'classic rock'}
+	ir_client.configure()
@@ -0,0 +1,74 @@
+import lxml.html
+import pytest
+import requests
+
+from iheart.stations.internet_radio import client as ir_client
+
+
+PAGE = '''<html><body><table><tbody>
+<tr>
+	<td><a href="/servers/tools/playlistgenerator/?u=http://1.2.3.4:8000/listen.pls&amp;t=.m3u" title="M3U Playlist File">m3u</a></td>
+	<td><h4 class="text-danger" style="display:inline;">Bob Radio</h4><br><b>Bob Marley - Is This Love</b></td>
+	<td class="text-right hidden-xs"><p>128 Kbps<br>
+	42 Listeners<br>
+	MP3</p></td>
+</tr>
+<tr>
+	<td><a href="/x.m3u" title="M3U Playlist File">m3u</a></td>
+	<td><h4 class="text-danger"> </h4></td>
+</tr>
+</tbody></table>
+<ul class="pager"><li class="next"><a href="/stations/80s/page2">Next</a></li></ul>
+</body></html>'''
+
+
+def test_parse_rows_and_pager():
+	doc = lxml.html.fromstring(PAGE)
+	rows = list(ir_client._ir_parse_rows(doc))
+	assert len(rows) == 1 # unnamed stations are skipped
+	assert rows[0]['name'] == 'Bob Radio'
+	assert rows[0]['current_track'] == 'Bob Marley - Is This Love'
+	assert rows[0]['mrl'] == ir_client.base_url + '/servers/tools/playlistgenerator/?u=http://1.2.3.4:8000/listen.pls&t=.m3u'
+	assert rows[0]['kbps'] == 128 and rows[0]['listeners'] == 42
+
+	href = ir_client._ir_next_href(doc)
+	assert href == '/stations/80s/page2'
+	prefix, suffix = ir_client._ir_page_pattern(href, 2)
+	assert prefix + '7' + suffix == ir_client.base_url + '/stations/80s/page7'
+	assert ir_client._ir_page_pattern('/search/?radio=bob&page=2', 3) is None
+
+
+def test_station_ids_are_stable_and_normalized():
+	gen = 'https://www.internet-radio.com/servers/tools/playlistgenerator/?u=http://1.2.3.4:8000/listen.pls&t=.{}'
+	sid = ir_client.ir_station_id(gen.format('m3u'))
+	assert sid == ir_client.ir_station_id(gen.format('pls'))
+	assert sid == ir_client.ir_station_id('HTTP://1.2.3.4:8000/listen.pls#x')
+	assert sid != ir_client.ir_station_id('http://1.2.3.4:8010/listen.pls')
+	assert ir_client.ir_station_id('http://example.com:80/stream') == ir_client.ir_station_id('http://example.com/stream')
+	assert sid == 'ir-45fb8aa242b0b776' # same value in every process, unlike hash()
+
+
+def test_station_index_replays_without_scraping(tmp_path, monkeypatch):
+	from iheart.stations.internet_radio.index import StationIndex
+	from iheart.stations import InternetRadio
+	from iheart.stations.internet_radio import stations as ir_stations
+
+	index = StationIndex(str(tmp_path / 'stations.json'))
+	ir_client.configure(index=index)
+	try:
+		rows = list(ir_client._ir_parse_rows(lxml.html.fromstring(PAGE)))
+		index.save()
+
+		ir_client.configure(index=StationIndex(str(tmp_path / 'stations.json')))
+		def no_scraping(*args, **kwargs):
+			raise AssertionError("scraped internet-radio.com")
+		monkeypatch.setattr(ir_stations, 'ir_search', no_scraping) # the name InternetRadio() calls
+		monkeypatch.setattr(requests.Session, 'request', no_scraping) # and any other http request
+		with pytest.raises(AssertionError):
+			InternetRadio() # without a station dict it would scrape
+		station = InternetRadio.from_index(rows[0]['id'])
+		assert station.name == 'Bob Radio' and station.mrl == rows[0]['mrl']
+		assert InternetRadio.from_index('ir-0000000000000000') is None
+		assert [s['id'] for s in ir_client.get_index().find('bob')] == [rows[0]['id']]
+	finally:
+		ir_client.configure()
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from iheart import backend
+from iheart.backend import NullPlayer
+from iheart.stations import LiveStation
+
+
+@pytest.fixture
+def null_backend():
+	NullPlayer.reset()
+	previous = backend.set_backend(NullPlayer)
+	yield NullPlayer
+	backend.set_backend(previous)
+	NullPlayer.reset()
+
+
+def _station(min_interval, refresh_interval):
+	class _Live(LiveStation):
+		META_MIN_INTERVAL = min_interval
+		META_REFRESH_INTERVAL = refresh_interval
+
+		def __init__(self, station_dict):
+			super().__init__(station_dict)
+			self.refreshes = []
+
+		def _refresh_meta(self):
+			self.refreshes.append(time.time())
+			super()._refresh_meta()
+	return _Live({'id': 1, 'mrl': 'http://live'})
+
+
+def _wait_for(check, timeout=2):
+	end = time.time() + timeout
+	while not check() and time.time() < end:
+		time.sleep(0.01)
+	return check()
+
+
+def test_earlier_pending_refresh_wins(null_backend):
+	station = _station(0, 60)
+	station._schedule_meta_refresh(30)
+	timer = station._meta_timer
+	station._schedule_meta_refresh(60) # later - the pending one stays
+	assert station._meta_timer is timer
+	station._schedule_meta_refresh(0.05) # earlier - replaces it
+	assert station._meta_timer is not timer and timer.finished.is_set() # cancelled
+	assert _wait_for(lambda: len(station.refreshes) == 1)
+	station.stop()
+
+
+def test_meta_changed_is_throttled(null_backend, capsys):
+	station = _station(0.3, 60)
+	NullPlayer.set_metadata('http://live', now_playing='Song A')
+	station.play()
+	assert _wait_for(lambda: station.now_playing == 'Song A')
+	NullPlayer.set_metadata('http://live', now_playing='Song B')
+	for _ in range(5): # a burst of META_CHANGED events
+		NullPlayer.set_metadata('http://live', now_playing='Song B')
+	assert _wait_for(lambda: station.now_playing == 'Song B')
+	time.sleep(0.4)
+	assert len(station.refreshes) == 2 # one for the burst
+	assert station.refreshes[1] - station.refreshes[0] >= 0.3 - 0.01
+	station.stop()
+
+
+def test_polling_rearms_and_stop_cancels(null_backend, capsys):
+	station = _station(0, 0.1)
+	station.play()
+	assert _wait_for(lambda: len(station.refreshes) >= 3) # play, then every META_REFRESH_INTERVAL
+	station.stop()
+	assert station._meta_timer is None
+	count = len(station.refreshes)
+	time.sleep(0.3)
+	assert len(station.refreshes) == count
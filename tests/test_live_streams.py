@@ -0,0 +1,53 @@
+import time
+
+from iheart.stations import iHeartLiveStation
+from iheart.stations.iheart_radio import client as iheart_client
+
+
+def test_batch_prefetch_populates_streams(monkeypatch):
+	requested = []
+	def many(ids):
+		requested.append(list(ids))
+		time.sleep(0.05)
+		return {'1': {'hls_stream': 'http://one.m3u8 '}, '2': {'shoutcast_stream': 'http://two'}}
+	def single(stream_id):
+		requested.append(stream_id)
+		return {'shoutcast_stream': 'http://single/%s' % stream_id}
+	monkeypatch.setattr(iheart_client, 'iget_station_streams_many', many)
+	monkeypatch.setattr(iheart_client, 'iget_station_streams', single)
+
+	stations = [iHeartLiveStation({'id': i, 'name': str(i)}) for i in (1, 2, 3)]
+	iHeartLiveStation.prefetch_streams(stations).result(timeout=1)
+	assert requested == [[1, 2, 3]]
+	assert stations[0].mrl == 'http://one.m3u8'
+	assert stations[1].mrl == 'http://two'
+
+	stations[0]._parse_stream() # picked - no extra request
+	stations[2]._parse_stream() # missing from the batch response
+	assert requested == [[1, 2, 3], 3]
+	assert stations[2].mrl == 'http://single/3'
+
+	stations[0]._parse_stream() # later plays resolve again
+	assert requested[-1] == 1
+
+
+def test_failed_stream_is_refetched_bypassing_the_cache(monkeypatch, capsys):
+	from iheart import backend
+	from iheart.backend import NullPlayer
+	requested = []
+	def single(stream_id, refresh=False):
+		requested.append(refresh)
+		return {'shoutcast_stream': 'http://fresh' if refresh else 'http://stale'}
+	monkeypatch.setattr(iheart_client, 'iget_station_streams', single)
+	NullPlayer.reset()
+	NullPlayer.FAILING.add('http://stale')
+	previous = backend.set_backend(NullPlayer)
+	try:
+		station = iHeartLiveStation({'id': 7, 'name': 'seven'})
+		station.play()
+		assert requested == [False, True]
+		assert station.mrl == 'http://fresh' and station.is_playing()
+		station.stop()
+	finally:
+		backend.set_backend(previous)
+		NullPlayer.reset()
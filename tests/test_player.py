@@ -0,0 +1,249 @@
+import time
+import types
+import threading
+from concurrent import futures
+
+import pytest
+
+from iheart.backend import PlayerBackend, CachingPolicy, PlaybackError
+from iheart.player import VLCPlayer, VLCInstanceManager
+
+
+class _Slot(object):
+	# stand-in for the libVLC standby media player
+	def __init__(self, mrl):
+		self.mrl = mrl
+		self.stopped = False
+
+	def stop(self):
+		self.stopped = True
+
+
+def _slow_player():
+	# no libVLC - prepare() blocks until the test lets it finish. a class per test keeps the slots apart
+	class _SlowPrepare(VLCPlayer):
+		_PLAYER = None
+		_PRELOADED = None
+		_PRELOAD_GEN = 0
+		_STANDBY_OWNER = None
+		_PREPARE_LOCK = threading.Lock()
+		started = threading.Event()
+		release = threading.Event()
+		slots = []
+
+		def prepare(self):
+			self.started.set()
+			self.release.wait(5)
+			slot = _Slot(self.mrl)
+			self.slots.append(slot)
+			with self._LOCK:
+				self._standby_plr = slot
+				type(self)._STANDBY_OWNER = self
+			return True
+	return _SlowPrepare
+
+
+def test_preload_drops_player_that_started_playing_meanwhile():
+	assert VLCInstanceManager.REUSE
+	cls = _slow_player()
+	t = threading.Thread(target=cls.preload, args=('http://b',))
+	t.start()
+	cls.started.wait(5)
+	playing = cls.get_player('http://b') # skip to b before the preload is ready
+	cls.release.set()
+	t.join(5)
+	assert cls._PLAYER is playing
+	assert cls._PRELOADED is None
+	assert [(s.mrl, s.stopped) for s in cls.slots] == [('http://b', True)]
+
+
+def test_overlapping_preloads_keep_the_newest():
+	cls = _slow_player()
+	first = threading.Thread(target=cls.preload, args=('http://b',))
+	first.start()
+	cls.started.wait(5)
+	second = threading.Thread(target=cls.preload, args=('http://c',)) # track changed again while b prepares
+	second.start()
+	cls.release.set()
+	first.join(5)
+	second.join(5)
+	assert cls._PRELOADED.mrl == 'http://c'
+	assert cls._PRELOADED._standby_plr.stopped is False # b's discard didn't stop c's standby player
+	assert cls._STANDBY_OWNER is cls._PRELOADED
+
+
+def test_switching_elsewhere_discards_the_preload():
+	cls = _slow_player()
+	cls.release.set()
+	cls.get_player('http://a')
+	preloaded = cls.preload('http://b')
+	assert cls._PRELOADED is preloaded
+	cls.get_player('http://x') # station switch - b will not be played
+	assert cls._PRELOADED is None
+	assert preloaded._standby_plr is None and cls.slots[0].stopped
+
+
+def test_discard_leaves_a_slot_it_no_longer_owns():
+	cls = _slow_player()
+	cls.release.set()
+	old = cls('http://b')
+	old.prepare()
+	new = cls('http://c')
+	new.prepare() # took over the standby slot
+	old.discard()
+	assert not new._standby_plr.stopped and cls._STANDBY_OWNER is new
+
+
+class _Buffering(object):
+	# libVLC MediaPlayerBuffering event
+	def __init__(self, new_cache):
+		self.u = types.SimpleNamespace(new_cache=new_cache)
+
+
+def test_underruns_grow_the_cache_for_the_host(monkeypatch):
+	stats = {}
+	monkeypatch.setattr(PlayerBackend, 'STREAM_STATS', stats)
+	policy = CachingPolicy('adaptive', 1000, 5000)
+	player = VLCPlayer('http://cdn.example.com/a.m4a', caching_policy=policy)
+	player._caching = policy.caching_for(player.mrl)
+	player._timing = {'start': time.time()}
+	player._started = futures.Future()
+	player._on_buffering(_Buffering(20)) # initial buffering - not an underrun
+	assert stats == {}
+	player._on_started(None)
+	assert stats['cdn.example.com']['caching'] == 1000 and stats['cdn.example.com']['plays'] == 1
+
+	for new_cache in (30, 60, 100, 10): # two dips, the first one reported twice
+		player._on_buffering(_Buffering(new_cache))
+	assert stats['cdn.example.com']['rebuffers'] == 2
+	assert stats['cdn.example.com']['caching'] == 4000
+	assert policy.caching_for('http://cdn.example.com/b.m4a') == 4000 # the next track from that host starts with it
+
+
+def test_wait_until_playing_times_out_or_raises(monkeypatch):
+	monkeypatch.setattr(PlayerBackend, 'STREAM_STATS', {})
+	player = VLCPlayer('http://a')
+	player._timing = {'start': time.time()}
+	player._started = futures.Future() # what play() sets up
+	assert player.wait_until_playing(timeout=0.05) is False # no event yet
+	player._make_callback(VLCPlayer.ERROR)(None) # libVLC error event
+	with pytest.raises(PlaybackError):
+		player.wait_until_playing(timeout=1)
+	player._make_callback(VLCPlayer.PLAYING)(None) # a late PLAYING doesn't undo the error
+	with pytest.raises(PlaybackError):
+		player.wait_until_playing(timeout=1)
+
+	player._started = futures.Future()
+	threading.Timer(0.05, player._make_callback(VLCPlayer.PLAYING), args=(None,)).start()
+	assert player.wait_until_playing(timeout=5) is True
+
+
+class _FakeVLC(object):
+	# just enough of python-vlc for VLCInstanceManager and VLCPlayer.play() / stop()
+	class State(object):
+		Playing, Ended, Stopped, Error = range(4)
+
+	class _Object(object):
+		released = False
+
+		def release(self):
+			self.released = True
+
+	class _Events(object):
+		def event_attach(self, event_type, callback):
+			pass
+
+		def event_detach(self, event_type):
+			pass
+
+	class _MediaPlayer(_Object):
+		media = None
+
+		def set_media(self, media):
+			self.media = media
+
+		def get_media(self):
+			return self.media
+
+		def play(self):
+			pass
+
+		def stop(self):
+			pass
+
+		def get_state(self):
+			return _FakeVLC.State.Playing
+
+		def event_manager(self):
+			return _FakeVLC._Events()
+
+	class _ListPlayer(_Object):
+		def set_media_player(self, player):
+			self.media_player = player
+
+	class _Instance(_Object):
+		def log_unset(self):
+			pass
+
+		def media_player_new(self):
+			return _FakeVLC._MediaPlayer()
+
+		def media_list_player_new(self):
+			return _FakeVLC._ListPlayer()
+
+		def media_new(self, mrl, *options):
+			return (mrl, options)
+
+	def __init__(self):
+		self.instances = []
+
+	def Instance(self, flags):
+		self.instances.append(self._Instance())
+		return self.instances[-1]
+
+
+@pytest.fixture
+def fake_vlc(monkeypatch):
+	from iheart import player as player_module
+	fake = _FakeVLC()
+	monkeypatch.setattr(player_module, 'vlc', fake)
+	monkeypatch.setattr(VLCInstanceManager, '_INSTANCE', None)
+	monkeypatch.setattr(VLCInstanceManager, '_SLOTS', {'active': {}, 'standby': {}})
+	monkeypatch.setattr(VLCInstanceManager, 'REUSE', True)
+	return fake
+
+
+def test_tracks_share_the_instance_and_player(fake_vlc):
+	players = []
+	for mrl in ('http://a/1.aac', 'http://a/2.aac', 'http://a/3.aac'):
+		track = VLCPlayer(mrl)
+		track.play()
+		players.append(track.plr)
+		assert track.plr.media[0] == mrl
+		track.stop()
+	assert len(fake_vlc.instances) == 1
+	assert players[0] is players[1] is players[2] is VLCInstanceManager.get_media_player()
+	assert not players[0].released # stop() leaves shared players alone
+	list_player = VLCInstanceManager.get_list_player()
+	assert VLCInstanceManager.get_list_player() is list_player and list_player.media_player is players[0]
+
+
+def test_promote_standby_swaps_the_slots(fake_vlc):
+	active = VLCInstanceManager.get_media_player()
+	standby = VLCInstanceManager.get_media_player(standby=True)
+	assert active is not standby
+	VLCInstanceManager.promote_standby()
+	assert VLCInstanceManager.get_media_player() is standby
+	assert VLCInstanceManager.get_media_player(standby=True) is active
+	assert len(fake_vlc.instances) == 1
+
+
+def test_release_frees_players_and_instance(fake_vlc):
+	media_player = VLCInstanceManager.get_media_player()
+	list_player = VLCInstanceManager.get_list_player(standby=True)
+	instance = VLCInstanceManager.get_instance()
+	VLCInstanceManager.release()
+	assert media_player.released and list_player.released and instance.released
+	assert VLCInstanceManager._INSTANCE is None
+	assert VLCInstanceManager.get_media_player() is not media_player # a fresh instance and player next time
+	assert len(fake_vlc.instances) == 2
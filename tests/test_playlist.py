@@ -0,0 +1,85 @@
+from iheart.stations import LocalPlaylist
+
+
+def _playlist(n, seed=None):
+	tracks = [{'streamUrl': 'http://t/%d' % i, 'content': {'id': i, 'title': 't%d' % i, 'duration': 60}} for i in range(n)]
+	pl = LocalPlaylist({'name': 'test', 'track_dict_list': tracks}, shuffle_seed=seed)
+	pl.forward = lambda: pl._next_track() # no player - just advance
+	return pl
+
+
+def _play(pl, count):
+	return [pl._next_track().id for _ in range(count)]
+
+
+def test_order_remove_and_jump():
+	pl = _playlist(6)
+	assert _play(pl, 2) == [0, 1]
+	pl.forward() # delete flow: move on, then remove the previous track
+	pl.remove_track(1)
+	assert pl.now_playing_id == 2
+	assert [t.id for t in pl.track_list] == [0, 2, 3, 4, 5]
+	assert pl.track_list[1].id == 2 and pl.track_list[-1].id == 5
+
+	pl.remove_track(3) # removed ahead of the current track
+	assert [t.id for t in pl._peek_upcoming()] == [] # lookahead is 0
+	pl.set_lookahead(2)
+	assert [t.id for t in pl._peek_upcoming()] == [4, 5]
+	assert _play(pl, 3) == [4, 5, 0] # wraps around
+
+	pl.jump_to(3) # index among remaining tracks -> id 5
+	assert pl.now_playing_id == 5
+	assert _play(pl, 2) == [0, 2]
+
+	pl.remove_track(2) # current track removed without moving on
+	assert _play(pl, 1) == [4]
+
+
+def test_shuffle_covers_all_and_continues_from_current():
+	pl = _playlist(50)
+	assert _play(pl, 3) == [0, 1, 2]
+	pl.toggle_shuffle()
+	shuffled = _play(pl, 50)
+	assert sorted(shuffled) == list(range(50))
+
+	pl.toggle_shuffle()
+	current = pl.now_playing_id
+	assert _play(pl, 2) == [(current + 1) % 50, (current + 2) % 50]
+
+
+def test_shuffle_reshuffles_every_cycle_and_is_reproducible():
+	runs = []
+	for _ in range(2):
+		pl = _playlist(1000, seed=42)
+		pl.toggle_shuffle()
+		runs.append(_play(pl, 3000))
+	assert runs[0] == runs[1]
+
+	cycles = [runs[0][i:i+1000] for i in range(0, 3000, 1000)]
+	for cycle in cycles:
+		assert sorted(cycle) == list(range(1000)) # no repeats within a cycle
+	assert cycles[0] != cycles[1] != cycles[2]
+	assert all(a != b for a, b in zip(runs[0], runs[0][1:]))
+	assert _playlist(1000, seed=7)._rng.random() != _playlist(1000, seed=42)._rng.random()
+
+
+def test_shuffle_order_is_a_permutation():
+	import random
+	from iheart.stations.playlist import _ShuffleOrder
+	for n in (1, 2, 3, 17, 1024, 1025):
+		order = _ShuffleOrder(n, random.Random(n))
+		perm = [order.permute(i) for i in range(n)]
+		assert sorted(perm) == list(range(n))
+		assert [order.unpermute(p) for p in perm] == list(range(n))
+
+
+def test_tracks_are_made_on_demand():
+	from iheart.stations.base import Track
+	pl = _playlist(3)
+	assert all(isinstance(t, dict) for t in pl._tracks)
+	track = pl.track_list[2]
+	assert isinstance(track, Track) and not hasattr(track, '__dict__')
+	assert (track.name, track.mrl, track.duration_str, track.duration_str_padded) == ('t2', 'http://t/2', '1:00', '01:00')
+
+	no_stream = LocalPlaylist({'name': 'x', 'track_dict_list': [{'content': {'id': 1}}]})
+	assert len(no_stream.track_list) == 0
@@ -0,0 +1,69 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from iheart.cli import iHeart_CLI
+
+
+def _cli(depth):
+	cli = object.__new__(iHeart_CLI) # skip login / storage setup
+	cli.search_prefetch_depth = depth
+	cli._search_pages = {}
+	cli._search_pages_lock = threading.Lock()
+	cli._search_pool = ThreadPoolExecutor(max_workers=depth)
+	cli.calls = []
+	def search(keyword, category=None, startIndex=0):
+		cli.calls.append(startIndex)
+		if keyword == 'bad':
+			raise KeyError('results')
+		return list(range(startIndex, min(startIndex + iHeart_CLI.SEARCH_PAGE_SIZE, 25)))
+	cli.search = search
+	return cli
+
+
+def test_next_pages_prefetched_and_cached():
+	cli = _cli(depth=2)
+	getter = cli.search_pager('Bob', iHeart_CLI.ARTISTS)
+	assert getter(0) == list(range(10))
+	cli._search_page('bob', iHeart_CLI.ARTISTS, 20).result()
+	assert sorted(cli.calls) == [0, 10, 20]
+
+	assert getter(10) == list(range(10, 20)) # already fetched
+	assert getter(20) == list(range(20, 25)) # short page - nothing more to prefetch
+	assert cli._search_page('bob', iHeart_CLI.ARTISTS, 30).result() == [] # prefetched with page 10 (depth 2)
+	cli.search_pager('BOB', iHeart_CLI.ARTISTS)(0) # same keyword, cached for the session
+	assert sorted(cli.calls) == [0, 10, 20, 30]
+
+
+def test_failed_pages_are_not_cached():
+	cli = _cli(depth=1)
+	getter = cli.search_pager('bad', iHeart_CLI.ARTISTS)
+	for _ in range(2):
+		try:
+			getter(0)
+		except KeyError:
+			pass
+	assert cli.calls == [0, 0]
+
+
+def test_late_failure_does_not_drop_a_newer_page():
+	cli = _cli(depth=2)
+	gate = threading.Event()
+	def search(keyword, category=None, startIndex=0):
+		cli.calls.append(startIndex)
+		if len(cli.calls) == 1:
+			gate.wait(5)
+			raise KeyError('results')
+		return [startIndex]
+	cli.search = search
+	first = cli._search_page('bob', iHeart_CLI.ARTISTS, 0)
+	key = ('bob', iHeart_CLI.ARTISTS, 0)
+	newer = cli._search_pool.submit(search, 'bob', startIndex=0) # stands in for a retry that replaced the entry
+	newer.result()
+	with cli._search_pages_lock:
+		cli._search_pages[key] = newer
+	gate.set()
+	try:
+		first.result()
+	except KeyError:
+		pass
+	assert cli._search_pages[key] is newer
@@ -0,0 +1,122 @@
+import json
+import time
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from benchmarks.standin import StandIn
+from iheart.stations.iheart_radio import client as iheart_client
+
+
+def _api():
+	state = {'session': 'S1', 'logins': 0}
+	def login(handler):
+		state['logins'] += 1
+		return {'profileId': 42, 'sessionId': state['session']}
+	def search(handler):
+		if handler.headers.get('X-Session-Id') != state['session']:
+			return 401, {'error': 'session expired'}
+		return {'results': {}}
+	return state, {'/api/v1/account/loginOrCreateOauthUser': login, '/api/v3/search/all': search}
+
+
+def test_cached_session_skips_login_and_relogs_on_401(tmp_path):
+	state, routes = _api()
+	uuid_file = str(tmp_path / 'api.uuid')
+	session_file = str(tmp_path / 'session.json')
+	with StandIn(routes) as standin:
+		c = iheart_client.iHeartClient(base_url=standin.base_url)
+		assert c.login(uuid_file, session_filepath=session_file)['profileId'] == 42
+		assert state['logins'] == 1
+		c.close()
+
+		c = iheart_client.iHeartClient(base_url=standin.base_url) # next launch
+		c.login_in_background(uuid_file, session_filepath=session_file)
+		assert c.search('bob') == {'results': {}}
+		assert state['logins'] == 1 # zero auth round trips
+
+		state['session'] = 'S2' # server side expiry
+		assert c.search('bob') == {'results': {}}
+		assert state['logins'] == 2
+		with open(session_file) as f:
+			assert json.load(f)['sessionId'] == 'S2'
+		c.close()
+
+
+def test_expired_session_file_is_not_used(tmp_path):
+	session_file = tmp_path / 'session.json'
+	session_file.write_text(json.dumps({'profileId': 1, 'sessionId': 'old', 'expires': time.time() - 1}))
+	assert iheart_client.iHeartClient._load_session(str(session_file)) is None
+
+
+class CountingAdapter(HTTPAdapter):
+	'''answers every request with status, without a network. keeps the session id each request went out with'''
+	def __init__(self, status=200, body=None):
+		super().__init__()
+		self.status = status
+		self.body = body if body is not None else {'results': {}}
+		self.sent = []
+
+	def send(self, request, **kwargs):
+		self.sent.append(request.headers.get('X-Session-Id'))
+		res = requests.Response()
+		res.status_code = self.status
+		res._content = json.dumps(self.body).encode()
+		res.request = request
+		res.url = request.url
+		return res
+
+
+def test_calls_share_one_pooled_session(monkeypatch):
+	c = iheart_client.iHeartClient(pool_size=7)
+	session = c.session
+	assert session.get_adapter(iheart_client.API_HOST)._pool_maxsize == 7
+	adapter = CountingAdapter()
+	session.mount('https://', adapter)
+	monkeypatch.setattr(iheart_client, '_CLIENT', c)
+	for i in range(3):
+		assert iheart_client.isearch('bob', startIndex=i) == {'results': {}}
+	assert iheart_client.get_client().session is session
+	assert len(adapter.sent) == 3 # all through the one session's adapter
+	c.close()
+
+
+def test_401_logs_in_again_and_retries_once(monkeypatch):
+	c = iheart_client.iHeartClient()
+	adapter = CountingAdapter(status=401, body={'error': 'session expired'})
+	c.session.mount('https://', adapter)
+	c.session.headers['X-Session-Id'] = 'S1'
+	logins = []
+	def login(uuid_filepath, session_filepath=None, reuse_session=True):
+		logins.append(reuse_session)
+		c.session.headers['X-Session-Id'] = 'S%d' % (len(logins) + 1)
+	monkeypatch.setattr(c, 'login', login)
+
+	c._login_args = None # never logged in - nothing to renew
+	assert c.get(iheart_client.API_HOST + '/api/v3/search/all').status_code == 401
+	assert adapter.sent == ['S1'] and logins == []
+
+	c._login_args = ('api.uuid', None)
+	assert c.get(iheart_client.API_HOST + '/api/v3/search/all').status_code == 401 # still rejected - given up
+	assert adapter.sent == ['S1', 'S1', 'S2'] # the request and exactly one retry with the new session
+	assert logins == [False] # a fresh login, not the cached session
+	c.close()
+
+
+def test_failed_background_login_is_reported_not_a_type_error(tmp_path, monkeypatch):
+	from iheart.cli import iHeart_CLI
+	c = iheart_client.iHeartClient()
+	def login(uuid_filepath, session_filepath=None):
+		raise Exception("login failed")
+	monkeypatch.setattr(c, 'login', login)
+	monkeypatch.setattr(iheart_client, '_CLIENT', c)
+	c.login_in_background(str(tmp_path / 'api.uuid')).exception(5)
+
+	cli = object.__new__(iHeart_CLI) # skip storage / player setup
+	with pytest.raises(Exception, match="login failed"):
+		cli.user # the first caller gets the login error
+	for _ in range(2):
+		with pytest.raises(Exception, match="not logged in"):
+			cli.user_id
+	c.close()
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+
+from iheart import __version__
+from iheart.player import vlc_is_installed
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VERSION_BUDGET = 1.0 # seconds, fresh interpreter included
+FIRST_PROMPT_BUDGET = 3.0
+HEAVY_MODULES = ('vlc', 'requests', 'bs4', 'lxml', 'iheart.stations', 'iheart.cli')
+CLI_DEFERRED_MODULES = ('vlc', 'requests', 'bs4', 'lxml', 'asyncio') # loaded by the cli module only when used
+
+
+def _run(args, home):
+	env = dict(os.environ, HOME=str(home), PYTHONPATH=ROOT)
+	env.pop('XDG_CONFIG_HOME', None)
+	env.pop('XDG_DATA_HOME', None)
+	st = time.time()
+	out = subprocess.run([sys.executable] + args, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=30)
+	return out, time.time() - st
+
+
+def test_version_skips_heavy_imports(tmp_path):
+	out, elapsed = _run(['-X', 'importtime', '-m', 'iheart', '--version'], tmp_path)
+	assert out.stdout.decode().strip() == __version__
+	imported = set(line.rsplit('|', 1)[-1].strip() for line in out.stderr.decode().splitlines() if line.startswith('import time:'))
+	assert not imported.intersection(HEAVY_MODULES)
+	assert elapsed < VERSION_BUDGET
+
+
+def test_config_path_skips_heavy_imports(tmp_path):
+	out, elapsed = _run(['-X', 'importtime', '-m', 'iheart', '--config-path'], tmp_path)
+	assert out.stdout.decode().strip().endswith('iheartcli.ini')
+	imported = set(line.rsplit('|', 1)[-1].strip() for line in out.stderr.decode().splitlines() if line.startswith('import time:'))
+	assert not imported.intersection(HEAVY_MODULES)
+
+
+@pytest.mark.skipif(not vlc_is_installed(), reason="libVLC is not installed")
+def test_first_prompt_budget(tmp_path):
+	from benchmarks.bench_startup import time_first_prompt
+	elapsed = time_first_prompt(str(tmp_path), timeout=FIRST_PROMPT_BUDGET * 3)
+	assert elapsed is not None and elapsed / 1000 < FIRST_PROMPT_BUDGET
+
+
+def test_cli_import_defers_network_modules(tmp_path):
+	out, _ = _run(['-X', 'importtime', '-c', 'import iheart.cli'], tmp_path)
+	imported = set(line.rsplit('|', 1)[-1].strip() for line in out.stderr.decode().splitlines() if line.startswith('import time:'))
+	assert 'iheart.cli' in imported
+	assert not imported.intersection(CLI_DEFERRED_MODULES)
+
+
+def test_first_prompt_budget_on_null_backend(tmp_path):
+	from benchmarks.bench_startup import time_first_prompt, NULL_BACKEND_CLI
+	elapsed = time_first_prompt(str(tmp_path), timeout=FIRST_PROMPT_BUDGET * 3, args=('-c', NULL_BACKEND_CLI))
+	assert elapsed is not None and elapsed / 1000 < FIRST_PROMPT_BUDGET
+
+
+def test_cli_import_error_is_reported(tmp_path, monkeypatch, capsys):
+	from iheart import __main__, player
+	monkeypatch.setenv('HOME', str(tmp_path))
+	monkeypatch.setattr(player, 'vlc_is_installed', lambda: True)
+	monkeypatch.setitem(sys.modules, 'iheart.cli', None) # import raises ImportError
+	monkeypatch.setattr(sys, 'argv', ['iheart', '--no-color'])
+	assert __main__.main() == 1
+	assert 'error occured' in capsys.readouterr().out
@@ -0,0 +1,57 @@
+import io
+
+from iheart.colors import Colors
+from iheart.status import StatusLine
+
+
+class Clock(object):
+	def __init__(self):
+		self.now = 100.0
+
+	def __call__(self):
+		return self.now
+
+
+def _line():
+	clock = Clock()
+	sink = io.StringIO()
+	line = StatusLine(stream=sink, clock=clock)
+	return line, clock, sink
+
+
+def test_redraws_only_when_the_key_changes(monkeypatch):
+	monkeypatch.setattr(Colors, 'DISABLED', True)
+	line, clock, sink = _line()
+	renders = []
+	def render(text):
+		renders.append(text)
+		return text
+	assert line.update(1, lambda: render('a'))
+	for _ in range(10):
+		clock.now += 1
+		assert not line.update(1, lambda: render('b')) # same key - not even formatted
+	assert line.update(2, lambda: render('c'))
+	assert renders == ['a', 'c'] and sink.getvalue() == 'ac'
+
+
+def test_redraws_are_capped_at_max_fps():
+	line, clock, sink = _line()
+	interval = 1 / StatusLine.MAX_FPS
+	assert line.update(1, lambda: '1')
+	clock.now += interval / 2
+	assert not line.update(2, lambda: '2') # too soon
+	clock.now += interval / 2
+	assert line.update(3, lambda: '3') # the stale key is drawn on the next update after the interval
+	draws = 0
+	for key in range(4, 164): # a new key every 1/16 s for 10 s
+		clock.now += 0.0625
+		draws += line.update(key, lambda: 'x')
+	assert draws == 10 * StatusLine.MAX_FPS
+
+
+def test_reset_forces_the_next_draw():
+	line, clock, sink = _line()
+	assert line.update(1, lambda: '1')
+	line.reset()
+	assert line.update(1, lambda: '1') # same key and no time passed
+	assert not line.update(2, lambda: '2')
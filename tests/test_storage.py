@@ -0,0 +1,160 @@
+import os
+import json
+from datetime import datetime as dt, timedelta
+
+from iheart.storage import iRadio_Storage, get_storage
+from iheart.stations.base import Track
+
+
+class FakeConfigManager:
+	'''ConfigurationManager stand-in that keeps everything in memory'''
+	def __init__(self, datadir, **overrides):
+		self.datadir = str(datadir)
+		self.overrides = overrides
+
+	def get_datadir(self):
+		return self.datadir
+
+	def get_str(self, key, default):
+		return str(self.overrides.get(key, default))
+
+	def get_int(self, key, default):
+		return int(self.overrides.get(key, default))
+
+	def get_bool(self, key, default):
+		return bool(self.overrides.get(key, default))
+
+
+def _track(i):
+	return {'__name__': 'Track', '__id__': i, 'streamUrl': f'http://x/{i}.m3u8', 'content': {'id': i, 'title': f't{i}'}}
+
+
+def test_history_is_appended_and_read_back(tmp_path):
+	store = iRadio_Storage(FakeConfigManager(tmp_path, **{'history-min-play-seconds': 0}))
+	for i in range(3):
+		store.now_playing(Track(_track(i)))
+	store.now_playing(None)
+
+	records = list(store.iter_history())
+	assert [r['__id__'] for r in records] == [0, 1, 2]
+	session_files = os.listdir(tmp_path / 'history')
+	assert len(session_files) == 1 and session_files[0].endswith('.jsonl')
+
+
+def test_old_sessions_are_compacted(tmp_path):
+	hist = tmp_path / 'history'
+	hist.mkdir()
+	old = (dt.now() - timedelta(days=90)).strftime(iRadio_Storage.SESSION_NAME_FORMAT)
+	(hist / old).write_text(json.dumps([_track(1), _track(2)])) # old single json list format
+	(hist / (old[:-1] + 'x.jsonl')).write_text('not a session name\n')
+
+	store = iRadio_Storage(FakeConfigManager(tmp_path))
+	names = sorted(os.listdir(hist))
+	assert names[0].startswith('ARCHIVE-') and names[0].endswith('.jsonl.gz')
+	assert old not in names
+	records = [r for r in store.iter_history() if '__id__' in r]
+	assert [r['__id__'] for r in records] == [1, 2]
+	assert records[0]['session'] == old
+
+
+def test_only_changed_playlists_are_written(tmp_path):
+	store = iRadio_Storage(FakeConfigManager(tmp_path))
+	store.add_to_playlist('a', _track(1))
+	store.add_to_playlist('b', _track(2))
+	b_file = tmp_path / 'playlists' / 'b.playlist.json'
+	b_mtime = os.stat(b_file).st_mtime_ns
+
+	store.add_to_playlist('a', _track(3))
+	store.update_last_played(_track(3))
+	assert os.stat(b_file).st_mtime_ns == b_mtime
+	assert list(json.loads((tmp_path / 'playlists' / 'a.playlist.json').read_text())) == ['1', '3']
+	assert not [f for f in os.listdir(tmp_path / 'playlists') if f.startswith('.tmp-')]
+
+
+def test_write_behind_coalesces_edits(tmp_path):
+	store = iRadio_Storage(FakeConfigManager(tmp_path, **{'storage-write-delay': 60}))
+	for i in range(5):
+		store.add_to_playlist('a', _track(i))
+	assert not (tmp_path / 'playlists' / 'a.playlist.json').exists()
+	store.flush()
+	assert len(json.loads((tmp_path / 'playlists' / 'a.playlist.json').read_text())) == 5
+
+
+def test_sqlite_backend_imports_json_layout(tmp_path):
+	json_store = iRadio_Storage(FakeConfigManager(tmp_path, **{'history-min-play-seconds': 0}))
+	for i in range(3):
+		json_store.add_to_playlist('a', _track(i))
+		json_store.now_playing(Track(_track(i)))
+	json_store.now_playing(None)
+	json_store.update_last_played(_track(2))
+
+	store = get_storage(FakeConfigManager(tmp_path, **{'storage-backend': 'sqlite'}))
+	assert store.list_playlists() == {'a': 3}
+	assert [t['__id__'] for t in store.get_playlist_tracks('a')] == [0, 1, 2]
+	assert [r['__id__'] for r in store.iter_history()] == [0, 1, 2]
+	assert store.get_last_played()['__id__'] == 2
+
+
+def test_sqlite_playlist_ops_keep_order(tmp_path):
+	store = get_storage(FakeConfigManager(tmp_path, **{'storage-backend': 'sqlite'}))
+	for i in range(5):
+		store.add_to_playlist('a', _track(i))
+	store.add_to_playlist('a', _track(1)) # duplicates are ignored
+	store.delete_from_playlist_by_id('a', 3)
+	store.add_to_playlist('a', _track(3))
+	assert [t['__id__'] for t in store.get_playlist_tracks('a')] == [0, 1, 2, 4, 3]
+	assert store.list_playlists() == {'a': 5}
+
+
+def test_playlists_are_parsed_lazily(tmp_path):
+	store = iRadio_Storage(FakeConfigManager(tmp_path))
+	for i in range(3):
+		store.add_to_playlist('a', _track(i))
+	store.add_to_playlist('b', _track(9))
+
+	store = iRadio_Storage(FakeConfigManager(tmp_path))
+	assert store.list_playlists() == {'a': 3, 'b': 1}
+	assert store._data['playlists'] == {} # counts came from the manifest
+	assert [t['__id__'] for t in store.get_playlist_tracks('b')] == [9]
+	assert list(store._data['playlists']) == ['b']
+
+	# playlist files copied in from elsewhere are picked up
+	(tmp_path / 'playlists' / 'c.playlist.json').write_text(json.dumps({'5': _track(5)}))
+	store = iRadio_Storage(FakeConfigManager(tmp_path))
+	assert store.list_playlists() == {'a': 3, 'b': 1, 'c': 1}
+
+
+def test_stream_stats_round_trip(tmp_path):
+	stats = {'cdn.example.com': {'plays': 3, 'rebuffers': 1, 'caching': 4000, 'last_played': 2}}
+	stats.update({f'host{i}': {'plays': 1, 'rebuffers': 0, 'last_played': 1} for i in range(5)})
+	iRadio_Storage(FakeConfigManager(tmp_path)).save_stream_stats(stats, keep=3)
+	loaded = iRadio_Storage(FakeConfigManager(tmp_path)).load_stream_stats()
+	assert len(loaded) == 3 and loaded['cdn.example.com'] == stats['cdn.example.com'] # most recently played first
+
+
+def test_interrupted_compaction_does_not_duplicate(tmp_path, monkeypatch):
+	hist = tmp_path / 'history'
+	hist.mkdir()
+	old = dt(2020, 1, 5).strftime(iRadio_Storage.SESSION_NAME_FORMAT) + '.jsonl'
+	(hist / old).write_text(''.join(json.dumps(_track(i)) + '\n' for i in range(3)))
+
+	remove = os.remove
+	def crash_before_removing_sessions(path):
+		if os.path.basename(path).startswith('SESSION-'):
+			raise OSError("killed")
+		remove(path)
+	monkeypatch.setattr(os, 'remove', crash_before_removing_sessions)
+	iRadio_Storage(FakeConfigManager(tmp_path)) # archives the session, then "crashes"
+	monkeypatch.setattr(os, 'remove', remove)
+	assert old in os.listdir(hist)
+
+	store = iRadio_Storage(FakeConfigManager(tmp_path)) # next launch finishes the compaction
+	names = os.listdir(hist)
+	assert old not in names and not [n for n in names if n.startswith('.tmp-')]
+	assert [r['__id__'] for r in store.iter_history() if '__id__' in r] == [0, 1, 2]
+
+	later = dt(2020, 1, 6).strftime(iRadio_Storage.SESSION_NAME_FORMAT) + '.jsonl'
+	(hist / later).write_text(json.dumps(_track(3)) + '\n')
+	store = iRadio_Storage(FakeConfigManager(tmp_path)) # added to the same monthly archive
+	assert os.listdir(hist) == ['ARCHIVE-2020-01.jsonl.gz']
+	assert [r['__id__'] for r in store.iter_history() if '__id__' in r] == [0, 1, 2, 3]